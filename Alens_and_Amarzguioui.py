@@ -14,6 +14,7 @@ from __future__ import division
 import numpy as np
 from LTB_Sclass_v2 import LTB_ScaleFactor
 from LTB_Sclass_v2 import LTB_geodesics
+from LTB_exact import LTB_ParametricScaleFactor
 
 c = 299792458. #ms^-1
 Mpc = 1.
@@ -84,6 +85,9 @@ def dLTB_E_dr(r):
 
 LTB_model0 =  LTB_ScaleFactor(Lambda=Lambda,LTB_E=LTB_E, LTB_Edash=dLTB_E_dr,\
                               LTB_M=LTB_M, LTB_Mdash=dLTB_M_dr)
+#Lambda = 0 so the parametric solution can be used instead of odeint
+LTB_exact_model0 =  LTB_ParametricScaleFactor(Lambda=Lambda,LTB_E=LTB_E, LTB_Edash=dLTB_E_dr,\
+                              LTB_M=LTB_M, LTB_Mdash=dLTB_M_dr)
 
 
 
@@ -126,19 +130,23 @@ def r_loop(i,r_loc):
 
 
 
-from joblib import Parallel, delayed
-from joblib.pool import has_shareable_memory
-import multiprocessing as mp
-num_cores = mp.cpu_count()
+#from joblib import Parallel, delayed
+#from joblib.pool import has_shareable_memory
+#import multiprocessing as mp
+#num_cores = mp.cpu_count()
 #Parallel(n_jobs=6)(delayed(r_loop)(i, r_loc) for i, r_loc in zip(range(len(r_vector)),r_vector))	
 #r = Parallel(n_jobs=num_cores,verbose=0)(delayed(r_loop)(i, r_loc) for i, r_loc in zip(range(len(r_vector)),r_vector))
-r = Parallel(n_jobs=num_cores,verbose=0)(delayed(LTB_model0)(r_loc=r_loc,num_pt=num_pt) for r_loc in r_vector)
+#r = Parallel(n_jobs=num_cores,verbose=0)(delayed(LTB_model0)(r_loc=r_loc,num_pt=num_pt) for r_loc in r_vector)
+#
+#i = 0
+#for tup in r:
+#	t_vec[i,:], R_vec[i,:], Rdot_vec[i,:], Rdash_vec[i,:], Rdotdot_vec[i,:], \
+#	Rdashdot_vec[i,:] = tup
+#	i = i + 1
 
-i = 0
-for tup in r:
-	t_vec[i,:], R_vec[i,:], Rdot_vec[i,:], Rdash_vec[i,:], Rdotdot_vec[i,:], \
-	Rdashdot_vec[i,:] = tup
-	i = i + 1
+t_vector, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec = \
+                         LTB_exact_model0.evolve_shells(r_vector,num_pt=num_pt)
+t_vec = t_vec + t_vector
 
 for i, r_loc in zip(range(len(r_vector)),r_vector):
 	r_vec[i,:] = r_vec[i,:]+r_loc
@@ -0,0 +1,207 @@
+#!/usr/bin/env python2.7
+####################################################
+# HEALPix maps of the CMB at any nside, built a chunk of pixels at a time.
+#
+# The drivers evaluated z_dec pixel by pixel on the centres from hp.pix2ang or
+# from pixel_center_galactic_coord_12288.dat. Here the pixel centres of the
+# RING scheme are computed in numpy for a chunk of pixel indices, the
+# interpolant is called once on the whole chunk and the result goes straight
+# into the map, which can be a .npy file opened as a np.memmap. Memory stays
+# bounded by the chunk, so nside 1024-2048 maps (12.6M-50M pixels) are fine.
+# healpy is not needed to make the maps, only to look at them.
+#
+import numpy as np
+
+def nside2npix(nside):
+	return 12*nside*nside
+
+def _isqrt(x):
+	#floor(sqrt(x)) of integers, exact for the pixel numbers of any nside
+	s = np.floor(np.sqrt(x.astype(float))).astype(np.int64)
+	s = s - (s*s > x)
+	return s + ((s+1)*(s+1) <= x)
+
+def ring_pix2ang(nside,ipix):
+	"""
+	theta, phi of the centres of the pixels ipix in the RING scheme, the
+	same as healpy.pix2ang(nside,ipix)
+	"""
+	ipix = np.asarray(ipix,dtype=np.int64)
+	npix = nside2npix(nside)
+	ncap = 2*nside*(nside-1)
+	z = np.empty(ipix.shape)
+	phi = np.empty(ipix.shape)
+
+	north = ipix < ncap
+	south = ipix >= npix - ncap
+	equator = ~(north | south)
+
+	p = ipix[north]
+	iring = (1 + _isqrt(1 + 2*p)) >> 1
+	iphi = p + 1 - 2*iring*(iring-1)
+	z[north] = 1. - iring*iring*4./npix
+	phi[north] = (iphi-0.5)*np.pi/(2.*iring)
+
+	p = ipix[equator] - ncap
+	iring = p//(4*nside) + nside
+	iphi = p % (4*nside) + 1
+	fodd = np.where((iring+nside) % 2 == 1,1.,0.5)
+	z[equator] = (2*nside-iring)*8.*nside/npix
+	phi[equator] = (iphi-fodd)*np.pi/(2.*nside)
+
+	p = npix - ipix[south]
+	iring = (1 + _isqrt(2*p - 1)) >> 1
+	iphi = 4*iring + 1 - (p - 2*iring*(iring-1))
+	z[south] = iring*iring*4./npix - 1.
+	phi[south] = (iphi-0.5)*np.pi/(2.*iring)
+	return np.arccos(z), phi
+
+def galactic_pixel_centres(nside,ipix=None):
+	"""
+	galactic longitude and latitude ell, bee in degrees of the pixel
+	centres, what pixel_center_galactic_coord_12288.dat has for nside 32
+	"""
+	if ipix is None:
+		ipix = np.arange(nside2npix(nside))
+	theta, phi = ring_pix2ang(nside,ipix)
+	return phi*180./np.pi, 90. - theta*180./np.pi
+
+def pixel_chunks(nside,chunk=1<<20):
+	"""
+	yields the slice of pixel indices and theta, phi of their centres,
+	at most chunk pixels at a time
+	"""
+	npix = nside2npix(nside)
+	for start in range(0,npix,chunk):
+		s = slice(start,min(start+chunk,npix))
+		theta, phi = ring_pix2ang(nside,np.arange(s.start,s.stop))
+		yield s, theta, phi
+
+def _new_map(nside,filename,dtype):
+	if filename is None:
+		return np.empty(nside2npix(nside),dtype=dtype)
+	return np.lib.format.open_memmap(filename,mode='w+',dtype=dtype,
+	                                 shape=(nside2npix(nside),))
+
+def build_map(nside,function,filename=None,chunk=1<<20,dtype=np.float64):
+	"""
+	The map of function(theta, phi) in the RING scheme, e.g.
+	        build_map(1024,sp_z_dec.ev)
+	        build_map(1024,lambda theta, phi: sky.project(theta,phi,theta_c,phi_c))
+	function is called on arrays of at most chunk pixel centres. With a
+	filename the map is written to that .npy file as it is made and the
+	np.memmap is returned.
+	"""
+	out = _new_map(nside,filename,dtype)
+	for s, theta, phi in pixel_chunks(nside,chunk):
+		out[s] = function(theta,phi)
+	if filename is not None:
+		out.flush()
+	return out
+
+def temperature_map(nside,z_dec,filename=None,T0=1.,z_mean=None,chunk=1<<20,
+                    dtype=np.float64):
+	"""
+	The map T0*(z_mean - z_dec)/(1 + z_dec), Delta T/T for T0=1 or Delta T
+	in K for T0=2.7255.
+	z_dec:
+	       function(theta, phi) of the redshift of last scattering
+	z_mean:
+	       default the mean of z_dec over the map, as zdec_map.mean() in the
+	       drivers, found in a first pass through the pixels
+	With a filename the map is made in that .npy file, see build_map.
+	"""
+	out = _new_map(nside,filename,dtype)
+	if z_mean is None:
+		#z_dec goes into the map first, then its mean is known
+		total = 0.
+		for s, theta, phi in pixel_chunks(nside,chunk):
+			z = z_dec(theta,phi)
+			out[s] = z
+			total += np.sum(z)
+		z_mean = total/nside2npix(nside)
+		for start in range(0,out.size,chunk):
+			z = out[start:start+chunk]
+			out[start:start+chunk] = T0*(z_mean - z)/(1. + z)
+	else:
+		for s, theta, phi in pixel_chunks(nside,chunk):
+			z = z_dec(theta,phi)
+			out[s] = T0*(z_mean - z)/(1. + z)
+	if filename is not None:
+		out.flush()
+	return out
+
+####################################################
+# Multipoles. A map that only depends on the angle xi to an axis, like the
+# CMB of an off centre observer in LTB, has a_l0 about that axis only:
+#         a_l0 = 2 pi sqrt((2l+1)/(4 pi)) int_{-1}^{1} Delta_T(xi) P_l(x) dx
+# with x = cos(xi). Delta_T is sampled once on Gauss-Legendre nodes in x and
+# all the a_l0 follow from one matrix of P_l at the nodes. Turned to the
+# coordinate axes a_lm = a_l0 sqrt(4 pi/(2l+1)) conj(Y_lm(theta_c, phi_c)),
+# the ordering and normalization of healpy.map2alm.
+
+def legendre_matrix(lmax,x):
+	"""
+	P_l(x) for l = 0, ..., lmax by the Bonnet recurrence, shape
+	(lmax+1,)+x.shape
+	"""
+	x = np.asarray(x,dtype=float)
+	P = np.empty((lmax+1,)+x.shape)
+	P[0] = 1.
+	if lmax > 0:
+		P[1] = x
+	for l in range(2,lmax+1):
+		P[l] = ((2*l-1)*x*P[l-1] - (l-1)*P[l-2])/l
+	return P
+
+def axial_alm(Delta_T,lmax,num_nodes=256):
+	"""
+	a_l0, l = 0, ..., lmax, of the map Delta_T(xi), xi the angle to the
+	symmetry axis in radians. Delta_T is called once with the num_nodes
+	Gauss-Legendre nodes in cos(xi), enough for any smooth Delta_T and
+	lmax well below num_nodes.
+	"""
+	x, w = np.polynomial.legendre.leggauss(num_nodes)
+	f = Delta_T(np.arccos(x))
+	ell = np.arange(lmax+1)
+	norm = 2.*np.pi*np.sqrt((2.*ell+1.)/(4.*np.pi))
+	return norm*np.dot(legendre_matrix(lmax,x),w*f)
+
+def alm_index(lmax,ell,m):
+	"""
+	position of a_lm in the healpy ordering for mmax = lmax
+	"""
+	return m*(2*lmax+1-m)//2 + ell
+
+def ylm_theta(lmax,theta):
+	"""
+	Y_lm(theta, 0) for 0 <= m <= l <= lmax with the Condon-Shortley phase,
+	in the healpy ordering, by the usual recurrences in l at fixed m
+	"""
+	x, s = np.cos(theta), np.sin(theta)
+	out = np.zeros(alm_index(lmax,lmax,lmax)+1)
+	Y_mm = np.sqrt(1./(4.*np.pi))
+	for m in range(lmax+1):
+		if m > 0:
+			Y_mm = -np.sqrt((2.*m+1.)/(2.*m))*s*Y_mm
+		i = alm_index(lmax,m,m)
+		out[i] = Y_mm
+		if m < lmax:
+			out[i+1] = np.sqrt(2.*m+3.)*x*Y_mm
+		for l in range(m+2,lmax+1):
+			a = np.sqrt((4.*l*l-1.)/(l*l-m*m))
+			b = np.sqrt(((l-1.)**2-m*m)/(4.*(l-1.)**2-1.))
+			out[i+l-m] = a*(x*out[i+l-m-1] - b*out[i+l-m-2])
+	return out
+
+def rotated_alm(a_l0,theta_c,phi_c):
+	"""
+	a_lm, 0 <= m <= l <= lmax, in the healpy ordering of the axially
+	symmetric map with the a_l0 of axial_alm about the direction
+	(theta_c, phi_c), to compare with healpy.map2alm(map,lmax=lmax)
+	"""
+	lmax = np.size(a_l0) - 1
+	ell = np.concatenate([np.arange(m,lmax+1) for m in range(lmax+1)])
+	m = np.concatenate([np.zeros(lmax+1-m,dtype=int)+m for m in range(lmax+1)])
+	a = np.asarray(a_l0)[ell]*np.sqrt(4.*np.pi/(2.*ell+1.))
+	return a*ylm_theta(lmax,theta_c)*np.exp(-1j*m*phi_c)
@@ -83,28 +83,279 @@ def smear(cz,r,sigma,ell,bee,ell_hp, bee_hp,sigma_theta=25.*np.pi/180.,weight=Fa
 	return H_alpha, bar_sigma_alpha 
 
 
-def get2_Hs_sigmas_rs(indices,binning_type,cz,r,sigma):
+def unit_vectors(ell,bee):
 	"""
-	Uses function get_Hs_sigmas_rs for a choice of binning
+	ell, bee:
+	    galactic longitude and latitude in radians
 	returns:
-	        Hs, sigma_s, bar_rs
+	    the unit vectors, array of shape (n,3)
+	"""
+	ell = np.atleast_1d(ell)
+	bee = np.atleast_1d(bee)
+	return np.column_stack((np.cos(bee)*np.cos(ell), np.cos(bee)*np.sin(ell),
+	                        np.sin(bee)))
+
+def _kernel(theta,sigma_theta):
+	return 1./np.sqrt(2.*np.pi)/sigma_theta * np.exp(-theta**2/ (2.*sigma_theta**2))
+
+def kernel_blocks(ell,bee,ell_hp,bee_hp,sigma_theta=25.*np.pi/180.,truncate=None,
+                  chunk=1024):
+	"""
+	The Gaussian kernel of smear of a chunk of pixels against all the 
+	galaxies, zero beyond truncate*sigma_theta if that is given.
+	yields:
+	    slice of the pixels, W_alpha of shape (chunk,num_gal)
+	"""
+	x_gal = unit_vectors(ell,bee)
+	x_hp = unit_vectors(ell_hp,bee_hp)
+	for start in range(0,x_hp.shape[0],chunk):
+		s = slice(start,min(start+chunk,x_hp.shape[0]))
+		theta = np.arccos(np.clip(np.dot(x_hp[s],x_gal.T),-1.,1.))
+		W_alpha = _kernel(theta,sigma_theta)
+		if truncate is not None:
+			W_alpha[theta > truncate*sigma_theta] = 0.
+		yield s, W_alpha
+
+def kernel_pairs(ell,bee,ell_hp,bee_hp,sigma_theta=25.*np.pi/180.,truncate=5.,
+                 chunk=1024):
+	"""
+	The Gaussian kernel of smear for every pair of a pixel and a galaxy closer
+	than truncate*sigma_theta. The galaxies near a chunk of pixels are found 
+	with KD-trees of the unit vectors, where the angle is given by the chord.
+	Only worth it when the cut leaves a small part of the sky, see 
+	kernel_blocks otherwise.
+	yields:
+	    pixel index, galaxy index, W_alpha of the pairs, chunk by chunk
+	"""
+	from scipy.spatial import cKDTree
+	x_gal = unit_vectors(ell,bee)
+	x_hp = unit_vectors(ell_hp,bee_hp)
+	tree_gal = cKDTree(x_gal)
+	theta_max = min(truncate*sigma_theta,np.pi)
+	chord_max = 2.*np.sin(theta_max/2.)*(1.+1e-12)
+	for start in range(0,x_hp.shape[0],chunk):
+		pairs = cKDTree(x_hp[start:start+chunk]).sparse_distance_matrix(tree_gal,
+		                                     chord_max,output_type='ndarray')
+		theta = 2.*np.arcsin(np.minimum(pairs['v']/2.,1.))
+		yield start+pairs['i'], pairs['j'], _kernel(theta,sigma_theta)
+
+#a cut leaving less than this fraction of the sky around a pixel goes through
+#kernel_pairs, anything wider through the dense kernel_blocks
+sparse_sky_fraction = 0.25
+
+def _kernel_sums(ell,bee,ell_hp,bee_hp,linear,quadratic,sigma_theta,truncate,
+                 chunk,edges=None):
+	"""
+	sum_j W_alpha*linear[n][j] and sum_j W_alpha**2*quadratic[n][j] over the
+	galaxies j for every pixel, split in bins of galaxy index at the sorted 
+	edges. Returns shape (num_sums,num_hp,edges.size+1).
 	"""
-	Hs, sigma_s, bar_rs = [ np.zeros(binning_type.size-1) for i in (1,2,3) ]
+	num_hp = np.size(ell_hp)
+	num_gal = np.size(ell)
+	edges = np.zeros(0,dtype=int) if edges is None else np.asarray(edges)
+	num_bins = edges.size + 1
+	values = [(v,1) for v in linear] + [(v,2) for v in quadratic]
+	sums = np.zeros((len(values),num_hp,num_bins))
 	
-	a = indices[0]
-	b = indices[1]
+	theta_max = np.pi if truncate is None else min(truncate*sigma_theta,np.pi)
+	if (1.-np.cos(theta_max))/2. < sparse_sky_fraction:
+		bins = np.searchsorted(edges,np.arange(num_gal),side='right')
+		for i, j, W_alpha in kernel_pairs(ell,bee,ell_hp,bee_hp,sigma_theta,
+		                                  truncate,chunk):
+			k = i*num_bins + bins[j]
+			for n, (v, power) in enumerate(values):
+				sums[n] += np.bincount(k,W_alpha**power*v[j],
+				                       num_hp*num_bins).reshape(num_hp,num_bins)
+		return sums
+	
+	#the galaxies of a bin are contiguous, one reduceat per row
+	starts = np.r_[0,edges]
+	empty = np.r_[edges,num_gal] <= starts
+	for s, W_alpha in kernel_blocks(ell,bee,ell_hp,bee_hp,sigma_theta,truncate,
+	                                chunk):
+		W = {1: W_alpha}
+		if quadratic:
+			W[2] = W_alpha**2
+		for n, (v, power) in enumerate(values):
+			if num_bins == 1:
+				sums[n,s,0] = np.dot(W[power],v)
+			else:
+				#a column of zeros so that a bin can start at num_gal
+				x = np.concatenate((W[power]*v,np.zeros((W_alpha.shape[0],1))),axis=1)
+				x = np.add.reduceat(x,starts,axis=1)
+				x[:,empty] = 0.
+				sums[n,s] = x
+	return sums
+
+def smear_map(cz,r,sigma,ell,bee,ell_hp,bee_hp,sigma_theta=25.*np.pi/180.,
+              weight=False,truncate=None,chunk=1024):
+	"""
+	smear for all the pixels (ell_hp, bee_hp) in one call. The sums over the
+	galaxies are matrix-vector products of the kernel of a chunk of pixels.
+	truncate:
+	    None keeps all the galaxies, the same as smear, otherwise the kernel
+	    is cut at truncate*sigma_theta and a pixel with no galaxy within the
+	    cut gets nan. A cut leaving less than sparse_sky_fraction of the sky
+	    finds the galaxies with a KD-tree, see kernel_pairs.
+	returns:
+	    H_alpha, bar_sigma_alpha, arrays of the size of ell_hp
+	"""
+	sigma_H_inv = sigma/cz 
+	c = 1./sigma_H_inv**2 if weight else np.ones(np.size(cz))
+	sum_W, sum_W_r_cz, sum_W2_sigma2 = _kernel_sums(ell,bee,ell_hp,bee_hp,
+	                   [c, c*r/cz],[c**2*sigma_H_inv**2],sigma_theta,truncate,
+	                   chunk)[:,:,0]
+	
+	H_alpha = sum_W / sum_W_r_cz
+	bar_sigma_alpha = np.sqrt(sum_W2_sigma2) / sum_W * H_alpha**2
+	return H_alpha, bar_sigma_alpha
+
+def smear_shells(cz,r,sigma,ell,bee,ell_hp,bee_hp,radii,sigma_theta=25.*np.pi/180.,
+                 weight=False,truncate=None,chunk=1024):
+	"""
+	smear_map of the galaxies inside and outside every radius in radii, split
+	as in smear_loop: with shell_index = np.where(r < radius)[0][-1] the inner
+	galaxies are [:shell_index] and the outer ones [shell_index:]. The kernel
+	sums of every pixel are binned once by galaxy index between the splits,
+	and the inner and outer sums of all the radii are the cumulative sums
+	of the bins from either end, so the cost barely grows with the number
+	of radii.
+	returns:
+	    Hs_in, sigma_in, Hs_out, sigma_out, arrays of shape (radii.size,
+	    ell_hp.size)
+	"""
+	radii = np.atleast_1d(radii)
+	splits = np.array([np.where(r < radius)[0][-1] for radius in radii])
+	order = np.argsort(splits,kind='mergesort')
+	sigma_H_inv = sigma/cz 
+	c = 1./sigma_H_inv**2 if weight else np.ones(np.size(cz))
+	#bin k has the galaxies between the splits k-1 and k in order, inner
+	#for the radii order[k:] and outer for order[:k]
+	sums = _kernel_sums(ell,bee,ell_hp,bee_hp,[c, c*r/cz],[c**2*sigma_H_inv**2],
+	                    sigma_theta,truncate,chunk,edges=splits[order])
 	
-	Hs[0], sigma_s[0], bar_rs[0] = get_Hs_sigmas_rs(
-	                                      cz=cz[a:b], r=r[a:b],sigma=sigma[a:b])
+	inner = np.cumsum(sums,axis=2)[:,:,:-1]
+	outer = np.cumsum(sums[:,:,::-1],axis=2)[:,:,::-1][:,:,1:]
+	out = []
+	for s in (inner, outer):
+		sum_W, sum_W_r_cz, sum_W2_sigma2 = s
+		H_alpha = sum_W / sum_W_r_cz
+		bar_sigma_alpha = np.sqrt(sum_W2_sigma2) / sum_W * H_alpha**2
+		#back to the order of radii
+		H_alpha[:,order] = H_alpha.copy()
+		bar_sigma_alpha[:,order] = bar_sigma_alpha.copy()
+		out += [H_alpha.T, bar_sigma_alpha.T]
+	return tuple(out)
 
-	for i in xrange(1,binning_type.size-1):
-		a = indices[i]+1
-		b = indices[i+1]+1
-		Hs[i], sigma_s[i], bar_rs[i] = get_Hs_sigmas_rs(
-	                      cz=cz[a:b],
-	                      r=r[a:b],
-	                      sigma=sigma[a:b]
-	                      )
+
+def shell_indices(r,binnings):
+	"""
+	index of the last galaxy with r <= edge for every edge, the same as
+	np.array([np.where(r <= edge)[0][-1] for edge in binning]) for r sorted
+	in distance. binnings is one array of edges or a list of them.
+	"""
+	if isinstance(binnings,list):
+		return [shell_indices(r,binning) for binning in binnings]
+	return np.searchsorted(r,binnings,side='right') - 1
+
+def resample_weights(num_gal,num_resamples,kind='bootstrap',seed=None):
+	"""
+	weights of the galaxies, shape (num_resamples,num_gal), for shell_statistics
+	kind:
+	    'bootstrap': how many times each galaxy is drawn with replacement
+	    'jackknife': 0 for one of num_resamples contiguous groups, 1 otherwise
+	"""
+	if kind == 'bootstrap':
+		rng = np.random.RandomState(seed)
+		return rng.multinomial(num_gal,np.ones(num_gal)/num_gal,
+		                       size=num_resamples).astype(float)
+	if kind == 'jackknife':
+		group = np.arange(num_gal)*num_resamples//num_gal
+		return (group != np.arange(num_resamples)[:,None]).astype(float)
+	raise AssertionError("kind is 'bootstrap' or 'jackknife'")
+
+def shell_statistics(indices,cz,r,sigma,weights=None):
+	"""
+	get_Hs_sigmas_rs of every shell with the shells of get2_Hs_sigmas_rs,
+	[indices[0]:indices[1]] and then [indices[i]+1:indices[i+1]+1]. The
+	shell sums of all the binnings come from one np.add.reduceat.
+	indices:
+	    from shell_indices, one array or a list of them
+	cz, r, sigma:
+	    of the galaxies sorted in distance, cz can also be (num_resamples,
+	    num_gal), e.g. in different frames
+	weights:
+	    None or e.g. resample_weights of shape (num_resamples,num_gal), every
+	    resample is done at once
+	returns:
+	    Hs, sigma_s, bar_rs of shape (num_shells,) or (num_resamples,num_shells),
+	    a list of them for a list of indices
+	"""
+	single = not isinstance(indices,list)
+	if single:
+		indices = [indices]
+	bounds = []
+	for idx in indices:
+		idx = np.asarray(idx)
+		bounds.append(np.column_stack((np.r_[idx[0],idx[1:-1]+1],
+		                               np.r_[idx[1],idx[2:]+1])))
+	bounds = np.concatenate(bounds)
+	
+	a = cz**2/sigma**2
+	b = cz*r /sigma**2
+	c = r/sigma**2 + 0.*cz
+	d = 1./sigma**2 + 0.*cz
+	if weights is not None:
+		a, b, c, d = [weights*x for x in (a,b,c,d)]
+	x = np.array(np.broadcast_arrays(a,b,c,d))
+	#a column of zeros so that a shell can end at the last galaxy
+	x = np.concatenate((x,np.zeros(x.shape[:-1]+(1,))),axis=-1)
+	sums = np.add.reduceat(x,bounds.ravel(),axis=-1)[...,::2]
+	#reduceat gives x[start] for empty shells
+	sums[...,bounds[:,1] <= bounds[:,0]] = 0.
+	sum_a, sum_b, sum_c, sum_d = sums
+	
+	Hs = sum_a / sum_b
+	sigma_1s = sum_a**1.5 / sum_b**2
+	rs = sum_c / sum_d
+	sigma_not = 0.201 #in units of h^-1 Mpc 
+	sigma_0s = Hs * sigma_not / rs
+	sigma_s = np.sqrt(sigma_0s**2 + sigma_1s**2)
+	
+	out = []
+	start = 0
+	for idx in indices:
+		s = slice(start,start+np.size(idx)-1)
+		out.append((Hs[...,s], sigma_s[...,s], rs[...,s]))
+		start = s.stop
+	if single:
+		return out[0]
+	return out
+
+def get2_Hs_sigmas_rs(indices,binning_type,cz,r,sigma):
+	"""
+	Uses function get_Hs_sigmas_rs for a choice of binning, now through
+	shell_statistics
+	returns:
+	        Hs, sigma_s, bar_rs
+	"""
+	#Hs, sigma_s, bar_rs = [ np.zeros(binning_type.size-1) for i in (1,2,3) ]
+	#
+	#a = indices[0]
+	#b = indices[1]
+	#
+	#Hs[0], sigma_s[0], bar_rs[0] = get_Hs_sigmas_rs(
+	#                                      cz=cz[a:b], r=r[a:b],sigma=sigma[a:b])
+	#
+	#for i in xrange(1,binning_type.size-1):
+	#	a = indices[i]+1
+	#	b = indices[i+1]+1
+	#	Hs[i], sigma_s[i], bar_rs[i] = get_Hs_sigmas_rs(
+	#                      cz=cz[a:b],
+	#                      r=r[a:b],
+	#                      sigma=sigma[a:b]
+	#                      )
+	Hs, sigma_s, bar_rs = shell_statistics(indices[:binning_type.size],cz,r,sigma)
 	return  Hs, sigma_s, bar_rs
 
 
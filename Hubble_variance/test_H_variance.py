@@ -22,8 +22,9 @@ bee_comp = bee_comp*np.pi/180.
 binning_1 = np.array([ 2.25, 12.50,25.00,37.50,50.00,62.50,75.00,87.50,100.00,112.50,156.25,417.44])
 binning_2 = np.array([ 6.25,18.75,31.25 ,43.75,56.25,68.75 ,81.25,93.75 ,106.25,118.75, 156.25,417.44])
 
-indices_1 = np.array([np.where(dist_comp <= r_val)[0][-1] for r_val in binning_1])
-indices_2 = np.array([np.where(dist_comp <= r_val)[0][-1] for r_val in binning_2])
+#indices_1 = np.array([np.where(dist_comp <= r_val)[0][-1] for r_val in binning_1])
+#indices_2 = np.array([np.where(dist_comp <= r_val)[0][-1] for r_val in binning_2])
+indices_1, indices_2 = shell_indices(dist_comp,[binning_1,binning_2])
 
 Hs_cmb, sigma_s_cmb, bar_rs_cmb = get2_Hs_sigmas_rs(indices=indices_1,binning_type=binning_1,
                                        cz=cz_comp,r=dist_comp,sigma=sigma_comp)
@@ -100,25 +101,38 @@ def smear_loop(i,radius):
 	cz = cz_lg# #cz_comp
 	sigma = sigma_comp
 	
-	Hs_in, sigma_in, Hs_out, sigma_out = \
-	                                  [np.zeros(ell_hp.size) for i in (1,2,3,4)]
-	for j in xrange(ell_hp.size):
-		Hs_in[j], sigma_in[j] = wrap_smear(cz, sigma,shell_index, ell_hp[j],
-		                                       bee_hp[j], inner=True)
-		Hs_out[j], sigma_out[j] = wrap_smear(cz, sigma,shell_index, ell_hp[j],
-		                                       bee_hp[j], inner=False) 
+	#Hs_in, sigma_in, Hs_out, sigma_out = \
+	#                                  [np.zeros(ell_hp.size) for i in (1,2,3,4)]
+	#for j in xrange(ell_hp.size):
+	#	Hs_in[j], sigma_in[j] = wrap_smear(cz, sigma,shell_index, ell_hp[j],
+	#	                                       bee_hp[j], inner=True)
+	#	Hs_out[j], sigma_out[j] = wrap_smear(cz, sigma,shell_index, ell_hp[j],
+	#	                                       bee_hp[j], inner=False) 
+	#all the pixels at once
+	inner, outer = slice(None,shell_index), slice(shell_index,None)
+	Hs_in, sigma_in = smear_map(cz[inner],dist_comp[inner],sigma[inner],
+	                   ell_comp[inner],bee_comp[inner],ell_hp,bee_hp,
+	                   sigma_theta=25.*np.pi/180.,weight=False)
+	Hs_out, sigma_out = smear_map(cz[outer],dist_comp[outer],sigma[outer],
+	                   ell_comp[outer],bee_comp[outer],ell_hp,bee_hp,
+	                   sigma_theta=25.*np.pi/180.,weight=False)
 	return np.asarray([Hs_in, sigma_in, Hs_out, sigma_out])
 
 
-Hs_sigma = Parallel(n_jobs=num_cores,verbose=5)(delayed(smear_loop)(
-                  i,radius) for radius, i in zip(radii,xrange(radii.size)))
-
-Hs_sigma  = np.asarray(Hs_sigma)
-
-Hs_in     = Hs_sigma[:,0]
-sigma_in  = Hs_sigma[:,1]
-Hs_out    = Hs_sigma[:,2]
-sigma_out = Hs_sigma[:,3]
+#Hs_sigma = Parallel(n_jobs=num_cores,verbose=5)(delayed(smear_loop)(
+#                  i,radius) for radius, i in zip(radii,xrange(radii.size)))
+#
+#Hs_sigma  = np.asarray(Hs_sigma)
+#
+#Hs_in     = Hs_sigma[:,0]
+#sigma_in  = Hs_sigma[:,1]
+#Hs_out    = Hs_sigma[:,2]
+#sigma_out = Hs_sigma[:,3]
+
+#all the radii in one pass, the same splits as smear_loop
+Hs_in, sigma_in, Hs_out, sigma_out = smear_shells(cz_lg,dist_comp,sigma_comp,
+                                ell_comp,bee_comp,ell_hp,bee_hp,radii,
+                                sigma_theta=25.*np.pi/180.,weight=False)
 
 import sys
 for radius, i in zip(radii,xrange(radii.size)):
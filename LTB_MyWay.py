@@ -3,6 +3,55 @@
 import numpy as np
 from scipy.integrate import ode, odeint
 from LTB_housekeeping import ageMpc
+from geodesic_engine import NullGeodesics, LTB_metric
+from CMB_maps import build_map
+from scipy.interpolate import UnivariateSpline as spline_1d
+
+
+class AxialSky(object):
+	"""
+	An observable of an off centre observer in an LTB model as a function of
+	gamma, the angle between the line of sight and the direction to the 
+	centre. Returned by LTB_geodesics.meridian.
+	gamma, values:
+	        the rays traced, 0 <= gamma <= pi, and the observable for each
+	The interpolant is a cubic spline in gamma, made even about gamma=0 and 
+	gamma=pi by reflecting the nodes as the symmetry requires.
+	"""
+	def __init__(self,gamma,values):
+		self.gamma = np.asarray(gamma,dtype=float)
+		self.values = np.asarray(values,dtype=float)
+		inner = slice(1,-1)
+		g = np.concatenate((-self.gamma[inner][::-1],self.gamma,
+		                    2.*np.pi-self.gamma[inner][::-1]))
+		v = np.concatenate((self.values[inner][::-1],self.values,
+		                    self.values[inner][::-1]))
+		self._spline = spline_1d(g,v,s=0)
+
+	def __call__(self,gamma):
+		return self._spline(gamma)
+
+	def project(self,theta,phi,theta_c,phi_c):
+		"""
+		The observable in the directions (theta, phi) on the observer's sky 
+		when the centre is seen in the direction (theta_c, phi_c).
+		"""
+		cos_gamma = np.cos(theta)*np.cos(theta_c) + \
+		            np.sin(theta)*np.sin(theta_c)*np.cos(phi-phi_c)
+		return self(np.arccos(np.clip(cos_gamma,-1.,1.)))
+
+	def healpix_map(self,nside,theta_c,phi_c,nest=False,filename=None):
+		"""
+		HEALPix map of the observable at any nside, centre in the direction 
+		(theta_c, phi_c). RING maps are made a chunk of pixels at a time by
+		CMB_maps.build_map, straight into the .npy file filename if given.
+		"""
+		if not nest:
+			return build_map(nside,lambda theta, phi: 
+			                 self.project(theta,phi,theta_c,phi_c),filename=filename)
+		import healpy as hp
+		theta, phi = hp.pix2ang(nside,np.arange(hp.nside2npix(nside)),nest=nest)
+		return self.project(theta,phi,theta_c,phi_c)
 
 
 class LTB_geodesics():
@@ -13,6 +62,14 @@ class LTB_geodesics():
 	equation removed, owing to the symmetry inherent in the LTB metric. 
 	Here I have not made any simplifications and both theta and phi coordiantes 
 	are evolved. 
+	Passing background=LTB_interp.LTB_Background(...) makes the right hand 
+	side use one fused evaluation for all of E, R and their derivatives 
+	instead of the separate spline calls.
+	The equations are those of geodesic_engine.NullGeodesics with LTB_metric,
+	__call__ and bundle hand over to it.
+	odeint is given the analytic Jacobian of the equations, which needs E_rr
+	(pass E_rr=function, otherwise E_r is differenced numerically) and the 
+	second derivatives of the R splines, see get_E_R_second_derivs.
 	"""
 	def __init__(self, E, E_r, R,R_r,R_rt,R_t, 
 	             num_pt=1600, *args, **kwargs):
@@ -20,6 +77,8 @@ class LTB_geodesics():
 		self.R    = R;    self.R_r = R_r;
 		self.R_rt = R_rt; self.R_t = R_t
 		self.E    = E;    self.E_r = E_r
+		self.background = kwargs.pop('background',None)
+		self.E_rr = kwargs.pop('E_rr',None)
 		
 		self.args      = args
 		self.kwargs    = kwargs
@@ -68,6 +127,8 @@ class LTB_geodesics():
 		"""
 		"""
 		r = np.abs(r)
+		if self.background is not None:
+			return self.background(r,t)
 		R    = self.R.ev(r,t)
 		R_r  = self.R_r.ev(r,t)
 		R_t  = self.R_t.ev(r,t)
@@ -79,187 +140,184 @@ class LTB_geodesics():
 		
 		return (E, E_r, R, R_r, R_rr, R_rt, R_t)
 	
-	def get_init_conds(self,P_obs,Dir,*args,**kwargs):
-		y_init = np.zeros(8)
-		cos = np.cos
-		sin = np.sin
-
-		t, r, theta, phi = P_obs
-		a, b = Dir
-		
-		y_init[0]=t; y_init[1]=r; 
-		y_init[2]=theta
-		y_init[3]=phi 
-		#y_init[4]= -1.
-		#y_init[4]= sin(b-phi)*sin(a)+cos(a)#*(np.sqrt(1.+2.*self.E(r))/self.R_r.ev(r,t)) ## # (
-		#y_init[5]= -(sin(theta)*cos(a)-sin(a)*cos(theta+b-phi))/(r*cos(theta)**2)
-		#y_init[6]= sin(a)*sin(b-phi)/ (r*sin(theta))
-		#c_theta = -0.95*r**2#require - R^2 <= c_theta <= 0 
-		#c_phi = np.sqrt(-0.95*c_theta*np.sin(theta)**2) #reqauire c_phi**2 < -c_theta*sin(theta)**2  
-		#y_init[4] = np.sqrt(1.+2.*self.E(r))*np.sqrt(1.+c_theta/r**2) #plus or minus sign choice
-		#y_init[5] = np.sqrt(-c_theta/r**4-c_phi**2/(r**4*np.sin(theta)**2)) #plus or minus sign choice
-		#y_init[6] = c_phi/(r**2*np.sin(theta)**2) #plus or minus sign choice
-		
-		
-		#y_init[5] = (theta- a)/1e-1/r
-		#y_init[6] = (phi - b)/1e-1/(r*np.sin(theta))
-		#y_init[4] = np.sqrt(1.+2.*self.E(r))*np.sqrt(1.-r**2*y_init[5]**2-\
-		#                               np.sin(theta)**2*r**2*y_init[6]**2)
-		
-		#delta_r = 1e-3
-		#delta_theta = a-theta
-		#delta_phi = b-phi
-		#L01 = np.sqrt(-1+delta_r**2/(1.+2*self.E(r))+delta_theta**2+delta_phi**2)
-		#y_init[4] = -delta_r/L01
-		#y_init[5] = delta_theta/L01
-		#y_init[6] = delta_phi/L01
-		#a = a-theta
-		#a = a+theta
-		b = b-phi
-		sin_a = sin(a)
-		cos_a = cos(a)
-		sin_b = sin(b)
-		cos_b = cos(b)
-		#if ( np.abs(sin_a) < 1.5e-16):
-		#	sin_a = 0.
-		#elif ( np.abs(cos_a) < 1.5e-16):
-		#	cos_a = 0.
-		#elif (np.abs(sin_b) < 1.5e-16):
-		#	sin_b = 0.
-		#elif (np.abs(cos_b) < 1.5e-16):
-		#	cos_b = 0.
-		
-		y_init[4] = -sin_a*cos_b*np.sqrt(1.+2.*self.E(r))
-		y_init[5] = sin_a*sin_b/r
-		y_init[6] = cos_a/(sin(theta)*r)
-		
-		#y_init[4] = np.sqrt(1.+2.*self.E(r))
-		#y_init[5] = 1./r*0.
-		#y_init[6] = 1./(r*sin(theta))*0.
-		
-		
-		print "norm ", y_init[4]**2/np.sqrt(1.+2.*self.E(r))+ \
-		               r**2*(y_init[5]**2+sin(theta)**2*y_init[6]**2)		
-		print "theta_dot, phi_dot, r_dot", y_init[5], y_init[6], y_init[4]
-		print "theta, a, phi, b", theta, a, phi, b
-		y_init[7]=0.	
-		return y_init
-	
-	def LTB_geodesic_derivs_ode(self,z,y,*arg):#(self,y,t,*arg):
+	def get_E_R_second_derivs(self,t,r):
 		"""
+		E_rr, R_rrr, R_rrt, R_rtt, R_tt at (t,|r|), the derivatives of the 
+		quantities of get_E_R_and_derivs that are not among them
 		"""
-		t=y[0]; r=y[1]; theta=y[2]; phi=y[3]
-		sin_theta = np.sin(theta); cos_theta = np.cos(theta)
-		
-		E, E_r, R, R_r, R_rr, R_rt, R_t  = \
-		self.get_E_R_and_derivs(t,r)
-		
-		dt_ds = (1.+z)
-		dr_ds = y[4]
-		dtheta_ds = y[5]
-		dphi_ds = y[6]
-		DA = y[7]
-		ddt_dss = -R_r*R_rt/(1.+2.*E)*dr_ds**2 -\
-		          R*R_t*( dtheta_ds**2 + sin_theta**2*dphi_ds**2 )
-		
-		ds_dz = 1./ddt_dss
-		
-		ddr_dss = -(2.*R_rr*E-R_r*E_r+R_rr)/(1.+2.*E)/R_r*dr_ds**2 - \
-		            2.*R_rt/R_r*dr_ds*dt_ds + \
-		           (1.+2.*E)*R/R_r*(dtheta_ds**2 + sin_theta**2*dphi_ds**2) 
-		ddr_dsz = ddr_dss*ds_dz
-		
-		ddtheta_dss = -2./R*dtheta_ds*(R_r*dr_ds + R_t*dt_ds) + \
-		              sin_theta*cos_theta*dphi_ds**2 
-		ddtheta_dsz = ddtheta_dss*ds_dz
-		
-		ddphi_dss = -2./R*dphi_ds*(R_r*dr_ds + R_t*dt_ds) - \
-		            2.*cos_theta/sin_theta*dtheta_ds*dphi_ds 
-		ddphi_dsz = ddphi_dss*ds_dz
-		
-		dDA_ds = (R_t*dt_ds + R_r*np.abs(dr_ds))*(DA/R)
-		dDA_dz = -dDA_ds*ds_dz
-		
-		dt_dz = dt_ds*ds_dz
-		dr_dz = dr_ds*ds_dz
-		dtheta_dz = dtheta_ds*ds_dz
-		dphi_dz   = dphi_ds*ds_dz
-		
-		return [dt_dz,   dr_dz,   dtheta_dz,   dphi_dz,
-		        ddr_dsz, ddtheta_dsz, ddphi_dsz, dDA_dz]
-
-	def LTB_geodesic_derivs_odeint(self,y,z,*arg):
+		r = np.abs(r)
+		if self.background is not None:
+			return self.background.second_derivs(r,t)
+		if self.E_rr is not None:
+			E_rr = self.E_rr(r)
+		else:
+			h = 1e-6*np.maximum(r,1.)
+			E_rr = (self.E_r(r+h)-self.E_r(r-h))/(2.*h)
+		return (E_rr, self.R_r.ev(r,t,dx=2), self.R_rt.ev(r,t,dx=1),
+		        self.R_rt.ev(r,t,dy=1), self.R_t.ev(r,t,dy=1))
+	
+	def LTB_geodesic_jacobian_odeint(self,y,z,*arg):
 		"""
+		Jacobian diff(derivs_odeint(y,z)[i],y[j]) of the equations of 
+		NullGeodesics(LTB_metric(self)) as the Dfun of odeint, shape (8,8). 
+		Every derivative is written as diff(A/T) = (diff(A) - A/T*diff(T))/T
+		with T = ddt_dss and A the numerator of the component, with 
+		ddt_dss = -R_r*R_rt/(1.+2.*E)*dr_ds**2 - R*R_t*(dtheta_ds**2 + 
+		sin(theta)**2*dphi_ds**2). The partial derivatives are collected 
+		as [d/dt, d/dr, d/dtheta, d/du, d/dv, d/dw] with u, v, w = dr_ds, 
+		dtheta_ds, dphi_ds.
 		"""
-		t=y[0]; r=y[1]; theta=y[2]; phi=y[3]
+		t=y[0]; r=y[1]; theta=y[2]
 		sin_theta = np.sin(theta); cos_theta = np.cos(theta)
+		sin2 = sin_theta**2; sincos = sin_theta*cos_theta
 		
 		E, E_r, R, R_r, R_rr, R_rt, R_t  = \
 		self.get_E_R_and_derivs(t,r)
-		
-		dt_ds = (1.+z)
-		dr_ds = y[4]
-		dtheta_ds = y[5]
-		dphi_ds = y[6]
-		DA = y[7]
-		ddt_dss = -R_r*R_rt/(1.+2.*E)*dr_ds**2 -\
-		          R*R_t*( dtheta_ds**2 + sin_theta**2*dphi_ds**2 )
-		
-		ds_dz = 1./ddt_dss
-		
-		ddr_dss = -(2.*R_rr*E-R_r*E_r+R_rr)/(1.+2.*E)/R_r*dr_ds**2 - \
-		            2.*R_rt/R_r*dr_ds*dt_ds + \
-		           (1.+2.*E)*R/R_r*(dtheta_ds**2 + sin_theta**2*dphi_ds**2) 
-		ddr_dsz = ddr_dss*ds_dz
-		
-		ddtheta_dss = -2./R*dtheta_ds*(R_r*dr_ds + R_t*dt_ds) + \
-		              sin_theta*cos_theta*dphi_ds**2 
-		ddtheta_dsz = ddtheta_dss*ds_dz
-		
-		ddphi_dss = -2./R*dphi_ds*(R_r*dr_ds + R_t*dt_ds) - \
-		            2.*cos_theta/sin_theta*dtheta_ds*dphi_ds 
-		ddphi_dsz = ddphi_dss*ds_dz
-		
-		dDA_ds = (R_t*dt_ds + R_r*np.abs(dr_ds))#*(100./R)
-		dDA_dz = -dDA_ds*ds_dz
-		
-		dt_dz = dt_ds*ds_dz
-		dr_dz = dr_ds*ds_dz
-		dtheta_dz = dtheta_ds*ds_dz
-		dphi_dz   = dphi_ds*ds_dz
-		
-		return [dt_dz,   dr_dz,   dtheta_dz,   dphi_dz,
-		        ddr_dsz, ddtheta_dsz, ddphi_dsz, dDA_dz]
-			
+		E_rr, R_rrr, R_rrt, R_rtt, R_tt = self.get_E_R_second_derivs(t,r)
+		#the background is evaluated at |r| and continued as g_ij(t,|r|), so
+		#the odd r derivatives change sign for r < 0, as in LTB_metric
+		sgn_r = np.where(r < 0.,-1.,1.)
+		R_r, R_rt, E_r, R_rrr, R_rtt = [sgn_r*x for x in (R_r,R_rt,E_r,R_rrr,R_rtt)]
+		
+		a = 1.+z
+		u = y[4]; v = y[5]; w = y[6]
+		X = 1.+2.*E
+		q = v**2 + sin2*w**2
+		zero = 0.*q
+		
+		T = -R_r*R_rt/X*u**2 - R*R_t*q
+		dT = [-(R_rt**2 + R_r*R_rtt)/X*u**2 - (R_t**2 + R*R_tt)*q,
+		      -(R_rr*R_rt + R_r*R_rrt)/X*u**2 + 2.*E_r*R_r*R_rt/X**2*u**2 
+		      -(R_r*R_t + R*R_rt)*q,
+		      -2.*R*R_t*sincos*w**2,
+		      -2.*R_r*R_rt/X*u,
+		      -2.*R*R_t*v,
+		      -2.*R*R_t*sin2*w]
+		
+		g1 = R_rr/R_r - E_r/X
+		g2 = R_rt/R_r
+		g3 = X*R/R_r
+		dg1 = [(R_rrt*R_r - R_rr*R_rt)/R_r**2, 
+		       (R_rrr*R_r - R_rr**2)/R_r**2 - (E_rr*X - 2.*E_r**2)/X**2]
+		dg2 = [(R_rtt*R_r - R_rt**2)/R_r**2, (R_rrt*R_r - R_rt*R_rr)/R_r**2]
+		dg3 = [X*(R_t*R_r - R*R_rt)/R_r**2, 
+		       2.*E_r*R/R_r + X*(R_r**2 - R*R_rr)/R_r**2]
+		A4 = -g1*u**2 - 2.*g2*a*u + g3*q
+		dA4 = [-dg1[i]*u**2 - 2.*dg2[i]*a*u + dg3[i]*q for i in range(2)] + \
+		      [2.*g3*sincos*w**2, -2.*g1*u - 2.*g2*a, 2.*g3*v, 2.*g3*sin2*w]
+		
+		B = R_r*u + R_t*a
+		h = B/R
+		dh = [(R_rt*u + R_tt*a)/R - B*R_t/R**2, 
+		      (R_rr*u + R_rt*a)/R - B*R_r/R**2]
+		cot_theta = cos_theta/sin_theta
+		A5 = -2.*h*v + sincos*w**2
+		dA5 = [-2.*v*dh[0], -2.*v*dh[1], (cos_theta**2-sin2)*w**2,
+		       -2.*v*R_r/R, -2.*h, 2.*sincos*w]
+		A6 = -2.*h*w - 2.*cot_theta*v*w
+		dA6 = [-2.*w*dh[0], -2.*w*dh[1], 2.*v*w/sin2,
+		       -2.*w*R_r/R, -2.*cot_theta*w, -2.*h - 2.*cot_theta*v]
+		#dDA_dz = -A7/T, with R_r at |r|
+		A7 = -(R_t*a + sgn_r*R_r*np.abs(u))
+		dA7 = [-(R_tt*a + sgn_r*R_rt*np.abs(u)), -(R_rt*a + sgn_r*R_rr*np.abs(u)), 
+		       zero, -sgn_r*R_r*np.sign(u), zero, zero]
+		
+		numerators = [(a,   [zero]*6),
+		              (u,   [zero, zero, zero, 1.+zero, zero, zero]),
+		              (v,   [zero, zero, zero, zero, 1.+zero, zero]),
+		              (w,   [zero, zero, zero, zero, zero, 1.+zero]),
+		              (A4, dA4), (A5, dA5), (A6, dA6), (A7, dA7)]
+		#columns t, r, theta, phi, u, v, w, DA
+		columns = [0, 1, 2, None, 3, 4, 5, None]
+		jac = []
+		for A, dA in numerators:
+			f = A/T
+			jac.append([zero if j is None else (dA[j] - f*dT[j])/T 
+			            for j in columns])
+		return np.array(jac)
+
 	def __call__(self,P_obs,Dir,atol=1e-12,rtol=1e-10):#atol=1e-12,rtol=1e-10):
 		"""
 		P_obs: tuple identifying the position of the observer 
 		       (t_obs, r_obs, theta_obs, phi_obs) 
 		Dir: = tuple of angular direction in which the geodesic propagates.
 		       (theta_star , phi_star )
+		Returns the list of the 8 components on z_vec, solved by odeint with
+		the Jacobian above, see geodesic_engine.NullGeodesics
 		"""
-		
-		y_init = self.get_init_conds(P_obs,Dir)
-		#print y_init
-		
-		#r = ode(self.LTB_geodesic_derivs_ode).set_integrator(
-		#                              'vode', method='bdf', with_jacobian=False)
-		#r.set_initial_value(y_init,0.)
-		i = 0
-		#print self.z_vec
-		#while r.successful() and r.t<self.z_vec[-2]:
-		#	r.integrate(r.t+self.z_vec[i+1]-self.z_vec[i])
-		#	i = i + 1
-		#	print r.t, r.y
-		#	print r.y[4]**2*self.R_r.ev(np.abs(r.y[1]),r.y[0])**2/(1.+2.*self.E(np.abs(r.y[1])))+\
-		#	      self.R.ev(np.abs(r.y[1]),r.y[0])**2*(r.y[5]**2+np.sin(r.y[2])**2*r.y[6]**2)-(1.+r.t)**2
-		#	#print ("%g %9g" %(r.t,r.y))
-		odeint_ans = odeint(func=self.LTB_geodesic_derivs_odeint,y0=y_init,
-		t=self.z_vec,
-		args=(),Dfun=None,full_output=0,rtol=rtol,atol=atol,mxstep=10**5)
-		
-		return [odeint_ans[:,i] for i in range(8)]
-
-
+		return self.null_geodesics()(P_obs,Dir,atol=atol,rtol=rtol)
 
+	def null_geodesics(self):
+		"""
+		the same model for geodesic_engine.NullGeodesics
+		"""
+		return NullGeodesics(LTB_metric(self),z_vec=self.z_vec)
+	
+	def bundle(self,P_obs,Dirs,atol=1e-12,rtol=1e-10,t_stop=None,z_stop=None,
+	           r_stop=None,z_out=None,dense=False):
+		"""
+		All directions in one go, see geodesic_engine.NullGeodesics.bundle
+		for the arguments and the returns, e.g. t_stop at last scattering.
+		"""
+		return self.null_geodesics().bundle(P_obs,Dirs,atol=atol,rtol=rtol,
+		                 t_stop=t_stop,z_stop=z_stop,r_stop=r_stop,z_out=z_out,
+		                 dense=dense)
 
+	def meridian(self,P_obs,observable,num_gamma=17,max_rays=1025,
+	             atol=1e-8,rtol=1e-6,geo_atol=1e-12,geo_rtol=1e-10,
+	             t_stop=None,z_stop=None,r_stop=None):
+		"""
+		For an off centre observer everything depends only on the angle gamma
+		to the centre, so it is enough to trace rays in one plane through the
+		centre and the observer. Rays are added by bisecting the gamma 
+		intervals where the spline through the rays traced so far misses the
+		new ray by more than atol + rtol*|observable|, until all agree or 
+		max_rays is reached.
+		P_obs: (t_obs, r_obs, theta_obs, phi_obs), only t_obs and r_obs matter
+		observable:
+		        function of the bundle output of shape (num_rays,8,num_pt), 
+		        returns one number per ray, e.g. the redshift at decoupling.
+		        With one of t_stop, z_stop, r_stop the rays end there (see
+		        bundle) and observable gets the redshifts (num_rays,) and 
+		        states (8,num_rays) where they stopped instead.
+		Returns an AxialSky.
+		"""
+		t_obs, r_obs = P_obs[0], P_obs[1]
+		#equatorial plane, gamma = 0 points at the centre
+		P_eq = [t_obs, r_obs, np.pi/2., 0.]
+		event = t_stop is not None or z_stop is not None or r_stop is not None
+		def trace(gamma):
+			#the radial ray through r=0 sees R(|r|) and is not continued 
+			#correctly, a ray missing the centre by r_obs*1e-6 is used instead.
+			#The observable is even in gamma so the error is O(1e-12).
+			gamma = np.maximum(gamma,1e-6)
+			Dirs = np.column_stack((gamma-np.pi/2.,np.zeros_like(gamma)))
+			if event:
+				geos, status, z_event, y_event = self.bundle(P_eq,Dirs,
+				    atol=geo_atol,rtol=geo_rtol,t_stop=t_stop,z_stop=z_stop,
+				    r_stop=r_stop,z_out=self.z_vec[[0,-1]])
+				values = np.array(observable(z_event,y_event),dtype=float)
+				values[status != 1] = np.nan
+				return values
+			geos, status = self.bundle(P_eq,Dirs,atol=geo_atol,rtol=geo_rtol)
+			values = np.array(observable(geos),dtype=float)
+			values[status != 0] = np.nan
+			return values
+		
+		gamma = np.linspace(0.,np.pi,num_gamma)
+		values = trace(gamma)
+		refine = np.ones(gamma.size-1,dtype=bool)
+		while refine.any():
+			mid = 0.5*(gamma[:-1]+gamma[1:])[refine]
+			if gamma.size + mid.size > max_rays:
+				print "meridian: max_rays reached before the tolerance"
+				break
+			predicted = AxialSky(gamma,values)(mid)
+			new = trace(mid)
+			bad = ~(np.abs(new-predicted) <= atol + rtol*np.abs(new))
+			order = np.argsort(np.concatenate((gamma,mid)))
+			gamma = np.concatenate((gamma,mid))[order]
+			values = np.concatenate((values,new))[order]
+			bad_mid = np.isin(gamma,mid[bad])
+			refine = bad_mid[:-1] | bad_mid[1:]
+		return AxialSky(gamma,values)
@@ -1,8 +1,10 @@
 #!/usr/bin/env python2.7
 #from __future__ import division
 import numpy as np
+import copy
 from scipy.integrate import ode, odeint
 from LTB_series import t_series, d_t_series_dR, d_t_series_dE, d_t_series_dM
+from geodesic_engine import NullGeodesics, LTB_metric
 
 class LTB_ScaleFactor():
 	"""
@@ -15,6 +17,9 @@ class LTB_ScaleFactor():
 	     Optional extra positional arguments for E(r), M(r), diff(E(r),r), diff(M(r),r)
 	kwargs:
 	     Optional extra positional arguments for E(r), M(r), diff(E(r),r), diff(M(r),r)
+	     cache=LTB_cache.BackgroundCache(...) makes __call__ and evolve_shells 
+	     load their results from the cache when the model, grid and tolerances 
+	     are the same as in an earlier run.
 	"""
 	def __init__(self, Lambda,LTB_E, LTB_Edash, LTB_M, LTB_Mdash, *args, **kwargs):
 		self.Lambda    = Lambda
@@ -22,6 +27,7 @@ class LTB_ScaleFactor():
 		self.LTB_Edash = LTB_Edash
 		self.LTB_M     = LTB_M
 		self.LTB_Mdash = LTB_Mdash
+		self.cache     = kwargs.pop('cache',None)
 		self.args      = args
 		self.kwargs    = kwargs
 		# i stands for integer index
@@ -57,6 +63,22 @@ class LTB_ScaleFactor():
 		"""
 		return self.LTB_Mdash(r, *self.args, **self.kwargs)
 	
+	def _cached(self,method,r,settings):
+		"""
+		method(self,r,**settings) from self.cache. The key is made of the 
+		class, Lambda, E, M and their derivatives at r, and the settings.
+		"""
+		key = self.cache.key(self.__class__.__name__,method.__name__,self.Lambda,
+		                     np.asarray(r,dtype=float),self.get_E(r),self.get_dEdr(r),
+		                     self.get_M(r),self.get_dMdr(r),sorted(settings.items()))
+		ans = self.cache.get(key)
+		if ans is None:
+			uncached = copy.copy(self)
+			uncached.cache = None
+			ans = method(uncached,r,**settings)
+			self.cache.put(key,ans)
+		return ans
+	
 	def LTB_ScaleFactor_derivs(self,t,y,E,dEdr,M,dMdr,Lambda):
 		"""
 		Returns the partial derivatives, diff(R(t,r),t) , diff(R(t,r),t,t) and
@@ -107,10 +129,36 @@ class LTB_ScaleFactor():
 		return dy_dt
 	
 	def LTB_ScaleFactor_Jac(self,t,y,E,dEdr,M,dMdr,Lambda):
-		raise NotImplementedError('Yo king! Look at LTB_ScaleFactor_derivs and supply the Jacobian, peace.')
-
+		"""
+		Returns the Jacobian of LTB_ScaleFactor_derivs w.r.t y, i.e.
+		jac[i,j] = diff(dy_dt[i],y[j]). Note that diff(R(t,r),t) is fixed by the
+		constraint equation from R(t,r) alone so nothing depends on y[i_Rdot].
+		If y has shape (3,n) the Jacobian has shape (3,3,n).
+		"""
+		i_R = self.i_R; i_Rdot = self.i_Rdot; i_Rdash = self.i_Rdash
+		R = y[i_R]; Rdash = y[i_Rdash]
+		
+		Rdot    = np.sqrt(2.*E + 2.*M/R + Lambda/3.*R**2)
+		Rdotdot = -M/R**2 + Lambda/3.*R
+		Rdashdot = 1./Rdot* (dEdr + dMdr/R + Rdotdot*Rdash)
+		# diff(Rdotdot,R)
+		Rdotdot_R = 2.*M/R**3 + Lambda/3.
+		
+		jac = np.zeros((3,3)+np.shape(R*E))
+		jac[i_R,i_R]         = Rdotdot/Rdot
+		jac[i_Rdot,i_R]      = Rdotdot_R
+		jac[i_Rdash,i_R]     = (-dMdr/R**2 + Rdotdot_R*Rdash)/Rdot - Rdashdot*Rdotdot/Rdot**2
+		jac[i_Rdash,i_Rdash] = Rdotdot/Rdot
+		return jac
 	
-	def __call__(self,r_loc,R_init=1e-8,t_max=30.*307.,num_pt=20000,atol=1e-12,rtol=1e-10):
+	def LTB_ScaleFactor_Jac_odeint(self,y,t,E,dEdr,M,dMdr,Lambda):
+		"""
+		LTB_ScaleFactor_Jac with the argument order expected by odeint's Dfun
+		"""
+		return self.LTB_ScaleFactor_Jac(t,y,E,dEdr,M,dMdr,Lambda)
+	
+	def __call__(self,r_loc,R_init=1e-8,t_max=30.*307.,num_pt=20000,atol=1e-12,rtol=1e-10,
+	             stiff=False):
 		"""
 		At a given comoving radial coordinate r=r_loc evolve  diff(R(t,r),t) , 
 		diff(R(t,r),t,t) and diff(R(t,r),r,t) starting from a time t_init when 
@@ -129,6 +177,11 @@ class LTB_ScaleFactor():
 		       number of time steps between time t_init and t0 (age of universe today)
 		atol, rtol:
 		       are absolute and relative error tolerances for the ode solver
+		stiff:
+		      if True the warm-up uses lsoda (switching to BDF once the problem
+		      turns stiff) with the analytic Jacobian LTB_ScaleFactor_Jac, which 
+		      is also handed to odeint as Dfun. Use it for shells deep in the 
+		      void or when R gets close to zero.
 		t_vec:
 		     vector of size num_pt containing time values t
 		R_vec:
@@ -144,6 +197,9 @@ class LTB_ScaleFactor():
 		
 		Returns t_vec, R_vec, Rdot_vec, Rdotdot_vec, Rdashdot_vec
 		"""
+		if self.cache is not None:
+			return self._cached(LTB_ScaleFactor.__call__,r_loc,dict(R_init=R_init,
+			       t_max=t_max,num_pt=num_pt,atol=atol,rtol=rtol,stiff=stiff))
 		i_R     = self.i_R
 		i_Rdot  = self.i_Rdot
 		i_Rdash = self.i_Rdash
@@ -173,12 +229,14 @@ class LTB_ScaleFactor():
 		crap, Rdotdot_vec[0], Rdashdot_vec[0] = self.LTB_ScaleFactor_derivs(t_init,y_init,E,dEdr,M,dMdr,Lambda)
 		#print "at t_init, y is ", Y_init
 		
-		evolve_LTB = ode(self.LTB_ScaleFactor_derivs).set_integrator('vode', method='adams', with_jacobian=False,atol=atol, rtol=rtol)
-		evolve_LTB.set_initial_value(y_init, t_init).set_f_params(E,dEdr,M,dMdr,Lambda)
-		#If you wish to experiment with the Jacobian uncomment the two lines below 
-		#and implement the function LTB_ScaleFactor_Jac
-		#evolve_LTB = ode(self.LTB_ScaleFactor_derivs,self.LTB_ScaleFactor_Jac).set_integrator('vode', method='Bdf', with_jacobian=True,atol=atol, rtol=rtol)
-		#evolve_LTB.set_initial_value(y_init, t_init).set_f_params(E,dEdr,M,dMdr,Lambda).set_jac_params(E,dEdr,M,dMdr,Lambda)
+		if stiff:
+			evolve_LTB = ode(self.LTB_ScaleFactor_derivs,self.LTB_ScaleFactor_Jac).set_integrator('lsoda', with_jacobian=True,atol=atol, rtol=rtol,nsteps=10**5)
+			evolve_LTB.set_initial_value(y_init, t_init).set_f_params(E,dEdr,M,dMdr,Lambda).set_jac_params(E,dEdr,M,dMdr,Lambda)
+			Dfun = self.LTB_ScaleFactor_Jac_odeint
+		else:
+			evolve_LTB = ode(self.LTB_ScaleFactor_derivs).set_integrator('vode', method='adams', with_jacobian=False,atol=atol, rtol=rtol)
+			evolve_LTB.set_initial_value(y_init, t_init).set_f_params(E,dEdr,M,dMdr,Lambda)
+			Dfun = None
 		
 		#log distributed time steps
 		#t_vec = np.logspace(np.log10(t_init),np.log10(2.01),num=num_pt,endpoint=True)
@@ -208,7 +266,7 @@ class LTB_ScaleFactor():
 		#	i = i+1
 		
 		odeint_ans = odeint(func=self.LTB_ScaleFactor_derivs_odeint,y0=np.array([R_vec[0], Rdot_vec[0], Rdash_vec[0]]),t=t_vec,
-		args=(E,dEdr,M,dMdr,Lambda),Dfun=None,full_output=0,rtol=rtol,atol=atol)
+		args=(E,dEdr,M,dMdr,Lambda),Dfun=Dfun,full_output=0,rtol=rtol,atol=atol)
 		#use odeint_ans, myfull_out  when setting full_output to True
 
 		R_vec = odeint_ans[:,0]; Rdot_vec = odeint_ans[:,1]; Rdash_vec = odeint_ans[:,2]
@@ -219,6 +277,111 @@ class LTB_ScaleFactor():
 		#print Rdashdot_vec[0] , 'and', Rdotdot_vec[0]
 		return t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec
 
+	def LTB_ScaleFactor_derivs_shells(self,y,t,E,dEdr,M,dMdr,Lambda):
+		"""
+		LTB_ScaleFactor_derivs for all radial shells at once. y is the
+		flattened state of num_r shells stored shell after shell i.e.
+		y = [R_0, Rdot_0, Rdash_0, R_1, Rdot_1, Rdash_1, ...] so that the
+		Jacobian is banded with two sub- and two super-diagonals.
+		"""
+		dy_dt = self.LTB_ScaleFactor_derivs(t,y.reshape(-1,3).T,E,dEdr,M,dMdr,Lambda)
+		return dy_dt.T.ravel()
+
+	def LTB_ScaleFactor_Jac_shells(self,y,t,E,dEdr,M,dMdr,Lambda):
+		"""
+		Banded Jacobian of LTB_ScaleFactor_derivs_shells in the storage odeint 
+		expects for ml=mu=2, i.e. band[i-j+2,j] = diff(dy_dt[i],y[j]).
+		"""
+		jac = self.LTB_ScaleFactor_Jac(t,y.reshape(-1,3).T,E,dEdr,M,dMdr,Lambda)
+		num_r = jac.shape[-1]
+		band = np.zeros((5,num_r,3))
+		for i in range(3):
+			for j in range(3):
+				band[i-j+2,:,j] = jac[i,j]
+		return band.reshape(5,3*num_r)
+
+	def _shells_warmup_derivs(self,y,s,t_init,t_span,E,dEdr,M,dMdr,Lambda):
+		"""
+		The shells start from different t_init. With t = t_init + s*t_span
+		they are all evolved together in s from s=0 to s=1.
+		"""
+		dy_ds = self.LTB_ScaleFactor_derivs(t_init+s*t_span,y.reshape(-1,3).T,
+		                                    E,dEdr,M,dMdr,Lambda)*t_span
+		return dy_ds.T.ravel()
+
+	def _shells_warmup_Jac(self,y,s,t_init,t_span,E,dEdr,M,dMdr,Lambda):
+		"""
+		Banded Jacobian of _shells_warmup_derivs
+		"""
+		band = self.LTB_ScaleFactor_Jac_shells(y,t_init+s*t_span,E,dEdr,M,dMdr,Lambda)
+		return band*np.repeat(t_span,3)
+
+	def evolve_shells(self,r_vector,R_init=1e-8,t_max=30.*307.,num_pt=20000,
+	                  atol=1e-12,rtol=1e-10,stiff=False):
+		"""
+		Same as __call__ but for all the comoving radial coordinates in r_vector
+		at once. The num_r shells are evolved together as one system of 3*num_r
+		equations, first from their own t_init to t=1e-6 and then along the
+		common t_vec. This avoids one odeint call (and one pickled task) per shell.
+		r_vector:
+		         the comoving radial coordinates, size num_r
+		R_init, t_max, num_pt, atol, rtol, stiff:
+		         as in __call__. With stiff=True the banded analytic Jacobian 
+		         LTB_ScaleFactor_Jac_shells is handed to odeint.
+		t_vec:
+		      vector of size num_pt, the same for all shells
+		R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec:
+		      arrays of shape (num_r, num_pt), row i belongs to r_vector[i]
+
+		Returns t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec
+		"""
+		if self.cache is not None:
+			return self._cached(LTB_ScaleFactor.evolve_shells,r_vector,dict(
+			       R_init=R_init,t_max=t_max,num_pt=num_pt,atol=atol,rtol=rtol,
+			       stiff=stiff))
+		r_vector = np.asarray(r_vector,dtype=float)
+		num_r = r_vector.size
+		zeros = np.zeros(num_r)
+
+		Lambda = self.Lambda
+		E    = self.get_E(r_vector) + zeros
+		dEdr = self.get_dEdr(r_vector) + zeros
+		M    = self.get_M(r_vector) + zeros
+		dMdr = self.get_dMdr(r_vector) + zeros
+
+		t_init = t_series(R=R_init,E=E,M=M,Lambda=Lambda)
+		dt_dR  = d_t_series_dR(R=R_init,E=E,M=M,Lambda=Lambda)
+		y_init = np.empty((num_r,3))
+		y_init[:,self.i_R] = R_init
+		y_init[:,self.i_Rdot] = 1./dt_dR
+		y_init[:,self.i_Rdash] = -(d_t_series_dE(R=R_init,E=E,M=M,Lambda=Lambda)*dEdr +
+		        d_t_series_dM(R=R_init,E=E,M=M,Lambda=Lambda)*dMdr)/dt_dR
+
+		t_vec = np.logspace(np.log10(1e-6),np.log10(t_max),num=num_pt,endpoint=True)
+
+		if stiff:
+			Dfun_warmup = self._shells_warmup_Jac
+			Dfun = self.LTB_ScaleFactor_Jac_shells
+		else:
+			Dfun_warmup = None
+			Dfun = None
+
+		t_span = t_vec[0] - t_init
+		warmup_ans = odeint(func=self._shells_warmup_derivs,y0=y_init.ravel(),
+		t=np.array([0.,1.]),args=(t_init,t_span,E,dEdr,M,dMdr,Lambda),
+		Dfun=Dfun_warmup,ml=2,mu=2,full_output=0,rtol=rtol,atol=atol,mxstep=10**5)
+
+		odeint_ans = odeint(func=self.LTB_ScaleFactor_derivs_shells,y0=warmup_ans[-1],
+		t=t_vec,args=(E,dEdr,M,dMdr,Lambda),Dfun=Dfun,ml=2,mu=2,full_output=0,
+		rtol=rtol,atol=atol,mxstep=10**5)
+		#odeint_ans has shape (num_pt, 3*num_r), bring it to (3, num_r, num_pt)
+		y = odeint_ans.reshape(num_pt,num_r,3).transpose(2,1,0)
+		R_vec = y[self.i_R]; Rdot_vec = y[self.i_Rdot]; Rdash_vec = y[self.i_Rdash]
+
+		crap, Rdotdot_vec, Rdashdot_vec = self.LTB_ScaleFactor_derivs(t_vec,y,
+		              E[:,None],dEdr[:,None],M[:,None],dMdr[:,None],Lambda)
+		return t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec
+
 
 class LTB_geodesics():
 	"""
@@ -267,6 +430,21 @@ class LTB_geodesics():
 		self.z_vec = z
 		return
 	
+	def get_E_R_and_derivs(self,t,r):
+		"""
+		E, E_r, R, R_r, R_rr, R_rt, R_t at (t,|r|) in the order of 
+		LTB_MyWay.LTB_geodesics.get_E_R_and_derivs
+		"""
+		r = np.abs(r)
+		return (self.E(r), self.Edash(r), self.R.ev(r,t), self.Rdash.ev(r,t),
+		        self.Rdash.ev(r,t,dx=1), self.Rdashdot.ev(r,t), self.Rdot.ev(r,t))
+	
+	def null_geodesics(self):
+		"""
+		the same model for geodesic_engine.NullGeodesics, with theta and phi
+		"""
+		return NullGeodesics(LTB_metric(self),z_vec=self.z_vec)
+	
 	def LTB_geodesic_derivs(self,t,y,J):
 		"""
 		Returns the derivatives w.r.t redshift ``tau``, [tau]=Mpc, for 
@@ -0,0 +1,144 @@
+#!/usr/bin/env python2.7
+####################################################
+# On disk cache of background solutions, so that rerunning a driver with the
+# same model does not solve for E(r) and R(t,r) again.
+#
+# An entry is keyed by a hash of everything the solution depends on: the
+# profile functions evaluated on the radial grid, Lambda, the time grid and the
+# tolerances. The arrays of an entry are .npy files in a directory of its own,
+# so they can be loaded memory mapped. Entries are evicted least recently used
+# first once the cache grows beyond max_bytes.
+#
+import numpy as np
+import hashlib
+import os
+import shutil
+import tempfile
+
+#change to invalidate all entries, e.g. when a solver changes its output
+_version = 1
+
+class BackgroundCache(object):
+	"""
+	directory:
+	        where the entries live, default $LTB_CACHE_DIR or ~/.LTB_cache
+	max_bytes:
+	        size above which the least recently used entries are removed
+	mmap_mode:
+	        None to read the arrays into memory, 'r' to memory map them
+	Typical use, see LTB_ScaleFactor and get_2E_over_r3:
+	        key = cache.key('name',inputs...)
+	        ans = cache.get(key)
+	        if ans is None:
+	                ans = solve(...)
+	                cache.put(key,ans)
+	"""
+	def __init__(self,directory=None,max_bytes=2**31,mmap_mode=None):
+		if directory is None:
+			directory = os.environ.get('LTB_CACHE_DIR',
+			                     os.path.join(os.path.expanduser('~'),'.LTB_cache'))
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.mmap_mode = mmap_mode
+
+	def key(self,*parts):
+		"""
+		hex digest of the parts: arrays by dtype, shape and content, numbers
+		and strings by value, lists and tuples element by element
+		"""
+		h = hashlib.sha1(repr(('BackgroundCache',_version)).encode('utf8'))
+		def update(part):
+			if isinstance(part,(list,tuple)):
+				h.update(('%s%d(' % (type(part).__name__,len(part))).encode('utf8'))
+				for p in part:
+					update(p)
+				h.update(b')')
+			elif isinstance(part,np.ndarray):
+				a = np.ascontiguousarray(part)
+				h.update(('array%s%s' % (a.dtype.str,a.shape)).encode('utf8'))
+				h.update(a.view(np.uint8).tobytes())
+			else:
+				if isinstance(part,np.generic):
+					part = part.item()
+				h.update(repr(part).encode('utf8'))
+		update(parts)
+		return h.hexdigest()
+
+	def _path(self,key):
+		return os.path.join(self.directory,key)
+
+	def get(self,key):
+		"""
+		the tuple of arrays stored under key, None if there is none
+		"""
+		path = self._path(key)
+		try:
+			num = int(open(os.path.join(path,'num')).read())
+			ans = tuple(np.load(os.path.join(path,'%d.npy' % i),
+			                    mmap_mode=self.mmap_mode) for i in range(num))
+		except (IOError, OSError, ValueError):
+			return None
+		#the modification time of the entry is its last use
+		try:
+			os.utime(path,None)
+		except OSError:
+			pass
+		return ans
+
+	def put(self,key,arrays):
+		"""
+		store the tuple of arrays under key and evict old entries
+		"""
+		arrays = tuple(np.asarray(a) for a in arrays)
+		#written aside and renamed so that other processes never see half of it
+		tmp = tempfile.mkdtemp(prefix='.tmp_',dir=self.directory)
+		for i, a in enumerate(arrays):
+			np.save(os.path.join(tmp,'%d.npy' % i),a)
+		open(os.path.join(tmp,'num'),'w').write('%d' % len(arrays))
+		try:
+			os.rename(tmp,self._path(key))
+		except OSError:
+			#someone else stored it first
+			shutil.rmtree(tmp,ignore_errors=True)
+		self.evict(keep=key)
+
+	def entries(self):
+		"""
+		list of (last use, bytes, key) of all entries
+		"""
+		out = []
+		for key in os.listdir(self.directory):
+			path = self._path(key)
+			if key.startswith('.') or not os.path.isdir(path):
+				continue
+			try:
+				size = sum(os.path.getsize(os.path.join(path,f))
+				           for f in os.listdir(path))
+				out.append((os.path.getmtime(path),size,key))
+			except OSError:
+				pass
+		return out
+
+	def size(self):
+		return sum(size for used, size, key in self.entries())
+
+	def evict(self,keep=None):
+		"""
+		remove the least recently used entries until the cache is below
+		max_bytes, never the entry keep
+		"""
+		entries = sorted(self.entries())
+		total = sum(size for used, size, key in entries)
+		for used, size, key in entries:
+			if total <= self.max_bytes:
+				break
+			if key == keep:
+				continue
+			shutil.rmtree(self._path(key),ignore_errors=True)
+			total -= size
+
+	def clear(self):
+		for used, size, key in self.entries():
+			shutil.rmtree(self._path(key),ignore_errors=True)
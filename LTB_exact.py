@@ -0,0 +1,468 @@
+#!/usr/bin/env python2.7
+####################################################
+# Closed form background for LTB models, no ode solver involved.
+#
+# Lambda = 0:
+# With dt = R dpsi the Friedmann equation
+#             diff(R(t,r),t)**2 = 2E(r) + 2M(r)/R(t,r)
+# is solved by the parametric (eta) solutions
+#  E > 0:  R = M/(2E)*(cosh(eta)-1),   t = M/(2E)**1.5*(sinh(eta)-eta)
+#  E = 0:  R = (9M/2)**(1/3)*t**(2/3)
+#  E < 0:  R = M/(-2E)*(1-cos(eta)),   t = M/(-2E)**1.5*(eta-sin(eta))
+# with eta = sqrt(2|E|)*psi. Written with the Stumpff functions C(z), S(z)
+# and z = -2E*psi**2 the three cases are one formula
+#             R = M*psi**2*C(z),   t = M*psi**3*S(z)
+# which has no trouble as E(r) goes through zero. 
+#
+# Lambda != 0:
+# The age integral 
+#             t = int_0^R dR/sqrt(2E + 2M/R + Lambda/3*R**2)
+# becomes with w = 1/R and u_1, u_2, u_3 the roots of 2M w**3 + 2E w**2 + Lambda/3
+#             t = 2/3/sqrt(2M)*RJ(1/R-u_1,1/R-u_2,1/R-u_3,1/R)
+# with RJ Carlson's symmetric elliptic integral of the third kind, see
+# B. C. Carlson, ``Numerical computation of real or complex elliptic integrals``
+# Numerical Algorithms 10 (1995) 13, arXiv:math/9409227. R(t) is then found by
+# Newton's method.
+#
+# In both cases the bang time is t=0 for every shell, the same choice 
+# LTB_ScaleFactor makes through t_series.
+#
+import numpy as np
+from LTB_Sclass_v2 import LTB_ScaleFactor
+
+def stumpff(z,derivs=True,num_terms=10):
+	"""
+	Returns the Stumpff functions C(z), S(z) and, if derivs is True, their
+	derivatives diff(C(z),z), diff(S(z),z).
+	C(z) = (1-cos(sqrt(z)))/z, S(z) = (sqrt(z)-sin(sqrt(z)))/z**1.5 for z>0
+	and the cosh/sinh versions for z<0. The power series is used for |z|<1
+	where the closed forms lose digits.
+	"""
+	z = np.asarray(z,dtype=float)
+	C = np.empty_like(z); S = np.empty_like(z)
+
+	small = np.abs(z) < 1.
+	zs = z[small]
+	# Horner on sum (-z)**k/(2k+2)! and sum (-z)**k/(2k+3)!
+	fact = [1.]
+	for n in range(1,2*num_terms+2):
+		fact.append(fact[-1]*n)
+	Cs = 0.; Ss = 0.
+	for k in range(num_terms-1,-1,-1):
+		Cs = 1./fact[2*k+2] - zs*Cs
+		Ss = 1./fact[2*k+3] - zs*Ss
+	C[small] = Cs; S[small] = Ss
+
+	pos = z >= 1.
+	x = np.sqrt(z[pos])
+	C[pos] = (1.-np.cos(x))/z[pos]
+	S[pos] = (x-np.sin(x))/x**3
+
+	neg = z <= -1.
+	x = np.sqrt(-z[neg])
+	C[neg] = (np.cosh(x)-1.)/(-z[neg])
+	S[neg] = (np.sinh(x)-x)/x**3
+	if not derivs:
+		return C, S
+
+	dC = np.empty_like(z); dS = np.empty_like(z)
+	dCs = 0.; dSs = 0.
+	for k in range(num_terms-1,0,-1):
+		dCs = -k/fact[2*k+2] - zs*dCs
+		dSs = -k/fact[2*k+3] - zs*dSs
+	dC[small] = dCs; dS[small] = dSs
+	large = ~small
+	zl = z[large]
+	dC[large] = (1.-zl*S[large]-2.*C[large])/(2.*zl)
+	dS[large] = (C[large]-3.*S[large])/(2.*zl)
+	return C, S, dC, dS
+
+def _carlson_RC1(e):
+	"""
+	RC(1,1+e) for real e > -1, i.e. arctan(sqrt(e))/sqrt(e) for e > 0 and
+	arctanh(sqrt(-e))/sqrt(-e) for e < 0, with the series for small |e|
+	"""
+	e = np.asarray(e)
+	rc = np.array(1. + e*(-1./3. + e*(1./5. + e*(-1./7. + e*(1./9. - e/11.)))))
+	large = np.abs(e) >= 1e-3
+	if large.any():
+		el = e[large]
+		se = np.sqrt(np.abs(el))
+		rc[large] = np.where(el > 0.,np.arctan(se),np.arctanh(np.minimum(se,1.)))/se
+	return rc
+
+def carlson_RD(x,y,z,rtol=1e-16):
+	"""
+	Carlson's symmetric elliptic integral of the second kind
+	RD(x,y,z) = 3/2 int_0^inf dt/sqrt((t+x)*(t+y)*(t+z)**3)
+	by the duplication algorithm of arXiv:math/9409227. Everything broadcasts,
+	the arguments may be complex (x and y a conjugate pair). The result is
+	complex.
+	"""
+	x, y, z = np.broadcast_arrays(*[np.asarray(a,dtype=complex) for a in (x,y,z)])
+	A0 = (x+y+3.*z)/5.
+	Q = (rtol/4.)**(-1./6.)*np.maximum(np.maximum(abs(A0-x),abs(A0-y)),abs(A0-z))
+	x0 = x; y0 = y
+	A = A0; fac = 1.; total = 0.
+	while np.any(fac*Q >= abs(A)):
+		sx = np.sqrt(x); sy = np.sqrt(y); sz = np.sqrt(z)
+		lam = sx*sy + sx*sz + sy*sz
+		total = total + fac/(sz*(z+lam))
+		x = (x+lam)/4.; y = (y+lam)/4.; z = (z+lam)/4.
+		A = (A+lam)/4.; fac = fac/4.
+	X = fac*(A0-x0)/A; Y = fac*(A0-y0)/A
+	Z = -(X+Y)/3.
+	E2 = X*Y - 6.*Z**2
+	E3 = (3.*X*Y - 8.*Z**2)*Z
+	E4 = 3.*(X*Y - Z**2)*Z**2
+	E5 = X*Y*Z**3
+	return fac*A**-1.5*(1. - 3./14.*E2 + E3/6. + 9./88.*E2**2 - 3./22.*E4 -
+	                    9./52.*E2*E3 + 3./26.*E5) + 3.*total
+
+def carlson_RJ_pair(xy_sum,xy_prod,z,p,rtol=1e-16):
+	"""
+	Carlson's symmetric elliptic integral of the third kind
+	RJ(x,y,z,p) = 3/2 int_0^inf dt/((t+p)*sqrt((t+x)*(t+y)*(t+z)))
+	by the duplication algorithm of arXiv:math/9409227, for z, p > 0 and x, y
+	either both real or a complex conjugate pair. x and y only enter through 
+	xy_sum = x+y and xy_prod = x*y which are real in both cases, so is all the
+	arithmetic. Everything broadcasts.
+	"""
+	S, P, z, p = np.broadcast_arrays(*[np.asarray(a,dtype=float) for a in (xy_sum,xy_prod,z,p)])
+	A0 = (S+z+2.*p)/5.
+	delta = (p**2-p*S+P)*(p-z)
+	#max(|A0-x|,|A0-y|) <= |A0-S/2| + sqrt(|S**2/4-P|)
+	Q = (rtol/4.)**(-1./6.)*np.maximum(np.maximum(abs(A0-S/2.)+np.sqrt(abs(S**2/4.-P)),
+	                                   abs(A0-z)),abs(A0-p))
+	S0 = S; P0 = P; z0 = z
+	A = A0; fac = 1.; total = 0.
+	while np.any(fac*Q >= abs(A)):
+		# sqrt(x)*sqrt(y) and sqrt(x)+sqrt(y)
+		sxy = np.sqrt(P); sx_sy = np.sqrt(S+2.*sxy)
+		sz = np.sqrt(z); sp = np.sqrt(p)
+		lam = sxy + sx_sy*sz
+		d = (p + sp*sx_sy + sxy)*(sp+sz)
+		total = total + fac*_carlson_RC1(fac**3*delta/d**2)/d
+		P = (P + lam*S + lam**2)/16.; S = (S+2.*lam)/4.
+		z = (z+lam)/4.; p = (p+lam)/4.
+		A = (A+lam)/4.; fac = fac/4.
+	# X+Y, X*Y and Z
+	X_Y = fac*(2.*A0-S0)/A
+	XY = fac**2*(A0**2-A0*S0+P0)/A**2
+	Z = fac*(A0-z0)/A
+	P = -(X_Y+Z)/2.
+	E2 = XY + X_Y*Z - 3.*P**2
+	E3 = XY*Z + 2.*E2*P + 4.*P**3
+	E4 = (2.*XY*Z + E2*P + 3.*P**3)*P
+	E5 = XY*Z*P**2
+	return fac*A**-1.5*(1. - 3./14.*E2 + E3/6. + 9./88.*E2**2 - 3./22.*E4 -
+	                    9./52.*E2*E3 + 3./26.*E5) + 6.*total
+
+def t_elliptic_roots(E,M,Lambda):
+	"""
+	Roots u_1, u_2, u_3 of 2M u**3 + 2E u**2 + Lambda/3 along the last axis, 
+	as eigenvalues of the companion matrix polished by two Newton steps.
+	There always is a real root, it is put last so that u_1, u_2 are either
+	both real or a complex conjugate pair.
+	"""
+	E, M = np.broadcast_arrays(np.asarray(E,dtype=float),np.asarray(M,dtype=float))
+	companion = np.zeros(E.shape+(3,3))
+	companion[...,0,0] = -E/M
+	companion[...,0,2] = -Lambda/(6.*M)
+	companion[...,1,0] = 1.
+	companion[...,2,1] = 1.
+	u = np.linalg.eigvals(companion).astype(complex)
+	order = np.argsort(-abs(u.imag),axis=-1,kind='mergesort')
+	u = np.take_along_axis(u,order,axis=-1)
+	u[...,2] = u[...,2].real
+	E = E[...,None]; M = M[...,None]
+	for i in range(2):
+		u = u - (2.*M*u**3 + 2.*E*u**2 + Lambda/3.)/(6.*M*u**2 + 4.*E*u)
+	return u
+
+def t_elliptic(R,E,M,Lambda,derivs=False,roots=None):
+	"""
+	Returns t(R) = int_0^R dR/sqrt(2E + 2M/R + Lambda/3*R**2) on the
+	expanding branch through Carlson's RJ. With derivs=True the partial 
+	derivatives diff(t,E) and diff(t,M) at fixed R are returned as well,
+	from diff(RJ(x,y,z,p),x) = -(RD(y,z,x)-RJ(x,y,z,p))/(2*(p-x)) and
+	diff(u,E) = -2u**2/P'(u), diff(u,M) = -2u**3/P'(u) for the roots u of
+	P(u) = 2M u**3 + 2E u**2 + Lambda/3. Lambda must not vanish, the roots
+	u then stay away from zero. roots are the output of 
+	t_elliptic_roots(E,M,Lambda) if they are at hand already. 
+	Returns t or t, dt_dE, dt_dM
+	"""
+	R, E, M = np.broadcast_arrays(*[np.asarray(a,dtype=float) for a in (R,E,M)])
+	if roots is None:
+		roots = t_elliptic_roots(E,M,Lambda)
+	u = np.broadcast_to(roots,R.shape+(3,))
+	w = 1./R
+	norm = 2./3./np.sqrt(2.*M)
+	#sigma_i = w - u_i, the first two through their sum and product
+	u12_sum = (u[...,0]+u[...,1]).real
+	u12_prod = (u[...,0]*u[...,1]).real
+	RJ = carlson_RJ_pair(2.*w-u12_sum,w**2-w*u12_sum+u12_prod,w-u[...,2].real,w)
+	t = norm*RJ
+	if not derivs:
+		return t
+
+	dP = 6.*M[...,None]*u**2 + 4.*E[...,None]*u
+	du_dE = -2.*u**2/dP
+	du_dM = -2.*u**3/dP
+	dt_dE = 0.
+	dt_dM = -t/(2.*M)
+	sigma = [w-u[...,0],w-u[...,1],w-u[...,2]]
+	for i in range(3):
+		j, k = [l for l in range(3) if l != i]
+		dRJ = -(carlson_RD(sigma[j],sigma[k],sigma[i]) - RJ)/(2.*u[...,i])
+		#diff(sigma_i,E) = -diff(u_i,E)
+		dt_dE = dt_dE - norm*dRJ*du_dE[...,i]
+		dt_dM = dt_dM - norm*dRJ*du_dM[...,i]
+	return t, dt_dE.real, dt_dM.real
+
+class _LTB_ClosedFormScaleFactor(LTB_ScaleFactor):
+	"""
+	Common part of the closed form replacements of LTB_ScaleFactor. The
+	subclasses supply get_R_and_derivs(r,t).
+	"""
+	def __call__(self,r_loc,t_max=30.*307.,num_pt=20000,**kwargs):
+		"""
+		Same output as LTB_ScaleFactor.__call__ on the same time grid
+		t_vec = logspace(-6,log10(t_max),num_pt). The ode solver keywords
+		(R_init, atol, rtol, stiff) are accepted and ignored so that 
+		LTB_ScaleFactor can be swapped for a closed form class.
+
+		Returns t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec
+		"""
+		if self.cache is not None:
+			return self._cached(_LTB_ClosedFormScaleFactor.__call__,r_loc,
+			                    dict(t_max=t_max,num_pt=num_pt))
+		t_vec = np.logspace(np.log10(1e-6),np.log10(t_max),num=num_pt,endpoint=True)
+		R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec = \
+		                                       self.get_R_and_derivs(r_loc,t_vec)
+		return t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec
+
+	def evolve_shells(self,r_vector,t_max=30.*307.,num_pt=20000,**kwargs):
+		"""
+		Same output as LTB_ScaleFactor.evolve_shells, i.e. t_vec of size num_pt
+		and arrays of shape (num_r, num_pt) with row i belonging to r_vector[i].
+
+		Returns t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec
+		"""
+		if self.cache is not None:
+			return self._cached(_LTB_ClosedFormScaleFactor.evolve_shells,r_vector,
+			                    dict(t_max=t_max,num_pt=num_pt))
+		r_vector = np.asarray(r_vector,dtype=float)
+		t_vec = np.logspace(np.log10(1e-6),np.log10(t_max),num=num_pt,endpoint=True)
+		R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec = \
+		                  self.get_R_and_derivs(r_vector[:,None],t_vec[None,:])
+		return t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec
+
+class LTB_ParametricScaleFactor(_LTB_ClosedFormScaleFactor):
+	"""
+	Drop in replacement for LTB_ScaleFactor when Lambda = 0. Instead of
+	integrating Eq. (2.2) of ``Structures in the Universe by Exact Methods``
+	the parametric solution is evaluated on the whole (r,t) grid, the only
+	iterative part being a vectorized Newton solve of t = M*psi**3*S(z) for psi.
+	The user provides E(r), M(r), diff(E(r),r) and diff(M(r),r) as for
+	LTB_ScaleFactor.
+	"""
+	def __init__(self, Lambda,LTB_E, LTB_Edash, LTB_M, LTB_Mdash, *args, **kwargs):
+		assert Lambda == 0., "the parametric solutions only hold for Lambda = 0, use LTB_EllipticScaleFactor"
+		LTB_ScaleFactor.__init__(self,Lambda,LTB_E,LTB_Edash,LTB_M,LTB_Mdash,*args,**kwargs)
+
+	def get_psi(self,t,E,M,rtol=1e-13,max_iter=100):
+		"""
+		Solves t = M*psi**3*S(-2E*psi**2) for psi by Newton's method on
+		log(t), safeguarded with bisection, until t is matched to relative
+		accuracy rtol (the last Newton step is still taken, so psi ends up
+		close to machine precision). Everything broadcasts. dt/dpsi = R
+		is positive, so the bracket
+		  E >= 0:  log(2t(2E)**1.5/M)/sqrt(2E) <= psi <= (6t/M)**(1/3)
+		  E < 0:   (6t/M)**(1/3) <= psi <= 2 pi/sqrt(-2E)
+		holds the root. psi is nan for shells that have already crunched
+		(E<0 and t beyond 2 pi M/(-2E)**1.5).
+		"""
+		t, E, M = np.broadcast_arrays(*[np.asarray(x,dtype=float) for x in (t,E,M)])
+		assert np.all(M > 0.), "M(r) has to be positive"
+		#0-d inputs come back as numpy scalars from np.where and np.clip, 
+		#which cannot be assigned to below
+		shape = t.shape
+		t, E, M = [np.atleast_1d(x) for x in (t,E,M)]
+		psi_flat = (6.*t/M)**(1./3.)
+
+		hyperbolic = E > 0.
+		elliptic = E < 0.
+		two_E = np.abs(2.*E)
+		with np.errstate(divide='ignore',invalid='ignore'):
+			sqrt_2E = np.sqrt(two_E)
+			lo_hyp = np.log(2.*t*two_E**1.5/M)/sqrt_2E
+			psi_crunch = 2.*np.pi/sqrt_2E
+		lo = np.where(hyperbolic,np.maximum(lo_hyp,0.),np.where(elliptic,psi_flat,0.))
+		hi = np.where(elliptic,psi_crunch,psi_flat)
+		crunched = elliptic & (t >= M*psi_crunch**3/(4.*np.pi**2))
+
+		# in terms of eta and T = t*(2|E|)**1.5/M the starting guesses are
+		# asinh(T+(6T)**(1/3)) for E>0 and (6T)**(1/3) for E<0, both of which
+		# go over to psi_flat, the exact answer for E = 0
+		with np.errstate(divide='ignore',invalid='ignore'):
+			T = t*two_E**1.5/M
+			psi = np.where(hyperbolic,np.arcsinh(T+(6.*T)**(1./3.))/sqrt_2E,psi_flat)
+		psi = np.clip(psi,lo,hi)
+		log_t = np.log(t)
+		active = ~crunched & (E != 0.)
+		for i in range(max_iter):
+			if not active.any():
+				break
+			p = psi[active]; e = E[active]; m = M[active]
+			z = -2.*e*p**2
+			C, S = stumpff(z,derivs=False)
+			f = np.log(m*p**3*S) - log_t[active]
+			# diff(log(t),psi) = R/t
+			df = C/(p*S)
+
+			lo_a = np.where(f < 0.,p,lo[active])
+			hi_a = np.where(f > 0.,p,hi[active])
+			p_new = p - f/df
+			outside = ~((p_new > lo_a) & (p_new < hi_a))
+			p_new = np.where(outside,0.5*(lo_a+hi_a),p_new)
+
+			done = np.abs(f) <= rtol
+			lo[active] = lo_a; hi[active] = hi_a
+			psi[active] = np.where(done & outside,p,p_new)
+			active[active] = ~done
+		psi = np.where(crunched,np.nan,psi)
+		return psi.reshape(shape)
+
+	def get_R_and_derivs(self,r,t):
+		"""
+		Evaluates R(t,r) and its partial derivatives on any r and t that
+		broadcast against each other, e.g. r[:,None] and t[None,:] for a grid.
+
+		Returns R, Rdot, Rdash, Rdotdot, Rdashdot
+		"""
+		r = np.asarray(r,dtype=float)
+		t = np.asarray(t,dtype=float)
+		zeros = np.zeros(np.broadcast(r,t).shape)
+		E    = self.get_E(r) + zeros
+		dEdr = self.get_dEdr(r) + zeros
+		M    = self.get_M(r) + zeros
+		dMdr = self.get_dMdr(r) + zeros
+		t = t + zeros
+
+		psi = self.get_psi(t,E,M)
+		z = -2.*E*psi**2
+		C, S, dC, dS = stumpff(z)
+
+		R = M*psi**2*C
+		Rdot = (1.-z*S)/(psi*C)
+		Rdotdot = -M/R**2
+
+		#diff(psi,r) at fixed t from diff(t,psi)=R, diff(t,M)=t/M and
+		#diff(t,E) = -2*M*psi**5*diff(S(z),z)
+		psi_r = (-t/M*dMdr + 2.*M*psi**5*dS*dEdr)/R
+		Rdash = dMdr/M*R + R*Rdot*psi_r - 2.*M*psi**4*dC*dEdr
+		#Rdot depends on r only through psi and E, diff(Rdot,psi) = R*Rdotdot
+		Rdashdot = -M/R*psi_r + 2.*psi*dEdr*((S+z*dS)*C + (1.-z*S)*dC)/C**2
+		return R, Rdot, Rdash, Rdotdot, Rdashdot
+
+class LTB_EllipticScaleFactor(_LTB_ClosedFormScaleFactor):
+	"""
+	Drop in replacement for LTB_ScaleFactor when Lambda != 0. The age
+	t(R; E, M, Lambda) is evaluated in closed form through Carlson's RJ
+	(see t_elliptic) and inverted for R(t,r) by a vectorized Newton iteration,
+	so the whole (r,t) grid is built without ode solver or quad. Only the 
+	expanding branch is covered, points that would lie beyond a turn around 
+	come back as nan. The user provides E(r), M(r), diff(E(r),r) and 
+	diff(M(r),r) as for LTB_ScaleFactor.
+	"""
+	def __init__(self, Lambda,LTB_E, LTB_Edash, LTB_M, LTB_Mdash, *args, **kwargs):
+		assert Lambda != 0., "for Lambda = 0 use LTB_ParametricScaleFactor"
+		LTB_ScaleFactor.__init__(self,Lambda,LTB_E,LTB_Edash,LTB_M,LTB_Mdash,*args,**kwargs)
+
+	def get_R(self,t,E,M,roots=None,rtol=1e-13,max_iter=100):
+		"""
+		Solves t = t_elliptic(R,E,M,Lambda) for R by Newton's method on
+		log(t) against log(R), with diff(log(t),log(R)) = R/(t*Rdot). The
+		matter dominated R = (9M/2)**(1/3)*t**(2/3) is the starting point. Steps 
+		are limited to a factor e**2 in R until the root is bracketed, after that
+		a step leaving the bracket is replaced by bisection in log(R). 
+		Everything broadcasts, roots as in t_elliptic.
+		"""
+		t, E, M = np.broadcast_arrays(*[np.asarray(x,dtype=float) for x in (t,E,M)])
+		Lambda = self.Lambda
+		if roots is None:
+			roots = t_elliptic_roots(E,M,Lambda)
+		roots = np.broadcast_to(roots,t.shape+(3,))
+		#as in get_psi, 0-d inputs would give numpy scalars below
+		shape = t.shape
+		t, E, M = [np.atleast_1d(x) for x in (t,E,M)]
+		roots = roots.reshape(t.shape+(3,))
+
+		log_R = np.log((4.5*M)**(1./3.)*t**(2./3.))
+		lo = np.zeros(t.shape) - np.inf
+		hi = np.zeros(t.shape) + np.inf
+		log_t = np.log(t)
+		active = np.ones(t.shape,dtype=bool)
+		converged = np.zeros(t.shape,dtype=bool)
+		for i in range(max_iter):
+			if not active.any():
+				break
+			x = log_R[active]; e = E[active]; m = M[active]
+			R = np.exp(x)
+			with np.errstate(invalid='ignore'):
+				f = np.log(t_elliptic(R,e,m,Lambda,roots=roots[active])) - log_t[active]
+				Rdot = np.sqrt(2.*e + 2.*m/R + Lambda/3.*R**2)
+			#past the turn around is treated as too far
+			f = np.where(np.isnan(f),np.inf,f)
+			df = R/(np.exp(f+log_t[active])*Rdot)
+
+			lo_a = np.where(f < 0.,x,lo[active])
+			hi_a = np.where(f > 0.,x,hi[active])
+			with np.errstate(invalid='ignore'):
+				step = np.clip(-f/df,-2.,2.)
+			x_new = np.where(np.isfinite(step),x+step,x-2.)
+			outside = ~((x_new > lo_a) & (x_new < hi_a))
+			bracketed = np.isfinite(lo_a) & np.isfinite(hi_a)
+			#lo_a+hi_a is inf-inf where not bracketed, thrown away by the where
+			with np.errstate(invalid='ignore'):
+				x_new = np.where(outside & bracketed,0.5*(lo_a+hi_a),x_new)
+
+			done = np.abs(f) <= rtol
+			lo[active] = lo_a; hi[active] = hi_a
+			log_R[active] = np.where(done & outside,x,x_new)
+			converged[active] = done
+			active[active] = ~done & (hi_a-lo_a > 1e-15*np.abs(x))
+		return np.where(converged,np.exp(log_R),np.nan).reshape(shape)
+
+	def get_R_and_derivs(self,r,t):
+		"""
+		Evaluates R(t,r) and its partial derivatives on any r and t that
+		broadcast against each other, e.g. r[:,None] and t[None,:] for a grid.
+		diff(R,r) follows from t being fixed, 
+		diff(R,r) = -Rdot*(diff(t,E)*diff(E,r) + diff(t,M)*diff(M,r)),
+		and diff(R,r,t) from the r derivative of the Friedmann equation.
+
+		Returns R, Rdot, Rdash, Rdotdot, Rdashdot
+		"""
+		Lambda = self.Lambda
+		r = np.asarray(r,dtype=float)
+		t = np.asarray(t,dtype=float)
+		zeros = np.zeros(np.broadcast(r,t).shape)
+		#the roots only depend on r
+		roots = t_elliptic_roots(self.get_E(r),self.get_M(r),Lambda)
+		E    = self.get_E(r) + zeros
+		dEdr = self.get_dEdr(r) + zeros
+		M    = self.get_M(r) + zeros
+		dMdr = self.get_dMdr(r) + zeros
+		t = t + zeros
+		roots = np.broadcast_to(roots,t.shape+(3,))
+
+		R = self.get_R(t,E,M,roots=roots)
+		crap, dt_dE, dt_dM = t_elliptic(R,E,M,Lambda,derivs=True,roots=roots)
+
+		Rdot = np.sqrt(2.*E + 2.*M/R + Lambda/3.*R**2)
+		Rdotdot = -M/R**2 + Lambda/3.*R
+		Rdash = -Rdot*(dt_dE*dEdr + dt_dM*dMdr)
+		Rdashdot = (dEdr + dMdr/R + Rdotdot*Rdash)/Rdot
+		return R, Rdot, Rdash, Rdotdot, Rdashdot
@@ -49,6 +49,67 @@ class Findroot(object):
 		self._converged = r.converged 
 		return self._root
 	
+	def root_many(self,*args):
+		"""
+		Array version of root. The arrays in args broadcast against each 
+		other (and against the bounds) and f has to accept arrays, each 
+		element is an independent root finding problem. The brackets are 
+		shrunk all together by Chandrupatla's method (inverse quadratic 
+		interpolation where it is safe, bisection otherwise), using the 
+		xtol, rtol and maxiter from set_options. Nothing is stored on the 
+		instance so it can be used from several threads at once.
+		returns:
+		        roots, converged
+		"""
+		if self._a is None or self._b is None:
+			raise AssertionError("Set bounds before trying to find root.")
+		shape = np.broadcast(np.asarray(self._a),np.asarray(self._b),
+		                     *[np.asarray(arg) for arg in args]).shape
+		args = [np.broadcast_to(arg,shape) for arg in args]
+		b = np.zeros(shape) + self._a
+		a = np.zeros(shape) + self._b
+		fb = np.zeros(shape) + self.f(b,*args)
+		fa = np.zeros(shape) + self.f(a,*args)
+		c = a.copy(); fc = fa.copy()
+		t = np.zeros(shape) + 0.5
+		
+		roots = np.where(np.abs(fa) < np.abs(fb),a,b)
+		converged = (fa == 0.) | (fb == 0.)
+		#like brentq, no sign change means no root
+		active = (np.sign(fa) != np.sign(fb)) & ~converged
+		for i in range(self._maxiter):
+			if not active.any():
+				break
+			a_ = a[active]; b_ = b[active]; c_ = c[active]
+			fa_ = fa[active]; fb_ = fb[active]; fc_ = fc[active]
+			xt = a_ + t[active]*(b_-a_)
+			ft = self.f(xt,*[arg[active] for arg in args])
+			same = np.sign(ft) == np.sign(fa_)
+			c_ = np.where(same,a_,b_); fc_ = np.where(same,fa_,fb_)
+			b_ = np.where(same,b_,a_); fb_ = np.where(same,fb_,fa_)
+			a_ = xt; fa_ = ft
+
+			use_a = np.abs(fa_) < np.abs(fb_)
+			xm = np.where(use_a,a_,b_); fm = np.where(use_a,fa_,fb_)
+			tol = self._xtol + self._rtol*np.abs(xm)
+			with np.errstate(divide='ignore',invalid='ignore'):
+				tlim = tol/np.abs(b_-c_)
+				done = (fm == 0.) | (tlim > 0.5)
+				xi = (a_-b_)/(c_-b_)
+				phi = (fa_-fb_)/(fc_-fb_)
+				iqi = (phi**2 < xi) & ((1.-phi)**2 < 1.-xi)
+				t_ = np.where(iqi,fa_/(fb_-fa_)*fc_/(fb_-fc_) + 
+				              (c_-a_)/(b_-a_)*fa_/(fc_-fa_)*fb_/(fc_-fb_),0.5)
+			t_ = np.clip(np.where(np.isfinite(t_),t_,0.5),tlim,1.-tlim)
+
+			a[active] = a_; b[active] = b_; c[active] = c_
+			fa[active] = fa_; fb[active] = fb_; fc[active] = fc_
+			t[active] = t_
+			roots[active] = xm
+			converged[active] = done
+			active[active] = ~done
+		return roots, converged
+
 	@property
 	def converged(self):
 		return self._converged
@@ -83,6 +144,7 @@ class Integrate(object):
 		self._quad = quad
 		self.set_limits()
 		self.set_options()
+		self.set_nodes()
 	
 	def set_limits(self,a=0.,b=1.):
 		self._a=a
@@ -96,6 +158,42 @@ class Integrate(object):
 
 		return self._integral
 	
+	def set_nodes(self,num_nodes=64,alpha=0.,beta=0.):
+		"""
+		Gauss-Jacobi nodes for integral_many. alpha and beta are the 
+		exponents of the endpoint behaviour at the upper and lower limit, 
+		i.e. f(x) ~ (b-x)**alpha near b and f(x) ~ (x-a)**beta near a. The 
+		rule integrates f(x)/((b-x)**alpha*(x-a)**beta) against that weight 
+		so it only has to be smooth after dividing out the endpoints.
+		"""
+		self._num_nodes = num_nodes
+		self._alpha = alpha
+		self._beta = beta
+
+	def integral_many(self,*args):
+		"""
+		Array version of integral, f has to accept arrays. The arrays in 
+		args broadcast against each other and against the limits, each 
+		element gives an independent integral done with the fixed Gauss-Jacobi 
+		rule from set_nodes. The error estimate is the difference to the rule 
+		with half the nodes, so it is pessimistic. Nothing is stored on the 
+		instance so it can be used from several threads at once.
+		returns:
+		        integrals, abserrs
+		"""
+		a = np.asarray(self._a,dtype=float); b = np.asarray(self._b,dtype=float)
+		alpha = self._alpha; beta = self._beta
+		ndim = np.broadcast(a,b,*[np.asarray(arg) for arg in args]).ndim
+		results = []
+		for num_nodes in (self._num_nodes,self._num_nodes//2):
+			s, w = gauss_jacobi_nodes(num_nodes,alpha,beta,-1.,1.)
+			s = s.reshape((-1,)+(1,)*ndim); w = w.reshape(s.shape)
+			half = (b-a)/2.
+			x = a + half*(s+1.)
+			g = self.f(x,*args)/((b-x)**alpha*(x-a)**beta)
+			results.append(half**(1.+alpha+beta)*np.sum(w*g,axis=0))
+		return results[0], np.abs(results[0]-results[1])
+
 	@property
 	def abserr(self):
 		return self._abserr
@@ -111,6 +209,103 @@ class Integrate(object):
 		return self.f(x,*args)
 		
 
+def gauss_jacobi_nodes(num_nodes,alpha=0.,beta=0.5,a=0.,b=1.):
+	"""
+	Nodes x and weights w of the num_nodes point Gauss-Jacobi rule for
+	int_a^b (b-x)**alpha*(x-a)**beta*f(x) dx = sum(w*f(x)). The default 
+	weight is sqrt(x) on [0,1], the endpoint behaviour of the LTB age 
+	integrand in R.
+	"""
+	from scipy.special import roots_jacobi
+	s, w = roots_jacobi(num_nodes,alpha,beta)
+	half = (b-a)/2.
+	return a + half*(s+1.), w*half**(1.+alpha+beta)
+
+def get_2E_over_r3(twoM_over_r3,Lambda_over3,age,a=0.,b=1e-6,num_nodes=64,
+                   xtol=4.4408920985006262e-16,rtol=4.4408920985006262e-15,
+                   maxiter=100,stride=8,cache=None):
+	"""
+	Solves the age constraint 
+	     age = int_0^1 sqrt(x)/sqrt(twoE*x + twoM + Lambda_over3*x**3) dx
+	for twoE = 2E(r)/r**3 at all radii at once. This is what LTB_2E_Eq in 
+	the scripts does with brentq around quad one radius at a time. The 
+	sqrt(x) is taken care of by the Gauss-Jacobi weight so the remaining 
+	integrand is smooth and num_nodes fixed nodes do. The root is found by 
+	Newton's method, falling back on bisection whenever a step leaves the 
+	bracket. Every stride-th radius is solved first starting from the middle
+	of [a,b], the others start from the interpolated solution of their 
+	neighbours.
+	twoM_over_r3:
+	             2M(r)/r**3 ordered in r
+	Lambda_over3:
+	             Lambda/3
+	age:
+	    age of the universe
+	a, b:
+	     bracket for twoE, the age integral has to be above age at a and 
+	     below it at b
+	xtol, rtol, maxiter:
+	     as for brentq, converged once the step is below xtol + rtol*|twoE|
+	cache:
+	     optional LTB_cache.BackgroundCache, the solution is loaded from it
+	     when all the arguments are the same as in an earlier run
+	returns:
+	        twoE_over_r3, converged
+	"""
+	if cache is not None:
+		settings = (Lambda_over3,age,a,b,num_nodes,xtol,rtol,maxiter,stride)
+		key = cache.key('get_2E_over_r3',np.asarray(twoM_over_r3,dtype=float),settings)
+		ans = cache.get(key)
+		if ans is None:
+			ans = get_2E_over_r3(twoM_over_r3,*settings)
+			cache.put(key,ans)
+		return ans
+	twoM = np.atleast_1d(np.asarray(twoM_over_r3,dtype=float))
+	x, w = gauss_jacobi_nodes(num_nodes)
+
+	def age_and_deriv(twoE,twoM):
+		g = 1./np.sqrt(twoE[:,None]*x + twoM[:,None] + Lambda_over3*x**3)
+		return np.dot(g,w) - age, -0.5*np.dot(g**3,x*w)
+
+	def newton(twoE,twoM):
+		lo = np.zeros(twoE.shape) + a
+		hi = np.zeros(twoE.shape) + b
+		f_lo = age_and_deriv(lo,twoM)[0]
+		f_hi = age_and_deriv(hi,twoM)[0]
+		bracketed = (f_lo > 0.) & (f_hi < 0.)
+		converged = np.zeros(twoE.shape,dtype=bool)
+		active = bracketed.copy()
+		for i in range(maxiter):
+			if not active.any():
+				break
+			e = twoE[active]
+			f, df = age_and_deriv(e,twoM[active])
+			#t decreases with twoE
+			lo_a = np.where(f > 0.,e,lo[active])
+			hi_a = np.where(f < 0.,e,hi[active])
+			e_new = e - f/df
+			outside = ~((e_new > lo_a) & (e_new < hi_a))
+			e_new = np.where(outside,0.5*(lo_a+hi_a),e_new)
+			tol = xtol + rtol*np.abs(e_new)
+			done = (np.abs(e_new-e) <= tol) | (f == 0.) | (hi_a-lo_a <= tol)
+			lo[active] = lo_a; hi[active] = hi_a
+			twoE[active] = np.where(f == 0.,e,e_new)
+			converged[active] = done
+			active[active] = ~done
+		return twoE, converged
+
+	num_r = twoM.size
+	index = np.arange(num_r)
+	coarse = np.unique(np.append(index[::stride],num_r-1))
+	twoE_coarse, converged_coarse = newton(np.zeros(coarse.size)+0.5*(a+b),twoM[coarse])
+	good = coarse[converged_coarse]
+	if good.size > 0:
+		twoE = np.interp(index,good,twoE_coarse[converged_coarse])
+	else:
+		twoE = np.zeros(num_r)+0.5*(a+b)
+	twoE = np.clip(twoE,a,b)
+	return newton(twoE,twoM)
+
 def get_angles(ras,dec,ras_d = np.pi+96.4*np.pi/180., dec_d = 29.3*np.pi/180.):
 	"""
 	For a fixed choice of coordinates of centre of the universe sets the 
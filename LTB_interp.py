@@ -0,0 +1,335 @@
+#!/usr/bin/env python2.7
+####################################################
+# Interpolation of the LTB background R(t,r), E(r) and their derivatives
+# for the geodesic equations.
+#
+# The splines RectBivariateSpline builds for R, R_r, R_t and R_rt on the
+# (r_vector, t_vector) grid of LTB_ScaleFactor all share the same knots, so
+# the B-spline basis in r and t only has to be worked out once per point and
+# is then contracted with the coefficients of every quantity. E(r) and E_r(r)
+# are fitted on the same r knots and use the same basis in r.
+#
+import numpy as np
+from bisect import bisect_right
+from scipy.interpolate import RectBivariateSpline as spline_2d
+from scipy.interpolate import make_lsq_spline, make_interp_spline
+
+def bspline_basis(knots,k,x,deriv=False):
+	"""
+	knots, k:
+	        knot vector and degree of a B-spline
+	x:
+	        1-D array of points
+	Returns the index i of the knot span knots[i] <= x < knots[i+1] and the
+	k+1 B-splines B_{i-k},...,B_i that are nonzero there, shape (x.size,k+1).
+	If deriv is True their first derivatives are returned as well. Points
+	outside the knots use the first/last polynomial piece.
+	"""
+	n = knots.size - k - 1
+	i = np.clip(np.searchsorted(knots,x,side='right')-1,k,n-1)
+	left  = [None] + [x - knots[i+1-j] for j in range(1,k+1)]
+	right = [None] + [knots[i+j] - x for j in range(1,k+1)]
+	N = [np.ones_like(x)]
+	for j in range(1,k+1):
+		if j == k:
+			N_km1 = N
+		saved = np.zeros_like(x)
+		new_N = []
+		for l in range(j):
+			temp = N[l]/(right[l+1]+left[j-l])
+			new_N.append(saved + right[l+1]*temp)
+			saved = left[j-l]*temp
+		N = new_N + [saved]
+	B = np.array(N).T
+	if not deriv:
+		return i, B
+	#diff(B_m,k) = k*(B_m,k-1/(t_m+k-t_m) - B_m+1,k-1/(t_m+k+1-t_m+1))
+	dB = np.zeros((k+1,)+x.shape)
+	for a in range(k+1):
+		if a > 0:
+			dB[a] += N_km1[a-1]/(knots[i+a]-knots[i-k+a])
+		if a < k:
+			dB[a] -= N_km1[a]/(knots[i+a+1]-knots[i-k+a+1])
+	return i, B, k*dB.T
+
+def _bspline_basis_scalar(knots,k,x,deriv=False):
+	"""
+	Same as bspline_basis for a single float x with knots a list, in plain 
+	python floats. For one point this is several times faster than the 
+	array version.
+	"""
+	n = len(knots) - k - 1
+	i = min(max(bisect_right(knots,x)-1,k),n-1)
+	left  = [0.] + [x - knots[i+1-j] for j in range(1,k+1)]
+	right = [0.] + [knots[i+j] - x for j in range(1,k+1)]
+	N = [1.]
+	for j in range(1,k+1):
+		if j == k:
+			N_km1 = N
+		saved = 0.
+		new_N = []
+		for l in range(j):
+			temp = N[l]/(right[l+1]+left[j-l])
+			new_N.append(saved + right[l+1]*temp)
+			saved = left[j-l]*temp
+		N = new_N + [saved]
+	if not deriv:
+		return i, N
+	dN = [0.]*(k+1)
+	for a in range(k+1):
+		if a > 0:
+			dN[a] += k*N_km1[a-1]/(knots[i+a]-knots[i-k+a])
+		if a < k:
+			dN[a] -= k*N_km1[a]/(knots[i+a+1]-knots[i-k+a+1])
+	return i, N, dN
+
+class LTB_Background(object):
+	"""
+	Fused evaluator for the background quantities the geodesic equations need.
+	One call
+	        E, E_r, R, R_r, R_rr, R_rt, R_t = background(r,t)
+	replaces the five RectBivariateSpline.ev and two 1-D spline calls of
+	LTB_geodesics.get_E_R_and_derivs and returns the same interpolants.
+	r_vector, t_vector:
+	        the grid, as returned by LTB_ScaleFactor
+	R_vec, Rdot_vec, Rdash_vec, Rdashdot_vec:
+	        shape (r_vector.size,t_vector.size)
+	E_vec, E_r_vec:
+	        E(r) and diff(E(r),r) on r_vector
+	"""
+	def __init__(self,r_vector,t_vector,R_vec,Rdot_vec,Rdash_vec,Rdashdot_vec,
+	             E_vec,E_r_vec,kx=3,ky=3):
+		self.kx = kx; self.ky = ky
+		coeffs = []
+		self._splines = []
+		for Z in (R_vec,Rdash_vec,Rdashdot_vec,Rdot_vec):
+			sp = spline_2d(r_vector,t_vector,Z,kx=kx,ky=ky,s=0)
+			self.tx, self.ty = sp.get_knots()
+			coeffs.append(sp.get_coeffs().reshape(self.tx.size-kx-1,
+			                                      self.ty.size-ky-1))
+			self._splines.append(sp)
+		#order R, R_r, R_rt, R_t
+		self._coeffs = np.array(coeffs)
+		E_splines = [make_lsq_spline(r_vector,Z,self.tx,k=kx) 
+		             for Z in (E_vec,E_r_vec)]
+		self._E_coeffs = np.array([sp.c for sp in E_splines])
+		self._E_rr = E_splines[1].derivative()
+		self._offset_r = np.arange(-kx,1)
+		self._offset_t = np.arange(-ky,1)
+		self._tx_list = self.tx.tolist()
+		self._ty_list = self.ty.tolist()
+
+	def __call__(self,r,t):
+		"""
+		Returns E, E_r, R, R_r, R_rr, R_rt, R_t at (r,t), broadcasting r and t.
+		"""
+		if np.ndim(r) == 0 and np.ndim(t) == 0:
+			return self._eval_scalar(float(r),float(t))
+		shape = np.broadcast(r,t).shape
+		r, t = [np.ravel(x).astype(float) for x in np.broadcast_arrays(r,t)]
+		ir, Br, dBr = bspline_basis(self.tx,self.kx,r,deriv=True)
+		it, Bt = bspline_basis(self.ty,self.ky,t)
+		idx_r = ir[:,None] + self._offset_r
+		idx_t = it[:,None] + self._offset_t
+
+		C = self._coeffs[:,idx_r[:,:,None],idx_t[:,None,:]]
+		C_t = np.einsum('cnab,nb->cna',C,Bt)
+		R, R_r, R_rt, R_t = np.einsum('cna,na->cn',C_t,Br)
+		R_rr = np.einsum('na,na->n',C_t[1],dBr)
+		E, E_r = np.einsum('cna,na->cn',self._E_coeffs[:,idx_r],Br)
+
+		return tuple(x.reshape(shape) for x in (E, E_r, R, R_r, R_rr, R_rt, R_t))
+
+	def second_derivs(self,r,t):
+		"""
+		The derivatives of the quantities returned by __call__ that are not 
+		among them, for the Jacobian of the geodesic equations:
+		        E_rr, R_rrr, R_rrt, R_rtt, R_tt 
+		"""
+		spR, spR_r, spR_rt, spR_t = self._splines
+		return (self._E_rr(r), spR_r.ev(r,t,dx=2), spR_rt.ev(r,t,dx=1),
+		        spR_rt.ev(r,t,dy=1), spR_t.ev(r,t,dy=1))
+
+	def _eval_scalar(self,r,t):
+		kx = self.kx; ky = self.ky
+		ir, Br, dBr = _bspline_basis_scalar(self._tx_list,kx,r,deriv=True)
+		it, Bt = _bspline_basis_scalar(self._ty_list,ky,t)
+		C_t = np.dot(self._coeffs[:,ir-kx:ir+1,it-ky:it+1],Bt)
+		R, R_r, R_rt, R_t = np.dot(C_t,Br)
+		R_rr = np.dot(C_t[1],dBr)
+		E, E_r = np.dot(self._E_coeffs[:,ir-kx:ir+1],Br)
+		return (E, E_r, R, R_r, R_rr, R_rt, R_t)
+
+class GridBicubic(object):
+	"""
+	Bicubic interpolation on the (r,t) background grid with precomputed 
+	per cell polynomials. Meant as a drop-in for the RectBivariateSpline 
+	objects passed as R, R_r, R_t, R_rt (and R_rr) to LTB_geodesics and 
+	Szekeres_geodesics, supports 
+	        ev(r,t,dx=0,dy=0) 
+	x, y:
+	        the grid axes, e.g. r_vector and t_vector
+	z:
+	        the values on the grid, shape (x.size,y.size), or a spline already
+	        fitted on this grid (anything that can be called as z(x,y))
+	The interpolant is the interpolating cubic spline (RectBivariateSpline 
+	with s=0) stored as one 4x4 polynomial per grid cell in the local 
+	coordinates (x-x_i)/(x_i+1-x_i), (y-y_j)/(y_j+1-y_j), in a contiguous 
+	array of shape (x.size-1,y.size-1,4,4), i.e. 128 bytes per grid point. 
+	A scalar query is then one bisection in each axis and 16 multiply-adds, 
+	derivatives cost the same as values.
+	"""
+	_s = np.array([0.125,0.375,0.625,0.875])
+
+	def __init__(self,x,y,z):
+		x = np.asarray(x,dtype=float); y = np.asarray(y,dtype=float)
+		if np.any(np.diff(x) <= 0.) or np.any(np.diff(y) <= 0.):
+			raise AssertionError("grid axes must be strictly increasing")
+		self._set_grid(x,y)
+		if not callable(z):
+			z = spline_2d(x,y,z,kx=3,ky=3,s=0)
+		#sample every cell on a 4x4 set of points and solve for the cubic 
+		s = self._s
+		xs = (x[:-1,None] + s[None,:]/self._inv_hx[:,None]).ravel()
+		ys = (y[:-1,None] + s[None,:]/self._inv_hy[:,None]).ravel()
+		V = z(xs,ys).reshape(x.size-1,4,y.size-1,4)
+		A_inv = np.linalg.inv(s[:,None]**np.arange(4))
+		self._set_coeffs(np.einsum('pa,iajb,qb->ijpq',A_inv,V,A_inv))
+
+	def _set_grid(self,x,y):
+		self.x = x; self.y = y
+		self._x_list = x.tolist(); self._y_list = y.tolist()
+		self._inv_hx = 1./np.diff(x); self._inv_hy = 1./np.diff(y)
+		self._inv_hx_list = self._inv_hx.tolist()
+		self._inv_hy_list = self._inv_hy.tolist()
+		self._derivatives = {}
+
+	def _set_coeffs(self,coeffs):
+		self._coeffs = np.ascontiguousarray(coeffs)
+		self._cells = self._coeffs.reshape(-1,16)
+
+	def derivative(self,dx=0,dy=0):
+		"""
+		Returns the GridBicubic of diff(z,x,dx,y,dy), on the same grid.
+		"""
+		if (dx,dy) in self._derivatives:
+			return self._derivatives[(dx,dy)]
+		if dx > 3 or dy > 3:
+			raise AssertionError("at most third derivatives of a cubic")
+		c = self._coeffs
+		p = np.arange(1,4)
+		for i in range(dx):
+			c = np.concatenate((c[:,:,1:,:]*p[:,None],np.zeros_like(c[:,:,:1,:])),
+			                   axis=2)*self._inv_hx[:,None,None,None]
+		for i in range(dy):
+			c = np.concatenate((c[:,:,:,1:]*p,np.zeros_like(c[:,:,:,:1])),
+			                   axis=3)*self._inv_hy[None,:,None,None]
+		deriv = object.__new__(GridBicubic)
+		deriv._set_grid(self.x,self.y)
+		deriv._set_coeffs(c)
+		self._derivatives[(dx,dy)] = deriv
+		return deriv
+
+	def ev(self,x,y,dx=0,dy=0):
+		"""
+		Same as RectBivariateSpline.ev, points off the grid are moved to its
+		edge.
+		"""
+		if dx or dy:
+			return self.derivative(dx,dy).ev(x,y)
+		if isinstance(x,float) and isinstance(y,float):
+			#plain floats, numpy scalars are slower in the arithmetic below
+			x = float(x); y = float(y)
+			xl = self._x_list; yl = self._y_list
+			x = min(max(x,xl[0]),xl[-1]); y = min(max(y,yl[0]),yl[-1])
+			i = min(bisect_right(xl,x),len(xl)-1) - 1
+			j = min(bisect_right(yl,y),len(yl)-1) - 1
+			s = (x-xl[i])*self._inv_hx_list[i]
+			w = (y-yl[j])*self._inv_hy_list[j]
+			c = self._cells[i*(len(yl)-1)+j].tolist()
+			a0 = c[0]  + w*(c[1]  + w*(c[2]  + w*c[3]))
+			a1 = c[4]  + w*(c[5]  + w*(c[6]  + w*c[7]))
+			a2 = c[8]  + w*(c[9]  + w*(c[10] + w*c[11]))
+			a3 = c[12] + w*(c[13] + w*(c[14] + w*c[15]))
+			return a0 + s*(a1 + s*(a2 + s*a3))
+		x = np.clip(np.asarray(x,dtype=float),self.x[0],self.x[-1])
+		y = np.clip(np.asarray(y,dtype=float),self.y[0],self.y[-1])
+		x, y = np.broadcast_arrays(x,y)
+		i = np.minimum(np.searchsorted(self.x,x,side='right'),self.x.size-1) - 1
+		j = np.minimum(np.searchsorted(self.y,y,side='right'),self.y.size-1) - 1
+		s = (x-self.x[i])*self._inv_hx[i]
+		w = (y-self.y[j])*self._inv_hy[j]
+		c = self._coeffs[i,j]
+		a = c[...,3]
+		for q in (2,1,0):
+			a = c[...,q] + w[...,None]*a
+		return a[...,0] + s*(a[...,1] + s*(a[...,2] + s*a[...,3]))
+
+class RadialProfile(object):
+	"""
+	The radial functions of a Szekeres model, P, Q, S and E, M, as one 
+	vector valued cubic spline: the interpolating splines through the 
+	values on r_vector (the same as UnivariateSpline with s=0) share the 
+	breakpoints, and are kept as one cubic per interval for all channels.
+	One call 
+	        values, first, second = profile(r)
+	returns every channel and its first and second r derivatives, each of
+	shape (num_channels,)+r.shape in the order of profile.names.
+	r_vector:
+	        increasing radii
+	P, Q, S, E, M:
+	        values on r_vector or functions of r, channels that are not 
+	        given are left out
+	Szekeres_geodesics take it as profile=..., in place of the P, Q, S 
+	(and E, E_r) callables.
+	"""
+	channel_names = ('P','Q','S','E','M')
+
+	def __init__(self,r_vector,P=None,Q=None,S=None,E=None,M=None):
+		r_vector = np.asarray(r_vector,dtype=float)
+		if np.any(np.diff(r_vector) <= 0.):
+			raise AssertionError("r_vector must be strictly increasing")
+		given = dict(P=P,Q=Q,S=S,E=E,M=M)
+		self.names = [name for name in self.channel_names 
+		              if given[name] is not None]
+		if not self.names:
+			raise AssertionError("no radial function given")
+		Y = np.array([np.asarray(given[name](r_vector) if callable(given[name]) 
+		              else given[name],dtype=float)*np.ones(r_vector.size)
+		              for name in self.names])
+		spl = make_interp_spline(r_vector,Y.T,k=3)
+		#Taylor coefficients at the left end of every interval, 
+		#shape (num_intervals,4,num_channels)
+		x = r_vector[:-1]
+		self._coeffs = np.ascontiguousarray(np.array([spl(x,nu=j)/f for j, f in 
+		                                    enumerate((1.,1.,2.,6.))]).transpose(1,0,2))
+		self.r = r_vector
+		self._r_list = r_vector.tolist()
+		self.index = dict((name,i) for i, name in enumerate(self.names))
+
+	def __call__(self,r):
+		"""
+		values, first and second derivatives of all channels at r, outside 
+		of r_vector the end intervals are extrapolated
+		"""
+		if isinstance(r,float):
+			i = min(max(bisect_right(self._r_list,r)-1,0),len(self._r_list)-2)
+			d = r - self._r_list[i]
+			W = np.array([[1.,d,d*d,d*d*d],[0.,1.,2.*d,3.*d*d],[0.,0.,2.,6.*d]])
+			return np.dot(W,self._coeffs[i])
+		r = np.asarray(r,dtype=float)
+		i = np.clip(np.searchsorted(self.r,r,side='right')-1,0,self.r.size-2)
+		d = (r - self.r[i])[...,None]
+		c = self._coeffs[i]
+		values = c[...,0,:] + d*(c[...,1,:] + d*(c[...,2,:] + d*c[...,3,:]))
+		first  = c[...,1,:] + d*(2.*c[...,2,:] + 3.*d*c[...,3,:])
+		second = 2.*c[...,2,:] + 6.*d*c[...,3,:]
+		return np.moveaxis(np.array([values,first,second]),-1,1)
+
+	def function(self,name,nu=0):
+		"""
+		channel name (or its nu-th derivative, nu <= 2) as a function of r, 
+		for code that wants separate callables
+		"""
+		i = self.index[name]
+		return lambda r: self(r)[nu,i]
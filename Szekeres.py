@@ -3,13 +3,19 @@
 import numpy as np
 from scipy.integrate import ode, odeint
 from LTB_housekeeping import ageMpc
+from geodesic_engine import NullGeodesics, Szekeres_pq_metric
 
 
 class Szekeres_geodesics():
 	"""
 	Solves the Null geodesics in Szekeres model with the metric in (t,r,p,q) 
 	coordinates in which the metric is diagonal. The equations are solved w.r.t to 
-	redshift. The angular diameter distance is included but is incorrect as of yet.
+	redshift by geodesic_engine.NullGeodesics with Szekeres_pq_metric. The 
+	angular diameter distance is the one of LTB_MyWay and is not correct for
+	Szekeres as of yet.
+	profile=LTB_interp.RadialProfile(r_vector,P=...,Q=...,S=...) gives P, Q, S
+	and their derivatives in one lookup, pass None for those callables (and 
+	for E, E_r if the profile has E).
 	"""
 	def __init__(self, R,R_r,R_rr,R_rt,R_t,E, E_r, 
 	             P,P_r,P_rr,Q,Q_r,Q_rr,S,S_r,S_rr,num_pt=1600, *args, **kwargs):
@@ -20,6 +26,9 @@ class Szekeres_geodesics():
 		self.P = P; self.P_r = P_r; self.P_rr = P_rr
 		self.Q = Q; self.Q_r = Q_r; self.Q_rr = Q_rr
 		self.S = S; self.S_r = S_r; self.S_rr = S_rr
+		self.profile = kwargs.pop('profile',None)
+		if self.profile is not None:
+			self._set_from_profile()
 		
 		self.args      = args
 		self.kwargs    = kwargs
@@ -28,6 +37,44 @@ class Szekeres_geodesics():
 		self.z_vec = np.empty(num_pt)
 		self._set_z_vec()
 	
+	def _set_from_profile(self):
+		"""
+		the functions that were passed as None are taken from the 
+		LTB_interp.RadialProfile, P and Q are zero if it does not have them
+		"""
+		for name in ('P','Q','S','E'):
+			for nu, suffix in enumerate(('','_r','_rr')):
+				attr = name + suffix
+				if not hasattr(self,attr) or getattr(self,attr) is not None:
+					continue
+				if name in self.profile.index:
+					setattr(self,attr,self.profile.function(name,nu))
+				elif name in ('P','Q'):
+					setattr(self,attr,lambda r: 0.*r)
+				else:
+					raise AssertionError(name+" is neither given nor in the profile")
+	
+	def get_radial_functions(self,r):
+		"""
+		E, E_r, P, P_r, P_rr, Q, Q_r, Q_rr, S, S_r, S_rr at r, with a profile 
+		in a single lookup
+		"""
+		if self.profile is None:
+			return (self.E(r), self.E_r(r), self.P(r), self.P_r(r), self.P_rr(r),
+			        self.Q(r), self.Q_r(r), self.Q_rr(r),
+			        self.S(r), self.S_r(r), self.S_rr(r))
+		values = self.profile(r)
+		index = self.profile.index
+		out = []
+		for name in ('E','P','Q','S'):
+			if name in index:
+				out.extend(values[:(2 if name == 'E' else 3),index[name]])
+			elif name == 'E':
+				out.extend((self.E(r),self.E_r(r)))
+			else:
+				out.extend([0.*r]*3)
+		return tuple(out)
+	
 	def _set_z_vec(self):
 		"""
 		vector of redshifts at which points the geodesics are saved
@@ -57,80 +104,6 @@ class Szekeres_geodesics():
 		self.z_vec = z
 		return
 
-	def get_init_conds(self,P_obs,Dir,*args,**kwargs):
-		y_init = np.zeros(8)
-		cos = np.cos
-		sin = np.sin
-		#cot = np.cot
-		tan = np.tan
-		t, r, theta, phi = P_obs
-		a, b = Dir
-		
-		y_init[0]=t; y_init[1]=r; 
-		#y_init[2]=self.P(r)+self.S(r)*tan(theta/2.)*cos(phi)
-		#y_init[3]=self.Q(r)+self.S(r)*tan(theta/2.)*sin(phi)
-		#y_init[2] = 1e5#0.#77.#3.
-		#y_init[3] = 1e5#0.#7.#7.
-		y_init[2]=self.P(r)+self.S(r)/tan(theta/2.)*cos(phi)
-		y_init[3]=self.Q(r)+self.S(r)/tan(theta/2.)*sin(phi)
-		#y_init[2]=self.P(r)+self.S(r)*(cos(theta/2.)/sin(theta/2.))*cos(phi)
-		#y_init[3]=self.Q(r)+self.S(r)*(cos(theta/2.)/sin(theta/2.))*sin(phi)
-		p = y_init[2]
-		q = y_init[3]
-		#a = a-theta
-		#b = b-phi
-		sin_a = sin(a)
-		cos_a = cos(a)
-		sin_b = sin(b)
-		cos_b = cos(b)
-		
-		if ( np.abs(sin_a) < 1.5e-16):
-			sin_a = 0.
-		elif ( np.abs(cos_a) < 1.5e-16):
-			cos_a = 0.
-		elif (np.abs(sin_b) < 1.5e-16):
-			sin_b = 0.
-		elif (np.abs(cos_b) < 1.5e-16):
-			cos_b = 0.
-		
-		H, H_p, H_q, H_r, H_t,  F, F_p, F_q, F_r, F_t  = \
-		self.get_H_F_and_derivs(t,r,p,q)
-		
-		dtheta_ds = sin_a*sin_b/F
-		dphi_ds   = cos_a/F
-		y_init[4] = sin_a*cos_b/H
-		y_init[5] = 0.5*(-1.-1./tan(theta/2.)**2)*dtheta_ds*cos(phi) \
-		            -sin(phi)/tan(theta/2.)*dphi_ds
-		y_init[6] = 0.5*(-1.-1./tan(theta/2.)**2)*dtheta_ds*sin(phi) \
-		            +cos(phi)/tan(theta/2.)*dphi_ds
-		#y_init[4] = sin_a*cos_b/H
-		#y_init[5] = sin_a*sin_b/F
-		#y_init[6] = cos_a/F
-		
-		
-		print "norm ", y_init[4]**2*H**2+ \
-		               F**2*(y_init[5]**2+y_init[6]**2)		
-		print "theta_dot, phi_dot, r_dot", y_init[5], y_init[6], y_init[4]
-		print "theta, a, phi, b", theta, a, phi, b
-		print "y_init ", y_init, self.S(r)
-		y_init[7]=0.
-
-		#p0 = np.cos(alpha)*np.sqrt(1.+2*self.E(rp))/self.Rdash.ev(rp,tp)
-		#J  = rp*np.sin(alpha)
-		# First try the LTB limit. Instead of the usual theta=0. set 
-		# theta = Pi/2. Thus for E=1 then S=1/2. Choose P(r)=Q(r)=0.
-		
-#		y_init[0]=tp; y_init[1]=rp; 
-#		y_init[2]=cot(theta/2.)*cos(phi)*self.S(r)-self.P(r) 
-#		y_init[3]=cot(theta/2.)*sin(phi)*self.S(r)-self.Q(r) 
-#		y_init[4]= 1.
-#		y_init[5]= p0
-#		y_init[6]=
-#		y_init[7]=
-#		y_init[8]=0.
-		
-		return y_init
-
 	def get_H_F_and_derivs(self,t,r,p,q, *args, **kwargs):
 		"""
 		"""
@@ -141,12 +114,10 @@ class Szekeres_geodesics():
 		R_rr = self.R_rr.ev(r,t)
 		R_rt = self.R_rt.ev(r,t)
 		
-		k   = -2.*self.E(r)
-		k_r = -2.*self.E_r(r)
-		
-		P = self.P(r); P_r = self.P_r(r); P_rr = self.P_rr(r)
-		Q = self.Q(r); Q_r = self.Q_r(r); Q_rr = self.Q_rr(r)
-		S = self.S(r); S_r = self.S_r(r); S_rr = self.S_rr(r)
+		E_LTB, E_LTB_r, P, P_r, P_rr, Q, Q_r, Q_rr, S, S_r, S_rr = \
+		self.get_radial_functions(r)
+		k   = -2.*E_LTB
+		k_r = -2.*E_LTB_r
 		
 		#E = ((p**2 + q**2)/2. - P*p - Q*q + P**2/2. +Q**2/2. + S**2/2.)/S
 		E = 0.5*S*((p-P)**2/S**2 + (q-Q)**2/S**2 + 1.)
@@ -181,62 +152,29 @@ class Szekeres_geodesics():
 		
 		return (H, H_p, H_q, H_r, H_t,  F, F_p, F_q, F_r, F_t)
 	
-	def Szekeres_geodesic_derivs_odeint(self,y,z,J):
-		"""
-		"""
-		t=y[0]; r=y[1]; p=y[2]; q=y[3]
-		
-		H, H_p, H_q, H_r, H_t,  F, F_p, F_q, F_r, F_t  = \
-		self.get_H_F_and_derivs(t,r,p,q)
-		
-		dt_ds = (1.+z) 
-		dr_ds = y[4]
-		dp_ds = y[5]
-		dq_ds = y[6]
-		#dt_ds = np.sqrt(H**2* dr_ds**2 + F**2* ( dp_ds**2 + dq_ds**2 ))
-		
-		#ddt_dss = -H*H_t * dr_ds**2 - F*F_t* ( dp_ds**2 + dq_ds**2 )
-		ddt_dss = -H*H_t * dr_ds**2 - F*F_t*dp_ds**2 - F*F_t* dq_ds**2
-		ds_dz = 1./ddt_dss
-
-		ddr_dss = -H_r/H * dr_ds**2 - 2.*H_p/H*dr_ds* (dp_ds + dq_ds) - \
-		          2.*H_t/H*dr_ds*dt_ds + F*F_r/H**2 *(dp_ds**2 + dq_ds**2)  
-		ddr_dsz = ddr_dss*ds_dz
-		
-		ddq_dss = H*H_q/F**2*dr_ds**2 - 2.*F_r/F*dr_ds*dq_ds \
-		          +F_q/F*dp_ds**2 - 2.*F_p/F*dp_ds*dq_ds - F_q/F*dq_ds**2 \
-		          -2.*F_t/F*dq_ds*dt_ds
-		ddq_dsz = ddq_dss*ds_dz
-		
-		ddp_dss = H*H_p/F**2*dr_ds**2 - 2.*F_r/F*dr_ds*dp_ds - F_p/F*dp_ds**2 \
-		          -2.*F_q/F*dp_ds*dq_ds - 2.*F_t/F*dp_ds*dt_ds + 2.*F_p/F*dq_ds**2
-		ddp_dsz = ddp_dss*ds_dz
-		
-		dlnDA_ds = H_t/H+2.*F_t/F
-		dlnDA_dz = dlnDA_ds*ds_dz
-
-		dt_dz = dt_ds*ds_dz
-		dr_dz = dr_ds*ds_dz
-		dp_dz = dp_ds*ds_dz
-		dq_dz = dq_ds*ds_dz
-		
-		return (dt_dz,dr_dz,dp_dz,dq_dz,ddr_dsz,ddp_dsz,ddq_dsz,dlnDA_dz) 
-			
 	def __call__(self,P_obs,Dir,atol=1e-15,rtol=1e-12):#atol=1e-15,rtol=1e-12):
 		"""
 		P_obs: tuple identifying the position of the observer 
 		       (t_obs, r_obs, theta_obs, phi_obs) 
 		Dir: = tuple of angular direction in which the geodesic propagates.
 		       (theta_star , phi_star )
+		Returns the list of the 8 components on z_vec, see 
+		geodesic_engine.NullGeodesics
 		"""
-		J=0.
-		y_init = self.get_init_conds(P_obs,Dir)
-		odeint_ans = odeint(func=self.Szekeres_geodesic_derivs_odeint,y0=y_init,
-		t=self.z_vec,
-		args=(J,),Dfun=None,full_output=0,rtol=rtol,atol=atol,mxstep=10**5)
-		
-		return [odeint_ans[:,i] for i in range(8)]
-
-
-
+		return self.null_geodesics()(P_obs,Dir,atol=atol,rtol=rtol)
 
+	def null_geodesics(self):
+		"""
+		the same model for geodesic_engine.NullGeodesics
+		"""
+		return NullGeodesics(Szekeres_pq_metric(self),z_vec=self.z_vec)
+	
+	def bundle(self,P_obs,Dirs,atol=1e-15,rtol=1e-12,t_stop=None,z_stop=None,
+	           r_stop=None,z_out=None,dense=False):
+		"""
+		All directions in one go, see geodesic_engine.NullGeodesics.bundle
+		for the arguments and the returns, e.g. t_stop at last scattering.
+		"""
+		return self.null_geodesics().bundle(P_obs,Dirs,atol=atol,rtol=rtol,
+		                 t_stop=t_stop,z_stop=z_stop,r_stop=r_stop,z_out=z_out,
+		                 dense=dense)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python2.7
+####################################################
+# Generates Szekeres_sph_kernel.py, the metric functions A, B, C, F, G of
+# Szekeres_geodesics in Szekeres_sph.py and their partial derivatives in one
+# function. The metric is written down once, sympy takes the derivatives and
+# pulls out the common subexpressions, and the result is printed as numpy code
+# that works for numbers as well as arrays of rays.
+#
+# Run it again whenever the metric below changes:
+#         python Szekeres_sph_codegen.py
+#
+import sympy as sp
+from sympy.printing.numpy import NumPyPrinter
+
+t, r, theta, phi = sp.symbols('t r theta phi')
+
+R = sp.Function('R')(t,r)
+k = sp.Function('k')(r)
+P = sp.Function('P')(r)
+Q = sp.Function('Q')(r)
+S = sp.Function('S')(r)
+
+#the metric in spherical polar coordinates, Eq. (22) of arXiv:1501.01413, with
+#the same notation as Szekeres_geodesics.get_A_B_C_F_G_and_derivs
+cot_htheta = sp.cos(theta/2)/sp.sin(theta/2)
+E = S/(2*sp.sin(theta/2)**2)
+E_r = sp.diff(E,r)
+Aeq = sp.diff(S,r)**2*cot_htheta**2 + \
+      2*sp.diff(S,r)*cot_htheta*(sp.diff(Q,r)*sp.sin(phi) + sp.diff(P,r)*sp.cos(phi)) + \
+      sp.diff(P,r)**2 + sp.diff(Q,r)**2
+Beq = cot_htheta*(sp.diff(Q,r)*sp.cos(phi) - sp.diff(P,r)*sp.sin(phi))
+Ceq = sp.diff(Q,r)*sp.sin(phi) + sp.diff(P,r)*sp.cos(phi) + sp.diff(S,r)*cot_htheta
+
+A = (sp.diff(R,r) - R*E_r/E)**2/(1-k) + (R/E)**2*Aeq
+B = (R/E)**2*S*Beq
+C = -R**2/E*Ceq
+F = R**2
+G = (R*sp.sin(theta))**2
+
+coords = {'t': t, 'r': r, 'theta': theta, 'phi': phi}
+quantities = [('A', A, ('t','r','theta','phi')),
+              ('B', B, ('t','r','theta','phi')),
+              ('C', C, ('t','r','theta','phi')),
+              ('F', F, ('t','r')),
+              ('G', G, ('t','r','theta'))]
+names = []; exprs = []
+for name, expr, derivs in quantities:
+	names.append(name); exprs.append(expr)
+	for x in derivs:
+		names.append(name+'_'+x); exprs.append(sp.diff(expr,coords[x]))
+
+#the radial functions and their derivatives become the arguments
+args = sp.symbols('R R_r R_t R_rr R_rt k k_r P_r P_rr Q_r Q_rr S S_r S_rr')
+(R_, R_r, R_t, R_rr, R_rt, k_, k_r, P_r, P_rr, Q_r, Q_rr, S_, S_r, S_rr) = args
+replace = [(sp.Derivative(R,r,r), R_rr), (sp.Derivative(R,t,r), R_rt),
+           (sp.Derivative(R,r), R_r), (sp.Derivative(R,t), R_t),
+           (sp.Derivative(k,r), k_r),
+           (sp.Derivative(P,r,r), P_rr), (sp.Derivative(P,r), P_r),
+           (sp.Derivative(Q,r,r), Q_rr), (sp.Derivative(Q,r), Q_r),
+           (sp.Derivative(S,r,r), S_rr), (sp.Derivative(S,r), S_r),
+           (R, R_), (k, k_), (S, S_)]
+exprs = [e.subs(replace) for e in exprs]
+for e in exprs:
+	if e.atoms(sp.Function, sp.Derivative) - e.atoms(sp.sin, sp.cos):
+		raise AssertionError("unexpected derivative left in "+str(e))
+
+common, reduced = sp.cse(exprs,symbols=sp.numbered_symbols('x'),optimizations='basic')
+
+class _Printer(NumPyPrinter):
+	#1/2 would be 0 in python 2
+	def _print_Rational(self,e):
+		return repr(float(e))
+printer = _Printer()
+code = lambda e: printer.doprint(e).replace('numpy.','np.')
+arg_list = ','.join(str(a) for a in args)
+lines = ['#!/usr/bin/env python2.7',
+         '####################################################',
+         '# Generated by Szekeres_sph_codegen.py, do not edit.',
+         '#',
+         'import numpy as np',
+         '',
+         'def A_B_C_F_G_and_derivs(%s,theta,phi):' % arg_list,
+         '\t"""',
+         '\tReturns the tuple ']
+line = '\t        '
+for name in names:
+	if len(line) + len(name) > 72:
+		lines.append(line.rstrip()); line = '\t        '
+	line += name + ', '
+lines += [line.rstrip(', '),
+          '\tof Szekeres_sph.py. The arguments are numbers or arrays that broadcast.',
+          '\t"""']
+for sym, e in common:
+	lines.append('\t%s = %s' % (sym,code(e)))
+lines.append('\treturn (' + ',\n\t        '.join(code(e) for e in reduced) + ')')
+open('Szekeres_sph_kernel.py','w').write('\n'.join(lines)+'\n')
+print("%d quantities, %d common subexpressions" % (len(reduced),len(common)))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python2.7
+####################################################
+# Generated by Szekeres_sph_codegen.py, do not edit.
+#
+import numpy as np
+
+def A_B_C_F_G_and_derivs(R,R_r,R_t,R_rr,R_rt,k,k_r,P_r,P_rr,Q_r,Q_rr,S,S_r,S_rr,theta,phi):
+	"""
+	Returns the tuple 
+	        A, A_t, A_r, A_theta, A_phi, B, B_t, B_r, B_theta, B_phi, C,
+	        C_t, C_r, C_theta, C_phi, F, F_t, F_r, G, G_t, G_r, G_theta
+	of Szekeres_sph.py. The arguments are numbers or arrays that broadcast.
+	"""
+	x0 = k - 1
+	x1 = x0**(-1.0)
+	x2 = S**(-1.0)
+	x3 = S_r*x2
+	x4 = R*x3 - R_r
+	x5 = x4**2
+	x6 = S_r**2
+	x7 = (0.5)*theta
+	x8 = np.sin(x7)
+	x9 = x8**2
+	x10 = np.cos(x7)
+	x11 = x10**2
+	x12 = x11/x9
+	x13 = x8**(-1.0)
+	x14 = np.cos(phi)
+	x15 = np.sin(phi)
+	x16 = P_r*x14 + Q_r*x15
+	x17 = 2*x10
+	x18 = P_r**2 + Q_r**2 + S_r*x13*x16*x17 + x12*x6
+	x19 = x8**4
+	x20 = x18*x19
+	x21 = R**2
+	x22 = S**(-2.0)
+	x23 = x21*x22
+	x24 = 4*x23
+	x25 = x1*x4
+	x26 = R*x22
+	x27 = x20*x26
+	x28 = 4*R_t
+	x29 = R*x2
+	x30 = P_rr*x14 + Q_rr*x15
+	x31 = x10*x13
+	x32 = S_r*x31
+	x33 = S_rr*x31
+	x34 = 8*x23
+	x35 = x8**3
+	x36 = x16 + x32
+	x37 = S_r*x8
+	x38 = P_r*x15 - Q_r*x14
+	x39 = x10*x35*x38
+	x40 = x2*x21
+	x41 = 4*x10*x35
+	x42 = x40*x41
+	x43 = 2*R_r
+	x44 = 2*x9
+	x45 = x40*x44
+	x46 = x38*x45
+	x47 = 2*R*R_t
+	x48 = R*x43
+	x49 = np.sin(theta)
+	x50 = x49**2
+	return (-x1*x5 + x20*x24,
+	        2*x25*(R_rt - R_t*x3) + 2*x27*x28,
+	        8*R_r*x27 + k_r*x5/x0**2 + x19*x34*(P_r*P_rr + Q_r*Q_rr + S_r*S_rr*x12 + x16*x33 + x30*x32) - 2*x25*(R_r*x3 - R_rr + S_rr*x29 - x26*x6) - 8*S_r*x20*x21/S**3,
+	        x24*x35*(2*x10*x18 - x37*(S_r*x10**3/x35 + x12*x16 + x36)),
+	        -S_r*x34*x39,
+	        -x38*x42,
+	        -8*R_t*x29*x39,
+	        x29*x41*(R*S_r*x2*x38 - R*(P_rr*x15 - Q_rr*x14) - x38*x43),
+	        x46*(-3*x11 + x9),
+	        -x16*x42,
+	        -x36*x45,
+	        -x28*x29*x36*x9,
+	        x29*x44*(R*S_r*x2*x36 - R*(x30 + x33) - x36*x43),
+	        x40*x8*(-x17*x36 + x37*(x12 + 1)),
+	        x46,
+	        x21,
+	        x47,
+	        x48,
+	        x21*x50,
+	        x47*x50,
+	        x48*x50,
+	        2*x21*x49*np.cos(theta))
@@ -7,6 +7,7 @@
 
 from __future__ import division
 import numpy as np
+from CMB_maps import galactic_pixel_centres
 from LTB_Sclass_v2 import LTB_ScaleFactor
 from LTB_Sclass_v2 import LTB_geodesics, sample_radial_coord
 from LTB_housekeeping import c, Mpc, Gpc, ageMpc
@@ -243,7 +244,8 @@ sp_p_vec = spline_2d(angles,geo_z_vec,geo_p_vec,s=0)
 sp_theta_vec = spline_2d(angles,geo_z_vec,geo_theta_vec,s=0)
 
 
-ras, dec = np.loadtxt("pixel_center_galactic_coord_12288.dat",unpack=True)
+#ras, dec = np.loadtxt("pixel_center_galactic_coord_12288.dat",unpack=True)
+ras, dec = galactic_pixel_centres(32)
 Rascension, declination, gammas = get_GP_angles(ell=ras, bee=dec,ell_d = 51.7, bee_d = -24.9)
 
 #z_of_gamma = np.empty_like(gammas)
@@ -261,8 +263,12 @@ z_at_tdec.set_bounds(z_star-20.,z_star+20.)
 def z_at_tdec_root(gamma):
 	return z_at_tdec.root(gamma)
 
-z_of_angles = Parallel(n_jobs=num_cores,verbose=0)(delayed(z_at_tdec_root)(gamma) for gamma in angles)
-z_of_angles = np.asarray(z_of_angles)
+#z_of_angles = Parallel(n_jobs=num_cores,verbose=0)(delayed(z_at_tdec_root)(gamma) for gamma in angles)
+#z_of_angles = np.asarray(z_of_angles)
+#all angles in one go, sp_t_vec.ev takes arrays
+z_of_angles, z_converged = z_at_tdec.root_many(angles)
+if not z_converged.all():
+	print "z(t_dec) did not converge for gamma = ", angles[~z_converged]
 
 z_of_angles_sp = spline_1d(angles,z_of_angles)
 z_of_gamma = z_of_angles_sp(gammas) 
@@ -0,0 +1,248 @@
+#!/usr/bin/env python2.7
+####################################################
+# Geodesic bundles on disk.
+#
+# A bundle of num_dir rays saved at num_z redshifts is 8*num_dir*num_z numbers,
+# 11 GB for 49k directions on the 3500 redshifts of Szekeres.py. A BundleStore
+# is a directory with one .npy file of shape (num_dir,num_z) per component of
+# the state (t, r, x2, x3, dr_ds, dx2_ds, dx3_ds, DA), used as np.memmap's,
+# next to a header with the observer, the model key (e.g. a
+# LTB_cache.BackgroundCache key), the redshifts z.npy, the directions dirs.npy,
+# the status of every ray as returned by bundle, written.npy saying which rays
+# are there and, for rays stopped by an event (t_stop etc.), the redshift and
+# state where they stopped. Integrators write the rays as they come, so nothing
+# holds the whole bundle, and the reductions below read it block by block.
+#
+import numpy as np
+import json
+import os
+
+COMPONENTS = ('t', 'r', 'x2', 'x3', 'dr_ds', 'dx2_ds', 'dx3_ds', 'DA')
+
+def _lagrange(x_nodes,y_nodes,x):
+	"""
+	cubic through the 4 nodes of every row, evaluated at x of every row
+	"""
+	y = 0.
+	for k in range(4):
+		w = 1.
+		for l in range(4):
+			if l != k:
+				w = w*(x-x_nodes[:,l])/(x_nodes[:,k]-x_nodes[:,l])
+		y = y + w*y_nodes[:,k]
+	return y
+
+class BundleStore(object):
+	"""
+	Opens the store in directory, mode 'r' or 'r+'. New stores come from
+	BundleStore.create. store['t'] or store[0] is the memory mapped array of
+	shape (num_dir,num_z) of that component.
+	"""
+	def __init__(self,directory,mode='r'):
+		self.directory = directory
+		self.mode = mode
+		header = json.load(open(os.path.join(directory,'header.json')))
+		self.P_obs = header['P_obs']
+		self.model_key = header['model_key']
+		self.num_dir = header['num_dir']
+		self.z_vec = np.load(os.path.join(directory,'z.npy'))
+		self.Dirs = np.load(os.path.join(directory,'dirs.npy'))
+		self.status = np.load(os.path.join(directory,'status.npy'),mmap_mode=mode)
+		self.written = np.load(os.path.join(directory,'written.npy'),mmap_mode=mode)
+		self.z_event = np.load(os.path.join(directory,'z_event.npy'),mmap_mode=mode)
+		self.y_event = np.load(os.path.join(directory,'y_event.npy'),mmap_mode=mode)
+		self._components = [np.load(os.path.join(directory,name+'.npy'),
+		                            mmap_mode=mode) for name in COMPONENTS]
+
+	@classmethod
+	def create(cls,directory,z_vec,Dirs,P_obs=None,model_key=None,dtype=np.float64):
+		"""
+		directory:
+		        new (or empty) directory of the store
+		z_vec, Dirs:
+		        redshifts of the output and the directions, shape (num_dir,2)
+		P_obs, model_key:
+		        the observer and a key of the model, only kept in the header
+		"""
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		z_vec = np.asarray(z_vec,dtype=float)
+		Dirs = np.asarray(Dirs,dtype=float).reshape(-1,2)
+		num_dir = Dirs.shape[0]
+		np.save(os.path.join(directory,'z.npy'),z_vec)
+		np.save(os.path.join(directory,'dirs.npy'),Dirs)
+		#the status of bundle can be negative, which rays are there is kept
+		#apart in written
+		status = np.lib.format.open_memmap(os.path.join(directory,'status.npy'),
+		                  mode='w+',dtype=np.int8,shape=(num_dir,))
+		del status
+		written = np.lib.format.open_memmap(os.path.join(directory,'written.npy'),
+		                  mode='w+',dtype=np.bool_,shape=(num_dir,))
+		del written
+		z_event = np.lib.format.open_memmap(os.path.join(directory,'z_event.npy'),
+		                  mode='w+',dtype=dtype,shape=(num_dir,))
+		z_event[:] = np.nan
+		del z_event
+		y_event = np.lib.format.open_memmap(os.path.join(directory,'y_event.npy'),
+		                  mode='w+',dtype=dtype,shape=(num_dir,len(COMPONENTS)))
+		y_event[:] = np.nan
+		del y_event
+		for name in COMPONENTS:
+			a = np.lib.format.open_memmap(os.path.join(directory,name+'.npy'),
+			                  mode='w+',dtype=dtype,shape=(num_dir,z_vec.size))
+			del a
+		header = dict(P_obs=None if P_obs is None else [float(p) for p in P_obs],
+		              model_key=model_key,num_dir=num_dir,num_z=z_vec.size,
+		              components=COMPONENTS)
+		json.dump(header,open(os.path.join(directory,'header.json'),'w'))
+		return cls(directory,mode='r+')
+
+	def __getitem__(self,component):
+		if not isinstance(component,int):
+			component = COMPONENTS.index(component)
+		return self._components[component]
+
+	def write(self,start,geos,status=0,z_event=None,y_event=None):
+		"""
+		geos of shape (n,8,num_z), e.g. the output of bundle, or one ray
+		(8,num_z) from __call__, written to the rays start, ..., start+n-1
+		together with their status. With a stop bundle also returns z_event
+		(n,) and y_event (8,n), where the rays stopped, which z_where and 
+		at_z need as the rows are nan after the stop.
+		"""
+		geos = np.asarray(geos)
+		if geos.ndim == 2:
+			geos = geos[None]
+		stop = start + geos.shape[0]
+		for i, a in enumerate(self._components):
+			a[start:stop] = geos[:,i,:]
+		self.status[start:stop] = status
+		if z_event is not None:
+			self.z_event[start:stop] = z_event
+			self.y_event[start:stop] = np.asarray(y_event).reshape(8,-1).T
+		self.written[start:stop] = True
+
+	def flush(self):
+		for a in self._components:
+			a.flush()
+		for a in (self.status, self.written, self.z_event, self.y_event):
+			a.flush()
+
+	def pending(self):
+		"""
+		the rays that have not been written yet, rays that failed in bundle
+		(status < 0) count as written
+		"""
+		return np.nonzero(~np.asarray(self.written))[0]
+
+	def blocks(self,size=4096):
+		"""
+		slices of at most size rays, for reading the store piece by piece
+		"""
+		for start in range(0,self.num_dir,size):
+			yield slice(start,min(start+size,self.num_dir))
+
+	def _rows(self,component,s):
+		"""
+		the rays s of component with the redshifts of every row, shapes 
+		(n,num_z+1), and the number of points of each row up to the first 
+		nan. A ray stopped by an event gets the event as its last point.
+		"""
+		if not isinstance(component,int):
+			component = COMPONENTS.index(component)
+		x = np.asarray(self[component][s])
+		n, num_z = x.shape
+		valid = np.isfinite(x)
+		num_valid = np.where(valid.all(axis=1),num_z,np.argmin(valid,axis=1))
+		z = np.where(np.arange(num_z) < num_valid[:,None],self.z_vec,np.nan)
+		z = np.concatenate((z,np.zeros((n,1))+np.nan),axis=1)
+		x = np.concatenate((x,np.zeros((n,1))+np.nan),axis=1)
+		rows = np.arange(n)
+		z_ev = np.asarray(self.z_event[s])
+		last = self.z_vec[np.maximum(num_valid-1,0)]
+		stopped = np.isfinite(z_ev) & (num_valid > 0) & (z_ev > last)
+		i = num_valid[stopped]
+		z[rows[stopped],i] = z_ev[stopped]
+		x[rows[stopped],i] = np.asarray(self.y_event[s])[stopped,component]
+		return z, x, num_valid + stopped
+
+	def _nodes(self,j,num_valid):
+		#the 4 points around the interval [j-1, j] among the valid ones
+		start = np.clip(j-2,0,np.maximum(num_valid-4,0))
+		return start[:,None] + np.arange(4)
+
+	def z_where(self,component,value,size=4096):
+		"""
+		the redshift on every ray where the component first reaches value,
+		e.g. z_dec = store.z_where('t',t_dec), by inverse cubic interpolation
+		on the redshift grid and the event of the rays that stopped. nan for
+		the rays that do not get there.
+		"""
+		value = np.zeros(self.num_dir) + value
+		out = np.empty(self.num_dir)
+		for s in self.blocks(size):
+			z, x, num_valid = self._rows(component,s)
+			v = value[s]
+			side = x > v[:,None]
+			crossed = (side != side[:,:1]) & (np.arange(x.shape[1]) < num_valid[:,None])
+			j = np.argmax(crossed,axis=1)
+			ok = crossed.any(axis=1)
+			j[~ok] = 1
+			idx = self._nodes(j,num_valid)
+			x_nodes = np.take_along_axis(x,idx,axis=1)
+			z_nodes = np.take_along_axis(z,idx,axis=1)
+			with np.errstate(divide='ignore',invalid='ignore'):
+				out[s] = np.where(ok,_lagrange(x_nodes,z_nodes,v),np.nan)
+		return out
+
+	def at_z(self,component,z,size=4096):
+		"""
+		the component on every ray at the redshift z of that ray (a number or
+		one per ray), e.g. DA_dec = store.at_z('DA',z_dec), by cubic
+		interpolation on the redshift grid and the event of the rays that
+		stopped. nan beyond the last point of a ray.
+		"""
+		z = np.zeros(self.num_dir) + z
+		out = np.empty(self.num_dir)
+		for s in self.blocks(size):
+			z_rows, x, num_valid = self._rows(component,s)
+			zs = z[s]
+			z_last = z_rows[np.arange(zs.size),np.maximum(num_valid-1,0)]
+			ok = np.isfinite(zs) & (num_valid > 0) & (zs <= z_last)
+			with np.errstate(invalid='ignore'):
+				j = np.sum(z_rows < zs[:,None],axis=1)
+			j = np.clip(j,1,np.maximum(num_valid-1,1))
+			idx = self._nodes(j,num_valid)
+			y_nodes = np.take_along_axis(x,idx,axis=1)
+			z_nodes = np.take_along_axis(z_rows,idx,axis=1)
+			with np.errstate(divide='ignore',invalid='ignore'):
+				out[s] = np.where(ok,_lagrange(z_nodes,y_nodes,zs),np.nan)
+		return out
+
+def trace_to_store(geodesics,P_obs,store,block=256,**kwargs):
+	"""
+	Traces the pending rays of store with geodesics.bundle, block rays at a
+	time, and writes each block as soon as it is done. Starting again on the
+	same store continues where it stopped, rays that failed are not traced
+	again. kwargs go to bundle, the store has to be on the redshifts of the
+	output (z_out); with a stop (t_stop etc.) the events are stored too.
+	"""
+	pending = store.pending()
+	kwargs.setdefault('z_out',store.z_vec)
+	for start in range(0,pending.size,block):
+		rays = pending[start:start+block]
+		ans = geodesics.bundle(P_obs,store.Dirs[rays],**kwargs)
+		geos, status = ans[:2]
+		#with a stop also where every ray stopped
+		z_event, y_event = ans[2:4] if len(ans) > 2 else (None, None)
+		#pending rays are contiguous unless a run was interrupted
+		if rays[-1] - rays[0] == rays.size - 1:
+			store.write(rays[0],geos,status,z_event,y_event)
+		elif z_event is None:
+			for i, ray in enumerate(rays):
+				store.write(ray,geos[i],status[i])
+		else:
+			for i, ray in enumerate(rays):
+				store.write(ray,geos[i],status[i],z_event[i],y_event[:,i])
+		store.flush()
+	return store
@@ -0,0 +1,144 @@
+#!/usr/bin/env python2.7
+####################################################
+# Generates geodesic_kernels.py, the right hand sides of the null geodesic
+# equations for the metrics of the geodesic classes in this package:
+#         ds^2 = -dt^2 + g_ij(t,x) dx^i dx^j
+# with x = (r, theta, phi) for LTB and Szekeres in spherical coordinates
+# (LTB_MyWay.py, LTB_Sclass_v2.py, Szekeres_sph.py) and x = (r, p, q) for the
+# stereographic Szekeres coordinates (Szekeres.py). For every metric two
+# numpy functions are written:
+#         <name>_metric(args, x2, x3)       -> g_11, g_12, g_13, g_22, g_23, g_33
+#         <name>_geodesic(args, x2, x3, k_t, k_1, k_2, k_3)
+#                                           -> d(k_t)/ds, d(k_1)/ds, ...
+# where k is the wave vector, s the affine parameter and args the radial
+# functions of the model and their derivatives at (t, r). The Christoffel
+# symbols are worked out by sympy from g_ij and only their contraction with k
+# is kept, with common subexpressions eliminated. geodesic_engine.py
+# integrates them.
+#
+# Run it again whenever a metric below changes:
+#         python geodesic_codegen.py
+#
+import sympy as sp
+from sympy.core.function import AppliedUndef
+from sympy.printing.numpy import NumPyPrinter
+
+t, r = sp.symbols('t r')
+x2, x3 = sp.symbols('x2 x3')
+k_t, k_1, k_2, k_3 = sp.symbols('k_t k_1 k_2 k_3')
+
+R = sp.Function('R')(t,r)
+E = sp.Function('E')(r)
+k = sp.Function('k')(r)
+P = sp.Function('P')(r)
+Q = sp.Function('Q')(r)
+S = sp.Function('S')(r)
+d = lambda f, n=1: sp.diff(f,r,n)
+
+#the radial functions and their derivatives become the arguments
+def replacements(args):
+	names = dict((str(a),a) for a in args)
+	pairs = [(sp.Derivative(R,r,r),'R_rr'), (sp.Derivative(R,t,r),'R_rt'),
+	         (sp.Derivative(R,r),'R_r'), (sp.Derivative(R,t),'R_t')]
+	for f, name in ((E,'E'), (k,'k'), (P,'P'), (Q,'Q'), (S,'S')):
+		pairs += [(sp.Derivative(f,r,r),name+'_rr'), (sp.Derivative(f,r),name+'_r')]
+	pairs += [(R,'R'), (E,'E'), (k,'k'), (P,'P'), (Q,'Q'), (S,'S')]
+	return [(f,names[name]) for f, name in pairs if name in names]
+
+def metric_LTB():
+	theta = x2
+	g = sp.diag(d(R)**2/(1+2*E), R**2, R**2*sp.sin(theta)**2)
+	args = sp.symbols('R R_r R_t R_rr R_rt E E_r')
+	return g, args
+
+def metric_Szekeres_sph():
+	#Eq. (22) of arXiv:1501.01413, as in Szekeres_sph_codegen.py
+	theta, phi = x2, x3
+	cot_htheta = sp.cos(theta/2)/sp.sin(theta/2)
+	Ez = S/(2*sp.sin(theta/2)**2)
+	Aeq = d(S)**2*cot_htheta**2 + \
+	      2*d(S)*cot_htheta*(d(Q)*sp.sin(phi) + d(P)*sp.cos(phi)) + d(P)**2 + d(Q)**2
+	Beq = cot_htheta*(d(Q)*sp.cos(phi) - d(P)*sp.sin(phi))
+	Ceq = d(Q)*sp.sin(phi) + d(P)*sp.cos(phi) + d(S)*cot_htheta
+	A = (d(R) - R*d(Ez)/Ez)**2/(1-k) + (R/Ez)**2*Aeq
+	B = (R/Ez)**2*S*Beq
+	C = -R**2/Ez*Ceq
+	g = sp.Matrix([[A, C, B], [C, R**2, 0], [B, 0, (R*sp.sin(theta))**2]])
+	args = sp.symbols('R R_r R_t R_rr R_rt k k_r P_r P_rr Q_r Q_rr S S_r S_rr')
+	return g, args
+
+def metric_Szekeres_pq():
+	#Szekeres.py, ds^2 = -dt^2 + H^2 dr^2 + F^2 (dp^2 + dq^2)
+	p, q = x2, x3
+	Ez = S/2*((p-P)**2/S**2 + (q-Q)**2/S**2 + 1)
+	H = (d(R) - R*d(Ez)/Ez)/sp.sqrt(1-k)
+	F = R/Ez
+	g = sp.diag(H**2, F**2, F**2)
+	args = sp.symbols('R R_r R_t R_rr R_rt k k_r P P_r P_rr Q Q_r Q_rr S S_r S_rr')
+	return g, args
+
+def geodesic_exprs(g,args):
+	"""
+	the metric components and -Gamma^mu_ab k^a k^b with the arguments
+	substituted
+	"""
+	x = (r, x2, x3)
+	kx = (k_1, k_2, k_3)
+	replace = replacements(args)
+	#placeholders for g_ij, the inverse is worked out on them
+	G = sp.Matrix(3,3,lambda i, j: sp.Symbol('g%d%d' % tuple(sorted((i,j)))))
+	accel_t = -sum(sp.diff(g[i,j],t)*kx[i]*kx[j] for i in range(3)
+	               for j in range(3))/2
+	lowered = [-sum(sp.diff(g[l,j],t)*k_t*kx[j] for j in range(3))
+	           -sum((sp.diff(g[l,m],x[j]) - sp.diff(g[j,m],x[l])/2)*kx[j]*kx[m]
+	                for j in range(3) for m in range(3)) for l in range(3)]
+	if g.is_diagonal():
+		accel = [lowered[i]/g[i,i] for i in range(3)]
+	else:
+		G_inv = G.adjugate()/G.det()
+		values = dict((G[i,j],g[i,j]) for i in range(3) for j in range(3))
+		accel = [sum(G_inv[i,l]*lowered[l] for l in range(3)).subs(values)
+		         for i in range(3)]
+	metric = [g[0,0], g[0,1], g[0,2], g[1,1], g[1,2], g[2,2]]
+	out = []
+	for e in metric, [accel_t] + accel:
+		e = [sp.sympify(x).subs(replace) for x in e]
+		for x in e:
+			if x.atoms(sp.Derivative) or x.atoms(AppliedUndef):
+				raise AssertionError("unexpected function left in "+str(x))
+		out.append(e)
+	return out
+
+class _Printer(NumPyPrinter):
+	#1/2 would be 0 in python 2
+	def _print_Rational(self,e):
+		return repr(float(e))
+printer = _Printer()
+code = lambda e: printer.doprint(e).replace('numpy.','np.')
+
+def function_lines(name,arguments,exprs,doc):
+	common, reduced = sp.cse(exprs,symbols=sp.numbered_symbols('x_'),
+	                         optimizations='basic')
+	lines = ['def %s(%s):' % (name,','.join(str(a) for a in arguments)),
+	         '\t"""'] + ['\t'+l for l in doc] + ['\t"""']
+	for sym, e in common:
+		lines.append('\t%s = %s' % (sym,code(e)))
+	lines.append('\treturn (' + ',\n\t        '.join(code(e) for e in reduced) + ')')
+	return lines + ['']
+
+lines = ['#!/usr/bin/env python2.7',
+         '####################################################',
+         '# Generated by geodesic_codegen.py, do not edit.',
+         '#',
+         'import numpy as np',
+         '']
+for name, metric in (('LTB',metric_LTB), ('Szekeres_sph',metric_Szekeres_sph),
+                     ('Szekeres_pq',metric_Szekeres_pq)):
+	g, args = metric()
+	metric_exprs, geodesic = geodesic_exprs(g,args)
+	lines += function_lines(name+'_metric',args+(x2,x3),metric_exprs,
+	         ['g_11, g_12, g_13, g_22, g_23, g_33 of the %s metric' % name])
+	lines += function_lines(name+'_geodesic',args+(x2,x3,k_t,k_1,k_2,k_3),geodesic,
+	         ['d(k^mu)/ds = -Gamma^mu_ab k^a k^b of the %s metric' % name])
+	print("%s done" % name)
+open('geodesic_kernels.py','w').write('\n'.join(lines))
@@ -0,0 +1,293 @@
+#!/usr/bin/env python2.7
+####################################################
+# One null geodesic integrator for all the models of this package.
+#
+# LTB_MyWay.LTB_geodesics, Szekeres.Szekeres_geodesics and 
+# Szekeres_sph.Szekeres_geodesics solve the null geodesics of
+#         ds^2 = -dt^2 + g_ij(t,x) dx^i dx^j
+# w.r.t. redshift through NullGeodesics, their __call__ and bundle hand over
+# to it. The model only enters through a metric object wrapping one of those
+# classes, which hands the radial functions at (t,r) to the kernels generated
+# from g_ij by geodesic_codegen.py. Initial conditions, odeint, dopri5_bundle
+# with its events and dense output, and the counters of right hand side
+# evaluations are then the same for every model. LTB_Sclass_v2.LTB_geodesics
+# keeps its own planar equations but can be traced here as well.
+#
+import numpy as np
+import time
+from scipy.integrate import odeint
+from geodesic_bundle import dopri5_bundle, geodesic_event, dense_components
+import geodesic_kernels as kernels
+
+def default_z_vec(num_pt=1600):
+	"""
+	redshifts at which the geodesics are saved, same as
+	LTB_MyWay.LTB_geodesics._set_z_vec
+	"""
+	atleast = 100
+	atleast_tot = atleast*5+1100
+	if not isinstance(num_pt, int):
+		raise AssertionError("num_pt has to be an integer")
+	elif num_pt < atleast_tot:
+		raise AssertionError("Senor I assume at least 1600 points distributed \
+		between z=0 and z=3000")
+	bonus = num_pt - atleast_tot
+	z = np.linspace(0.,1e-6,num=atleast,endpoint=False)
+	z = np.concatenate((z,np.linspace(1e-6,0.01,num=atleast,endpoint=False)))
+	z = np.concatenate((z, np.linspace(0.01,0.1,num=atleast,endpoint=False)))
+	z = np.concatenate((z, np.linspace(0.1,1.,num=atleast,endpoint=False)))
+	z = np.concatenate((z, np.linspace(1.,10.,num=atleast,endpoint=False)))
+	z = np.concatenate((z, np.linspace(10.,3000.,
+	                    num=atleast_tot-4*atleast+bonus,endpoint=True)))
+	return z
+
+def _exact_zeros(*x):
+	#exact zeros for the radial rays, e.g. cos(pi/2)
+	return [np.where(np.abs(v) < 1.5e-16,0.,v) for v in x]
+
+class _Metric(object):
+	"""
+	Common part of the metric objects. A subclass sets
+	        _metric, _geodesic: the kernels of geodesic_kernels.py
+	        _odd: positions of the arguments that are odd r derivatives
+	and defines radial(t,r) returning the kernel arguments at r >= 0, the
+	first three being R, R_r and R_t. The model is continued to r < 0 as 
+	g_ij(t,|r|), so the odd derivatives change sign there.
+	"""
+	def args(self,t,r):
+		values = list(self.radial(t,np.abs(r)))
+		sgn_r = np.where(r < 0.,-1.,1.)
+		for i in self._odd:
+			values[i] = values[i]*sgn_r
+		return values
+
+	def metric(self,args,x2,x3):
+		return self._metric(*(tuple(args)+(x2,x3)))
+
+	def geodesic(self,args,x2,x3,k_t,k_1,k_2,k_3):
+		return self._geodesic(*(tuple(args)+(x2,x3,k_t,k_1,k_2,k_3)))
+
+	def position(self,P_obs):
+		"""
+		(t, r, x2, x3) of an observer at (t, r, theta, phi)
+		"""
+		return tuple(P_obs)
+
+	def direction(self,P_obs,a,b):
+		"""
+		unit vectors, shape (3,num_dir), of the directions (a, b) in the 
+		frame of the coordinate axes: (-sin(a)cos(b-phi_obs), 
+		sin(a)sin(b-phi_obs), cos(a)) along (r, theta, phi)
+		"""
+		b = b - P_obs[3]
+		sin_a, cos_a, sin_b, cos_b = _exact_zeros(np.sin(a),np.cos(a),
+		                                          np.sin(b),np.cos(b))
+		return np.array([-sin_a*cos_b, sin_a*sin_b, cos_a])
+
+	def odeint_jacobian(self):
+		"""
+		Dfun for odeint, the Jacobian of NullGeodesics.derivs_odeint if the 
+		model has one, else None
+		"""
+		return None
+
+class LTB_metric(_Metric):
+	"""
+	LTB, x = (r, theta, phi). model is a LTB_MyWay.LTB_geodesics or a
+	LTB_Sclass_v2.LTB_geodesics, anything with get_E_R_and_derivs(t,r).
+	"""
+	_metric = staticmethod(kernels.LTB_metric)
+	_geodesic = staticmethod(kernels.LTB_geodesic)
+	#R, R_r, R_t, R_rr, R_rt, E, E_r
+	_odd = (1, 4, 6)
+
+	def __init__(self,model):
+		self.model = model
+
+	def radial(self,t,r):
+		E, E_r, R, R_r, R_rr, R_rt, R_t = self.model.get_E_R_and_derivs(t,r)
+		return (R, R_r, R_t, R_rr, R_rt, E, E_r)
+
+	def odeint_jacobian(self):
+		#LTB_MyWay.LTB_geodesics has the analytic one
+		return getattr(self.model,'LTB_geodesic_jacobian_odeint',None)
+
+class Szekeres_sph_metric(_Metric):
+	"""
+	Szekeres in spherical coordinates, x = (r, theta, phi). model is a
+	Szekeres_sph.Szekeres_geodesics.
+	"""
+	_metric = staticmethod(kernels.Szekeres_sph_metric)
+	_geodesic = staticmethod(kernels.Szekeres_sph_geodesic)
+	#R, R_r, R_t, R_rr, R_rt, k, k_r, P_r, P_rr, Q_r, Q_rr, S, S_r, S_rr
+	_odd = (1, 4, 6, 7, 9, 12)
+
+	def __init__(self,model):
+		self.model = model
+
+	def radial(self,t,r):
+		m = self.model
+		E, E_r, P, P_r, P_rr, Q, Q_r, Q_rr, S, S_r, S_rr = m.get_radial_functions(r)
+		return (m.R.ev(r,t), m.R_r.ev(r,t), m.R_t.ev(r,t), m.R_rr.ev(r,t),
+		        m.R_rt.ev(r,t), -2.*E, -2.*E_r, P_r, P_rr, Q_r, Q_rr, S, S_r, S_rr)
+
+class Szekeres_pq_metric(_Metric):
+	"""
+	Szekeres in the stereographic coordinates of Szekeres.py, x = (r, p, q).
+	model is a Szekeres.Szekeres_geodesics.
+	"""
+	_metric = staticmethod(kernels.Szekeres_pq_metric)
+	_geodesic = staticmethod(kernels.Szekeres_pq_geodesic)
+	#R, R_r, R_t, R_rr, R_rt, k, k_r, P, P_r, P_rr, Q, Q_r, Q_rr, S, S_r, S_rr
+	_odd = (1, 4, 6, 8, 11, 14)
+
+	def __init__(self,model):
+		self.model = model
+
+	def radial(self,t,r):
+		m = self.model
+		E, E_r, P, P_r, P_rr, Q, Q_r, Q_rr, S, S_r, S_rr = m.get_radial_functions(r)
+		return (m.R.ev(r,t), m.R_r.ev(r,t), m.R_t.ev(r,t), m.R_rr.ev(r,t),
+		        m.R_rt.ev(r,t), -2.*E, -2.*E_r, P, P_r, P_rr, Q, Q_r, Q_rr,
+		        S, S_r, S_rr)
+
+	def position(self,P_obs):
+		t, r, theta, phi = P_obs
+		m = self.model
+		cot_htheta = 1./np.tan(theta/2.)
+		return (t, r, m.P(r)+m.S(r)*cot_htheta*np.cos(phi),
+		        m.Q(r)+m.S(r)*cot_htheta*np.sin(phi))
+
+	def direction(self,P_obs,a,b):
+		"""
+		(sin(a)cos(b), sin(a)sin(b), cos(a)) along (r, theta, phi), b not
+		measured from phi_obs, turned to the (r, p, q) axes. theta and phi
+		increase along -(cos(phi), sin(phi)) and (-sin(phi), cos(phi)) in 
+		the (p, q) plane.
+		"""
+		phi = P_obs[3]
+		sin_a, cos_a, sin_b, cos_b = _exact_zeros(np.sin(a),np.cos(a),
+		                                          np.sin(b),np.cos(b))
+		n_theta = sin_a*sin_b; n_phi = cos_a
+		return np.array([sin_a*cos_b, -n_theta*np.cos(phi) - n_phi*np.sin(phi),
+		                 -n_theta*np.sin(phi) + n_phi*np.cos(phi)])
+
+class NullGeodesics(object):
+	"""
+	Null geodesics w.r.t. redshift for any metric object above, e.g.
+	        NullGeodesics(LTB_metric(model))
+	The state is y = (t, r, x2, x3, dr_ds, dx2_ds, dx3_ds, DA) with s the
+	affine parameter normalized to dt_ds = 1+z, the same layout as the 
+	geodesic classes. DA is integrated as in LTB_MyWay.LTB_geodesics from
+	dDA_ds = R_t*dt_ds + R_r*abs(dr_ds).
+	metric:
+	        LTB_metric, Szekeres_sph_metric or Szekeres_pq_metric
+	z_vec:
+	        output redshifts, default_z_vec(num_pt) if not given
+	The counters num_rhs and num_ray_evaluations count the calls of the
+	right hand side and the rays evaluated in them, last_run has the
+	counts and the time of the last __call__ or bundle.
+	"""
+	def __init__(self,metric,z_vec=None,num_pt=1600):
+		self.metric = metric
+		self.z_vec = default_z_vec(num_pt) if z_vec is None else np.asarray(z_vec)
+		self.num_rhs = 0
+		self.num_ray_evaluations = 0
+		self.last_run = {}
+
+	def get_init_conds_many(self,P_obs,Dirs):
+		"""
+		Dirs of shape (num_dir,2) of (a, b), the direction in the frame
+		of the coordinate axes is metric.direction(P_obs,a,b), normalized so
+		that the ray is null with dt_ds = 1. Returns shape (8,num_dir).
+		"""
+		t, r, x2, x3 = self.metric.position(P_obs)
+		a, b = np.asarray(Dirs,dtype=float).reshape(-1,2).T
+		n = self.metric.direction(P_obs,a,b)
+		g11, g12, g13, g22, g23, g33 = self.metric.metric(self.metric.args(t,r),x2,x3)
+		g = np.array([[g11,g12,g13],[g12,g22,g23],[g13,g23,g33]],dtype=float)
+		#k^T g k = n^T n = 1 for g = L L^T, L^T k = n
+		k = np.linalg.solve(np.linalg.cholesky(g).T,n)
+		y_init = np.zeros((8,a.size))
+		y_init[0] = t; y_init[1] = r; y_init[2] = x2; y_init[3] = x3
+		y_init[4:7] = k
+		return y_init
+
+	def get_init_conds(self,P_obs,Dir):
+		return self.get_init_conds_many(P_obs,[Dir])[:,0]
+
+	def derivs(self,z,y):
+		"""
+		diff(y,z), y of shape (8,) or (8,num_rays)
+		"""
+		t, r, x2, x3, k_1, k_2, k_3 = y[:7]
+		k_t = 1.+z
+		args = self.metric.args(t,r)
+		a_t, a_1, a_2, a_3 = self.metric.geodesic(args,x2,x3,k_t,k_1,k_2,k_3)
+		ds_dz = 1./a_t
+		#R_r at |r|, as the DA of LTB_MyWay
+		R_r, R_t = args[1]*np.where(r < 0.,-1.,1.), args[2]
+		dDA_ds = R_t*k_t + R_r*np.abs(k_1)
+		self.num_rhs += 1
+		self.num_ray_evaluations += np.size(t)
+		return (k_t*ds_dz, k_1*ds_dz, k_2*ds_dz, k_3*ds_dz,
+		        a_1*ds_dz, a_2*ds_dz, a_3*ds_dz, -dDA_ds*ds_dz)
+
+	def derivs_odeint(self,y,z,*args):
+		return self.derivs(z,y)
+
+	def _count(self,num_rays,start):
+		self.last_run = dict(rays=num_rays, rhs=self.num_rhs-start[0],
+		                     ray_evaluations=self.num_ray_evaluations-start[1],
+		                     seconds=time.time()-start[2])
+
+	def __call__(self,P_obs,Dir,atol=1e-12,rtol=1e-10):
+		"""
+		One ray with odeint, returns the list of the 8 components on z_vec
+		"""
+		start = (self.num_rhs, self.num_ray_evaluations, time.time())
+		y_init = self.get_init_conds(P_obs,Dir)
+		odeint_ans = odeint(func=self.derivs_odeint,y0=y_init,t=self.z_vec,
+		                    args=(),Dfun=self.metric.odeint_jacobian(),
+		                    full_output=0,rtol=rtol,atol=atol,mxstep=10**5)
+		self._count(1,start)
+		return [odeint_ans[:,i] for i in range(8)]
+
+	def bundle(self,P_obs,Dirs,atol=1e-12,rtol=1e-10,t_stop=None,z_stop=None,
+	           r_stop=None,z_out=None,dense=False):
+		"""
+		All directions in one go, same as calling the instance for each Dir 
+		but the rays are integrated together by dopri5_bundle.
+		P_obs: (t_obs, r_obs, theta_obs, phi_obs) 
+		Dirs: array of shape (num_dir,2) of (theta_star , phi_star )
+		t_stop, z_stop, r_stop:
+		        stop every ray where it first reaches the time t_stop (e.g.
+		        last scattering), the redshift z_stop or the radius r_stop,
+		        see geodesic_event
+		z_out: 
+		        redshifts of the output, defaults to self.z_vec. With a stop
+		        the grid only has to reach beyond it, e.g. [0., 3000.]
+		dense:
+		        return a BundleSolution instead of the array, the rays at
+		        any redshift without refitting splines, e.g. sol(z) or the
+		        redshift at a time sol.x_at(t_dec). True keeps t and DA, the
+		        components (0,7), a tuple of components those, e.g. range(8)
+		        for all of them, see BundleSolution
+		Returns the array of shape (num_dir,8,num_pt) and the status of every 
+		ray (0 if it reached the last redshift, see dopri5_bundle); with a
+		stop also the redshift and the state (8,num_dir) where each ray
+		stopped, the status of those rays is 1.
+		"""
+		start = (self.num_rhs, self.num_ray_evaluations, time.time())
+		y_init = self.get_init_conds_many(P_obs,Dirs)
+		#t and DA only, all 8 components take more memory than z_vec
+		if dense is True:
+			dense = (0,7)
+		if z_out is None:
+			z_out = self.z_vec if dense_components(dense,8) is None \
+			        else self.z_vec[[0,-1]]
+		ans = dopri5_bundle(self.derivs,y_init,z_out,atol=atol,rtol=rtol,
+		                    max_steps=10**5,
+		                    event=geodesic_event(t_stop,z_stop,r_stop),dense=dense)
+		self._count(y_init.shape[1],start)
+		return ans
@@ -0,0 +1,291 @@
+#!/usr/bin/env python2.7
+####################################################
+# Generated by geodesic_codegen.py, do not edit.
+#
+import numpy as np
+
+def LTB_metric(R,R_r,R_t,R_rr,R_rt,E,E_r,x2,x3):
+	"""
+	g_11, g_12, g_13, g_22, g_23, g_33 of the LTB metric
+	"""
+	x_0 = R**2
+	return (R_r**2/(2*E + 1),
+	        0,
+	        0,
+	        x_0,
+	        0,
+	        x_0*np.sin(x2)**2)
+
+def LTB_geodesic(R,R_r,R_t,R_rr,R_rt,E,E_r,x2,x3,k_t,k_1,k_2,k_3):
+	"""
+	d(k^mu)/ds = -Gamma^mu_ab k^a k^b of the LTB metric
+	"""
+	x_0 = R*k_2**2
+	x_1 = np.sin(x2)
+	x_2 = R*k_3**2
+	x_3 = x_1**2*x_2
+	x_4 = k_1**2
+	x_5 = 2*E + 1
+	x_6 = x_5**(-1.0)
+	x_7 = R_r*x_6
+	x_8 = R**(-1.0)
+	x_9 = R_r*k_1
+	x_10 = 2*k_2
+	x_11 = R_t*k_t
+	x_12 = np.cos(x2)
+	return (-R_rt*x_4*x_7 - R_t*x_0 - R_t*x_3,
+	        x_5*(-2*R_rt*k_1*k_t*x_6 + x_0 + x_3 + x_4*x_6*(E_r*x_7 - R_rr))/R_r,
+	        -x_8*(-x_1*x_12*x_2 + x_10*x_11 + x_10*x_9),
+	        -2*k_3*x_8*(R*k_2*x_12 + x_1*x_11 + x_1*x_9)/x_1)
+
+def Szekeres_sph_metric(R,R_r,R_t,R_rr,R_rt,k,k_r,P_r,P_rr,Q_r,Q_rr,S,S_r,S_rr,x2,x3):
+	"""
+	g_11, g_12, g_13, g_22, g_23, g_33 of the Szekeres_sph metric
+	"""
+	x_0 = S**(-1.0)
+	x_1 = (0.5)*x2
+	x_2 = np.sin(x_1)
+	x_3 = x_2**2
+	x_4 = np.cos(x_1)
+	x_5 = np.cos(x3)
+	x_6 = np.sin(x3)
+	x_7 = P_r*x_5 + Q_r*x_6
+	x_8 = S_r*x_4/x_2
+	x_9 = R**2
+	x_10 = 4*x_9
+	return (-(R*S_r*x_0 - R_r)**2/(k - 1) + x_10*x_2**4*(P_r**2 + Q_r**2 + S_r**2*x_4**2/x_3 + 2*x_7*x_8)/S**2,
+	        -2*x_0*x_3*x_9*(x_7 + x_8),
+	        -x_0*x_10*x_2**3*x_4*(P_r*x_6 - Q_r*x_5),
+	        x_9,
+	        0,
+	        x_9*np.sin(x2)**2)
+
+def Szekeres_sph_geodesic(R,R_r,R_t,R_rr,R_rt,k,k_r,P_r,P_rr,Q_r,Q_rr,S,S_r,S_rr,x2,x3,k_t,k_1,k_2,k_3):
+	"""
+	d(k^mu)/ds = -Gamma^mu_ab k^a k^b of the Szekeres_sph metric
+	"""
+	x_0 = k_2**2
+	x_1 = R*R_t
+	x_2 = np.sin(x2)
+	x_3 = x_2**2
+	x_4 = k_3**2
+	x_5 = S**(-1.0)
+	x_6 = (0.5)*x2
+	x_7 = np.cos(x_6)
+	x_8 = np.sin(x_6)
+	x_9 = x_8**3
+	x_10 = np.sin(x3)
+	x_11 = np.cos(x3)
+	x_12 = P_r*x_10 - Q_r*x_11
+	x_13 = x_8**2
+	x_14 = x_7/x_8
+	x_15 = S_r*x_14
+	x_16 = P_r*x_11 + Q_r*x_10
+	x_17 = x_15 + x_16
+	x_18 = k_1**2
+	x_19 = S_r*x_5
+	x_20 = R_rt - R_t*x_19
+	x_21 = k - 1
+	x_22 = x_21**(-1.0)
+	x_23 = R*x_19
+	x_24 = -R_r + x_23
+	x_25 = x_22*x_24
+	x_26 = S**(-2.0)
+	x_27 = x_8**4
+	x_28 = S_r**2
+	x_29 = x_7**2
+	x_30 = x_29/x_13
+	x_31 = P_r**2 + Q_r**2 + 2*x_15*x_16 + x_28*x_30
+	x_32 = x_27*x_31
+	x_33 = 4*x_1*x_26*x_32
+	x_34 = x_20*x_25 + x_33
+	x_35 = x_17**2
+	x_36 = R**2
+	x_37 = x_26*x_36
+	x_38 = 4*x_37
+	x_39 = x_27*x_3*x_35*x_38
+	x_40 = 16*x_29*x_37*x_8**6
+	x_41 = x_24**2
+	x_42 = x_32*x_38
+	x_43 = x_12**2*x_40 - x_3*(-x_22*x_41 + x_42)
+	x_44 = (x_39 + x_43)**(-1.0)
+	x_45 = P_rr*x_10 - Q_rr*x_11
+	x_46 = 2*R_r
+	x_47 = R*x_45 + x_12*x_46
+	x_48 = 4*x_18
+	x_49 = x_5*x_9
+	x_50 = x_49*x_7
+	x_51 = x_48*x_50
+	x_52 = k_1*k_2
+	x_53 = R*x_5
+	x_54 = x_13*x_53
+	x_55 = x_52*x_54
+	x_56 = x_12*x_55
+	x_57 = -2*x_13 + 6*x_29 + 1
+	x_58 = 8*x_12
+	x_59 = R_t*k_t
+	x_60 = k_1*x_59
+	x_61 = x_50*x_60
+	x_62 = R_r*x_3
+	x_63 = x_53*x_7
+	x_64 = x_63*x_9
+	x_65 = x_16*x_64
+	x_66 = 2*k_3
+	x_67 = 2*R
+	x_68 = x_2*np.cos(x2)
+	x_69 = k_2*k_3
+	x_70 = 2*x_7
+	x_71 = k_1*k_3
+	x_72 = k_1*x_66*(x_62 + x_65) - x_16*x_53*x_70*x_71*x_9 + x_3*x_59*x_66 + x_67*x_68*x_69
+	x_73 = x_51*(2*R*S_r*x_12*x_5 - x_47) - x_56*x_57 - x_56 - x_58*x_61 + x_72
+	x_74 = 4*x_12
+	x_75 = x_4*x_67
+	x_76 = x_68*x_75
+	x_77 = x_13*x_5
+	x_78 = x_17*x_77
+	x_79 = 8*x_78
+	x_80 = x_60*x_79
+	x_81 = 3*x_29
+	x_82 = x_13 - x_81
+	x_83 = -x_82
+	x_84 = -x_13 + x_81 + 2
+	x_85 = -x_12
+	x_86 = 2*x_13*x_53
+	x_87 = x_71*x_85*x_86
+	x_88 = x_30 + 1
+	x_89 = S_r*x_8*x_88 - 2*x_17*x_7
+	x_90 = x_53*x_8
+	x_91 = x_52*x_90
+	x_92 = x_13*x_23
+	x_93 = x_17*x_70*x_90 - x_88*x_92
+	x_94 = 4*R_r + x_93
+	x_95 = x_92*(S_r*x_7**3/x_9 + x_16*x_30 + x_17)
+	x_96 = S_rr*x_14
+	x_97 = P_rr*x_11 + Q_rr*x_10
+	x_98 = R*(x_96 + x_97) - x_17*x_23 + x_17*x_46
+	x_99 = x_31*x_70*x_90 - x_95 + x_98
+	x_100 = x_48*x_77
+	x_101 = 2*R*k_1*k_3*x_12*x_13*x_5*x_83 + 4*R_t*k_2*k_t + k_1*k_2*x_94 - x_100*x_99 - x_76 - x_80 - x_84*x_87 + x_89*x_91
+	x_102 = k_t*x_1
+	x_103 = 16*k_3*x_102*x_50
+	x_104 = k_2*x_102*x_79
+	x_105 = x_75*(x_62 + 4*x_65)
+	x_106 = 4*x_36*x_69*x_77*x_85
+	x_107 = x_23*x_85
+	x_108 = -R*x_45 + x_46*x_85
+	x_109 = -5*x_107 + x_108
+	x_110 = 4*x_64*x_71
+	x_111 = R_r + x_93
+	x_112 = x_0*x_67
+	x_113 = x_52*x_86
+	x_114 = 8*x_31*x_63*x_8 - 4*x_95 + x_98
+	x_115 = R*x_26
+	x_116 = R_r*x_19 - R_rr + S_rr*x_53 - x_115*x_28
+	x_117 = 8*x_32
+	x_118 = R_r*x_115*x_117 + 8*x_27*x_37*(P_r*P_rr + Q_r*Q_rr + S_r*S_rr*x_30 + x_15*x_97 + x_16*x_96) - S_r*x_117*x_36/S**3
+	x_119 = x_3*(2*R*k_1*k_2*x_114*x_13*x_5 + 4*R*k_1*k_3*x_5*x_7*x_9*(R*S_r*x_12*x_5 - x_47) + 4*k_1*k_t*x_34 + 4*k_2*k_3*x_12*x_13*x_36*x_5 - x_103*x_12 - x_104 - x_105 - x_106*x_82 - x_109*x_110 - x_111*x_112 - x_113*x_98 + x_18*(k_r*x_41/x_21**2 - 2*x_116*x_25 + x_118))
+	x_120 = x_115*x_17*x_7*x_8**5
+	x_121 = R**(-1.0)
+	x_122 = -x_21
+	x_123 = x_122**(-1.0)
+	x_124 = -x_24
+	x_125 = x_124**2
+	x_126 = x_123*x_125 + x_42
+	x_127 = x_55*x_85
+	x_128 = 4*k_t
+	x_129 = x_123*x_124
+	return (4*R*R_t*k_1*k_2*x_13*x_17*x_5 + 8*R*R_t*k_1*k_3*x_12*x_5*x_7*x_9 - x_0*x_1 - x_1*x_3*x_4 - x_18*x_34,
+	        x_44*(x_101*x_17*x_3*x_54 + (0.5)*x_119 + x_64*x_73*x_74),
+	        x_44*(-0.5*x_101*x_121*x_43 + x_119*x_78 + x_120*x_58*x_73),
+	        (x_12*x_49*x_70*(k_1*x_128*(x_129*x_20 + x_33) + x_103*x_85 - x_104 - x_105 + x_106*x_83 - x_106 - x_109*x_110 + x_110*(-x_107 + x_108) - x_111*x_112 + x_113*x_114 - x_113*x_98 + x_18*(k_r*x_125/x_122**2 - 2*x_116*x_129 + x_118)) + x_120*x_74*(R_t*k_2*x_128 - x_100*x_99 + x_52*x_94 - x_76 - x_80 + x_82*x_87 - x_84*x_87 + x_89*x_91) - x_121*(-x_126 + 4*x_26*x_27*x_35*x_36)*(x_127*x_57 + x_127 + x_51*(-2*x_107 + x_108) + 8*x_61*x_85 + x_72))/(-x_126*x_3 + x_39 + x_40*x_85**2))
+
+def Szekeres_pq_metric(R,R_r,R_t,R_rr,R_rt,k,k_r,P,P_r,P_rr,Q,Q_r,Q_rr,S,S_r,S_rr,x2,x3):
+	"""
+	g_11, g_12, g_13, g_22, g_23, g_33 of the Szekeres_pq metric
+	"""
+	x_0 = S**(-1.0)
+	x_1 = S**(-2.0)
+	x_2 = P - x2
+	x_3 = Q - x3
+	x_4 = x_1*x_2**2 + x_1*x_3**2 + 1
+	x_5 = -x_2
+	x_6 = -x_3
+	x_7 = S_r*x_0
+	x_8 = 4*R**2*x_1/x_4**2
+	return (-(R*x_0*(S_r*x_4 - 2*x_0*(P_r*x_5 + Q_r*x_6 + x_5**2*x_7 + x_6**2*x_7))/x_4 - R_r)**2/(k - 1),
+	        0,
+	        0,
+	        x_8,
+	        0,
+	        x_8)
+
+def Szekeres_pq_geodesic(R,R_r,R_t,R_rr,R_rt,k,k_r,P,P_r,P_rr,Q,Q_r,Q_rr,S,S_r,S_rr,x2,x3,k_t,k_1,k_2,k_3):
+	"""
+	d(k^mu)/ds = -Gamma^mu_ab k^a k^b of the Szekeres_pq metric
+	"""
+	x_0 = S**(-2.0)
+	x_1 = R*x_0
+	x_2 = k_2**2*x_1
+	x_3 = P - x2
+	x_4 = x_3**2
+	x_5 = Q - x3
+	x_6 = x_5**2
+	x_7 = x_0*x_4 + x_0*x_6 + 1
+	x_8 = x_7**2
+	x_9 = 4/x_8
+	x_10 = R_t*x_9
+	x_11 = k_3**2*x_1
+	x_12 = S**(-1.0)
+	x_13 = x_7**(-1.0)
+	x_14 = -x_3
+	x_15 = P_r*x_14
+	x_16 = -x_5
+	x_17 = Q_r*x_16
+	x_18 = x_14**2
+	x_19 = S_r*x_12
+	x_20 = x_16**2
+	x_21 = x_15 + x_17 + x_18*x_19 + x_19*x_20
+	x_22 = 2*x_12
+	x_23 = -x_21*x_22
+	x_24 = x_12*x_13*(S_r*x_7 + x_23)
+	x_25 = R_rt - R_t*x_24
+	x_26 = k_1**2
+	x_27 = k - 1
+	x_28 = x_27**(-1.0)
+	x_29 = -R_r
+	x_30 = x_0*x_18
+	x_31 = x_0*x_20
+	x_32 = x_30 + x_31 + 1
+	x_33 = x_32**(-1.0)
+	x_34 = R*x_33
+	x_35 = S_r*x_32 + x_23
+	x_36 = x_12*x_35
+	x_37 = x_29 + x_34*x_36
+	x_38 = x_28*x_37
+	x_39 = x_26*x_38
+	x_40 = x_0*x_21
+	x_41 = -R*x_19 + R_r
+	x_42 = 4/x_32**2
+	x_43 = x_42*(2*x_34*x_40 + x_41)
+	x_44 = x_33*x_36
+	x_45 = -P_r - x_14*x_19 - x_14*x_44
+	x_46 = 4*k_1*x_0*x_34*x_38
+	x_47 = -Q_r - x_16*x_19 - x_16*x_44
+	x_48 = 4*x_19
+	x_49 = S_rr*x_12
+	x_50 = 3*S_r**2
+	x_51 = k_2*x_9
+	x_52 = R_t*k_t
+	x_53 = x_7**(-3.0)
+	x_54 = 8*k_2*k_3*x_1*x_53
+	x_55 = 4*x_53
+	x_56 = x_3*x_55
+	x_57 = k_1*(2*x_1*x_13*(-P_r*x_3 - Q_r*x_5 + S_r*x_12*x_4 + S_r*x_12*x_6) + x_41)
+	x_58 = x_33*x_39
+	x_59 = (0.5)*x_8/R
+	x_60 = k_3*x_9
+	x_61 = x_5*x_55
+	return (-x_10*x_11 - x_10*x_2 - x_25*x_39,
+	        x_27*(2*k_1*k_t*x_25*x_28*x_37 - k_2*x_45*x_46 - k_3*x_46*x_47 - x_11*x_43 - x_2*x_43 + (0.5)*x_26*x_28*x_37*(2*R*S_r*x_0*x_33*x_35 - R*x_21*x_35*x_42/S**3 - R_r*x_22*x_33*x_35 + 2*R_rr + k_r*x_28*x_37 - x_22*x_34*(-4*S_r*x_40 + S_rr*x_32 + x_22*(P_r**2 - P_rr*x_14 + Q_r**2 - Q_rr*x_16 + x_15*x_48 + x_17*x_48 - x_18*x_49 - x_20*x_49 + x_30*x_50 + x_31*x_50))))/(R*x_24 + x_29)**2,
+	        -x_59*(-x_11*x_56 + x_2*x_56 + x_45*x_58 + x_5*x_54 + x_51*x_52 + x_51*x_57),
+	        -x_59*(x_11*x_61 - x_2*x_61 + x_3*x_54 + x_47*x_58 + x_52*x_60 + x_57*x_60))
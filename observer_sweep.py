@@ -0,0 +1,146 @@
+#!/usr/bin/env python2.7
+####################################################
+# Geodesic bundles for many observers in one background.
+#
+# The background (E(r), the R(t,r) grid and the splines of a geodesic class) is
+# built once by the driver. ObserverSweep then traces the same directions from
+# every observer position, splitting the work into tasks of one observer and a
+# block of directions that go to a multiprocessing pool. The geodesic object is
+# handed to the workers once, by the pool initializer, and kept there as a
+# module global: with fork it is simply inherited, otherwise it is pickled once
+# per worker and not once per task. A task only carries its observer and
+# directions. With share=True the arrays of the geodesic object go through
+# shared_grids.SharedObject instead, one copy in shared memory for all workers.
+#
+import numpy as np
+import multiprocessing as mp
+from shared_grids import SharedObject
+from geodesic_bundle import dense_components
+
+#the geodesic object of this worker, set by _init_worker
+_geodesics = None
+
+def _init_worker(geodesics):
+	global _geodesics
+	if isinstance(geodesics,SharedObject):
+		geodesics = geodesics.load()
+	_geodesics = geodesics
+
+def _trace(task):
+	i_obs, start, P_obs, Dirs, kwargs = task
+	return i_obs, start, _geodesics.bundle(P_obs,Dirs,**kwargs)
+
+class ObserverSweep(object):
+	"""
+	geodesics:
+	        anything with bundle(P_obs,Dirs,...) like LTB_MyWay.LTB_geodesics,
+	        Szekeres.Szekeres_geodesics, Szekeres_sph.Szekeres_geodesics or
+	        geodesic_engine.NullGeodesics, with the background already set up
+	processes:
+	        size of the pool, default mp.cpu_count()-1. With 1 everything is
+	        done in this process.
+	tasks_per_process:
+	        the directions of every observer are split in blocks so that there
+	        are at least this many tasks per process, fewer rays per bundle
+	        but a better balanced pool
+	share:
+	        send the workers the arrays of geodesics as read only memory maps
+	        of one copy in shared memory, see shared_grids.SharedObject
+	"""
+	def __init__(self,geodesics,processes=None,tasks_per_process=4,share=False):
+		self.geodesics = geodesics
+		if processes is None:
+			processes = max(mp.cpu_count()-1,1)
+		self.processes = processes
+		self.tasks_per_process = tasks_per_process
+		self.share = share
+		self._pool = None
+		self._shared = None
+
+	def _get_pool(self):
+		if self._pool is None:
+			if self.share:
+				self._shared = SharedObject(self.geodesics)
+			self._pool = mp.Pool(self.processes,initializer=_init_worker,
+			                     initargs=(self._shared or self.geodesics,))
+		return self._pool
+
+	def close(self):
+		"""
+		stop the workers, a new pool is started by the next call
+		"""
+		if self._pool is not None:
+			self._pool.close()
+			self._pool.join()
+			self._pool = None
+		if self._shared is not None:
+			self._shared.close()
+			self._shared = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+	def _tasks(self,P_obs,Dirs,kwargs):
+		num_dir = Dirs.shape[0]
+		num_blocks = -(-self.tasks_per_process*self.processes//len(P_obs))
+		num_blocks = min(max(num_blocks,1),num_dir)
+		edges = np.linspace(0,num_dir,num_blocks+1).astype(int)
+		return [(i, a, P, Dirs[a:b], kwargs) for i, P in enumerate(P_obs)
+		        for a, b in zip(edges[:-1],edges[1:])]
+
+	def __call__(self,t_obs,observers,Dirs,**kwargs):
+		"""
+		t_obs: time of observation, the same for all observers
+		observers:
+		        array of shape (num_obs,3) of (r_obs, theta_obs, phi_obs)
+		Dirs: array of shape (num_dir,2) of (theta_star , phi_star ), the
+		        same directions for every observer
+		kwargs:
+		        passed on to bundle, e.g. atol, rtol, t_stop, z_out. dense is
+		        not supported, the dense output of every ray would have to be
+		        sent back.
+		Returns the bundle outputs stacked over observers: the array of shape
+		(num_obs,num_dir,8,num_pt) and the status (num_obs,num_dir); with a
+		stop also the redshift (num_obs,num_dir) and state (num_obs,8,num_dir)
+		where each ray stopped.
+		"""
+		if dense_components(kwargs.get('dense',False),8) is not None:
+			raise AssertionError("dense output is not supported by the sweep")
+		observers = np.atleast_2d(np.asarray(observers,dtype=float))
+		if observers.shape[1] != 3:
+			raise AssertionError("observers has to be of shape (num_obs,3)")
+		Dirs = np.asarray(Dirs,dtype=float).reshape(-1,2)
+		P_obs = [(t_obs,)+tuple(obs) for obs in observers]
+		tasks = self._tasks(P_obs,Dirs,kwargs)
+		if self.processes == 1:
+			_init_worker(self.geodesics)
+			done = map(_trace,tasks)
+		else:
+			done = self._get_pool().imap_unordered(_trace,tasks)
+
+		out = None
+		num_obs, num_dir = len(P_obs), Dirs.shape[0]
+		for i_obs, start, ans in done:
+			if out is None:
+				#the ray axis of every output, the state has it last
+				axes = [0, 0, 0, 1][:len(ans)]
+				out = [np.empty((num_obs,)+np.shape(a)[:ax]+(num_dir,)+
+				                np.shape(a)[ax+1:],dtype=np.asarray(a).dtype)
+				       for a, ax in zip(ans,axes)]
+			for o, a, ax in zip(out,ans,axes):
+				a = np.asarray(a)
+				index = [i_obs] + [slice(None)]*ax + [slice(start,start+a.shape[ax])]
+				o[tuple(index)] = a
+		return tuple(out)
+
+def observers_around(r_obs,theta_obs,phi_obs):
+	"""
+	all combinations of the given r_obs, theta_obs and phi_obs as an array
+	of shape (num_obs,3) for ObserverSweep
+	"""
+	r, theta, phi = np.meshgrid(np.atleast_1d(r_obs),np.atleast_1d(theta_obs),
+	                            np.atleast_1d(phi_obs),indexing='ij')
+	return np.column_stack((r.ravel(),theta.ravel(),phi.ravel()))
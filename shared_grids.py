@@ -0,0 +1,142 @@
+#!/usr/bin/env python2.7
+####################################################
+# Background grids shared with worker processes instead of pickled per task.
+#
+# SharedObject pickles an object, e.g. a geodesic class with its
+# RectBivariateSpline, LTB_Background and RadialProfile members, but every
+# large numpy array in it (the grids, knots and spline coefficients) is written
+# once to a .npy file, in /dev/shm (POSIX shared memory) where there is one.
+# Only a reference to the file stays in the pickle. load() rebuilds the object
+# with those arrays read only np.memmap's, so all the workers read the same
+# pages. SharedPool hands a SharedObject to its workers through the pool
+# initializer, and then a task is only the argument that changes, e.g. the
+# direction of a geodesic.
+#
+# Functions referred to by the object (E(r) etc.) are pickled by name as usual,
+# with fork the workers have the ones of the driver.
+#
+import numpy as np
+import multiprocessing as mp
+import pickle
+import tempfile
+import shutil
+import os
+from functools import partial
+try:
+	from cStringIO import StringIO as BytesIO
+except ImportError:
+	from io import BytesIO
+
+class _Pickler(pickle.Pickler):
+	def __init__(self,file,directory,min_bytes):
+		pickle.Pickler.__init__(self,file,2)
+		self.directory = directory
+		self.min_bytes = min_bytes
+		#id -> file name, the arrays are kept so that the ids stay unique
+		self.saved = {}
+		self.arrays = []
+
+	def persistent_id(self,obj):
+		if type(obj) is not np.ndarray and not isinstance(obj,np.memmap):
+			return None
+		if obj.dtype.hasobject or obj.nbytes < self.min_bytes:
+			return None
+		if id(obj) not in self.saved:
+			name = "%d.npy" % len(self.arrays)
+			np.save(os.path.join(self.directory,name),obj)
+			self.saved[id(obj)] = name
+			self.arrays.append(obj)
+		return self.saved[id(obj)]
+
+class _Unpickler(pickle.Unpickler):
+	def __init__(self,file,directory):
+		pickle.Unpickler.__init__(self,file)
+		self.directory = directory
+
+	def persistent_load(self,name):
+		return np.load(os.path.join(self.directory,name),mmap_mode='r')
+
+class SharedObject(object):
+	"""
+	obj:
+	        anything picklable, its numpy arrays of at least min_bytes go to
+	        files in directory
+	directory:
+	        default a new directory in /dev/shm, or in the temporary directory
+	        of the system if there is no /dev/shm
+	The instance itself pickles to a few kB. Call close() to remove the
+	files once the workers are done.
+	"""
+	def __init__(self,obj,directory=None,min_bytes=1<<16):
+		if directory is None:
+			shm = '/dev/shm'
+			directory = tempfile.mkdtemp(prefix='LTB_grids_',
+			                             dir=shm if os.path.isdir(shm) else None)
+		self.directory = directory
+		buf = BytesIO()
+		pickler = _Pickler(buf,directory,min_bytes)
+		pickler.dump(obj)
+		self.payload = buf.getvalue()
+		self.num_arrays = len(pickler.arrays)
+		self.nbytes = sum(a.nbytes for a in pickler.arrays)
+
+	def load(self):
+		"""
+		the object, with the large arrays memory mapped read only
+		"""
+		return _Unpickler(BytesIO(self.payload),self.directory).load()
+
+	def close(self):
+		if os.path.isdir(self.directory):
+			shutil.rmtree(self.directory)
+
+#the function of this worker, set by _init_worker
+_function = None
+
+def _init_worker(shared,method,head,kwargs):
+	global _function
+	obj = shared.load() if isinstance(shared,SharedObject) else shared
+	f = obj if method is None else getattr(obj,method)
+	_function = partial(f,*head,**kwargs)
+
+def _apply(arg):
+	return _function(arg)
+
+class SharedPool(object):
+	"""
+	A multiprocessing pool that calls obj (or obj.method) in the workers.
+	        with SharedPool(model_geodesics,head=(P_obs,)) as pool:
+	                geos = pool.map(angles)
+	is model_geodesics(P_obs,angle) for all the angles, with the arrays of
+	model_geodesics shared through a SharedObject and only the angle sent with
+	every task.
+	head, kwargs:
+	        the arguments that are the same for all the tasks, before the one
+	        that changes and as keywords
+	processes:
+	        default mp.cpu_count()-1
+	"""
+	def __init__(self,obj,head=(),kwargs=None,method=None,processes=None,
+	             directory=None):
+		if processes is None:
+			processes = max(mp.cpu_count()-1,1)
+		self.shared = SharedObject(obj,directory=directory)
+		self.pool = mp.Pool(processes,initializer=_init_worker,
+		                    initargs=(self.shared,method,tuple(head),kwargs or {}))
+
+	def map(self,args,chunksize=1):
+		return self.pool.map(_apply,args,chunksize)
+
+	def imap(self,args,chunksize=1):
+		return self.pool.imap(_apply,args,chunksize)
+
+	def close(self):
+		self.pool.close()
+		self.pool.join()
+		self.shared.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
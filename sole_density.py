@@ -1,5 +1,6 @@
 from __future__ import division
 import numpy as np
+from CMB_maps import galactic_pixel_centres, axial_alm
 from LTB_Sclass_v2 import LTB_ScaleFactor
 from LTB_Sclass_v2 import LTB_geodesics, sample_radial_coord
 from LTB_housekeeping import *
@@ -109,8 +110,14 @@ def E_loop(r,Lambda_over3):
 
 num_cores = mp.cpu_count()-1
 
-E_vec = Parallel(n_jobs=num_cores,verbose=0)(delayed(E_loop)(r,Lambda/3.) for r in r_vector)
-E_vec = np.asarray(E_vec)/2.
+#E_vec = Parallel(n_jobs=num_cores,verbose=0)(delayed(E_loop)(r,Lambda/3.) for r in r_vector)
+#E_vec = np.asarray(E_vec)/2.
+#all radii at once
+E_vec, E_converged = get_2E_over_r3(2.*LTBw_M(r_vector)/r_vector**3,Lambda/3.,model_age,
+                                    a=0.,b=1e-6)
+E_vec = E_vec/2.
+if not E_converged.all():
+	print "E(r) did not converge for r = ", r_vector[~E_converged]
 
 i = 0
 for r in r_vector:
@@ -230,7 +237,8 @@ sp_p_vec = spline_2d(angles,geo_z_vec,geo_p_vec,s=0)
 sp_theta_vec = spline_2d(angles,geo_z_vec,geo_theta_vec,s=0)
 
 
-ras, dec = np.loadtxt("pixel_center_galactic_coord_12288.dat",unpack=True)
+#ras, dec = np.loadtxt("pixel_center_galactic_coord_12288.dat",unpack=True)
+ras, dec = galactic_pixel_centres(32)
 #Rascension, declination, gammas = get_angles(ras, dec)
 from GP_profiles import get_GP_angles
 ## NOTE: 
@@ -257,8 +265,12 @@ z_at_tdec.set_bounds(z_star-20.,z_star+20.)
 def z_at_tdec_root(gamma):
 	return z_at_tdec.root(gamma)
 
-z_of_angles = Parallel(n_jobs=num_cores,verbose=0)(delayed(z_at_tdec_root)(gamma) for gamma in angles)
-z_of_angles = np.asarray(z_of_angles)
+#z_of_angles = Parallel(n_jobs=num_cores,verbose=0)(delayed(z_at_tdec_root)(gamma) for gamma in angles)
+#z_of_angles = np.asarray(z_of_angles)
+#all angles in one go, sp_t_vec.ev takes arrays
+z_of_angles, z_converged = z_at_tdec.root_many(angles)
+if not z_converged.all():
+	print "z(t_dec) did not converge for gamma = ", angles[~z_converged]
 
 z_of_angles_sp = spline_1d(angles,z_of_angles,s=0)
 z_of_gamma = z_of_angles_sp(gammas) 
@@ -284,30 +296,32 @@ def Delta_T(xi):
 	"""
 	return 2.7255*(z_mean - z_of_angles_sp(xi))/(1.+z_of_angles_sp(xi))
 
-from scipy.special import legendre as legendre
-
-@Integrate
-def al0(xi,ell):
-	"""
-	For m=0
-	Ylm = 1/2 sqrt((2l+1)/pi) LegendreP(l,x)
-	xi: angle in radians
-	Note: The integral over the other angle gives a factor of 2pi
-	While healpix does the spherical harmonic decomposition w.r.t spherical 
-	polar coordinates (theta,phi), this manual decomposition is w.r.t the 
-	angle (xi,phi) and xi is not theta.
-	"""
-	LegPol = legendre(ell)
-	return 2.*np.pi*Delta_T(xi)*np.sqrt((2.*ell+1.)/(4.*np.pi))*LegPol(np.cos(xi))*np.sin(xi)
-
-al0.set_options(epsabs=1.49e-14,epsrel=1.49e-12)
-al0.set_limits(0.,np.pi)
+#from scipy.special import legendre as legendre
+#
+#@Integrate
+#def al0(xi,ell):
+#	"""
+#	For m=0
+#	Ylm = 1/2 sqrt((2l+1)/pi) LegendreP(l,x)
+#	xi: angle in radians
+#	Note: The integral over the other angle gives a factor of 2pi
+#	While healpix does the spherical harmonic decomposition w.r.t spherical 
+#	polar coordinates (theta,phi), this manual decomposition is w.r.t the 
+#	angle (xi,phi) and xi is not theta.
+#	"""
+#	LegPol = legendre(ell)
+#	return 2.*np.pi*Delta_T(xi)*np.sqrt((2.*ell+1.)/(4.*np.pi))*LegPol(np.cos(xi))*np.sin(xi)
+#
+#al0.set_options(epsabs=1.49e-14,epsrel=1.49e-12)
+#al0.set_limits(0.,np.pi)
+#all a_l0 at once from Delta_T on Gauss-Legendre nodes in cos(xi)
+a_l0 = axial_alm(Delta_T,10)
 print "\n One has to be careful as to how the spherical harmonics are normalized"
 print "There are atleast three different ways adopted in literature"
 print " now manually calculating alms , divided 4pi/(2l+1)"
-print "alm , l=0, m=0", al0.integral(0), al0.integral(0)/ np.sqrt(4*np.pi/1) 
-print "alm , l=1, m=0", al0.integral(1), al0.integral(1)/ np.sqrt(4*np.pi/3)
-print "alm , l=2, m=0", al0.integral(2), al0.integral(2)/ np.sqrt(4*np.pi/5)
+print "alm , l=0, m=0", a_l0[0], a_l0[0]/ np.sqrt(4*np.pi/1) 
+print "alm , l=1, m=0", a_l0[1], a_l0[1]/ np.sqrt(4*np.pi/3)
+print "alm , l=2, m=0", a_l0[2], a_l0[2]/ np.sqrt(4*np.pi/5)
 
 flip = 'geo' #'astro' # 'geo'
 hp.mollview(map = my_map, title = "temp_map" ,
@@ -18,7 +18,9 @@ from mpl_toolkits.mplot3d import Axes3D
 from joblib import Parallel, delayed
 from joblib.pool import has_shareable_memory
 import multiprocessing as mp
+from shared_grids import SharedPool
 import healpy as hp
+from CMB_maps import temperature_map
 
 c = 299792458. #ms^-1
 Mpc = 1.
@@ -306,14 +308,20 @@ plt.xscale('log')
 plt.show()
 import sys
 #sys.exit()
-def geo_loop(angle):
-	return model_geodesics(
-	       [model_age,r_vector[0]*0.+loc, (90.+29.3)*np.pi/180.,276.4*np.pi/180.],#np.pi/2.,np.pi/4.],#(90.)*np.pi/180.,276.4*np.pi/180.],
-           angle)
-
+#def geo_loop(angle):
+#	return model_geodesics(
+#	       [model_age,r_vector[0]*0.+loc, (90.+29.3)*np.pi/180.,276.4*np.pi/180.],#np.pi/2.,np.pi/4.],#(90.)*np.pi/180.,276.4*np.pi/180.],
+#           angle)
+#
+#num_cores=7
+#geos = Parallel(n_jobs=num_cores,verbose=5)(
+#delayed(geo_loop)(angle=angle) for angle in angles)
+#the background arrays go to shared memory once, a task is just the angle
 num_cores=7
-geos = Parallel(n_jobs=num_cores,verbose=5)(
-delayed(geo_loop)(angle=angle) for angle in angles)
+with SharedPool(model_geodesics,processes=num_cores,
+                head=([model_age,r_vector[0]*0.+loc,
+                      (90.+29.3)*np.pi/180.,276.4*np.pi/180.],)) as pool:
+	geos = pool.map(angles)
 print "type and shape", type(geos)
 print "as tuple", np.shape(geos)
 geos = np.asarray(geos)
@@ -372,10 +380,12 @@ print "reshaped z_dec", np.reshape(z_dec,(theta.size,phi.size))
 #                     hp.pix2ang(np.arange(z_dec.size))]
 #                     ))
 #plt.figure()
-a, b = hp.pix2ang(32,np.arange(hp.nside2npix(32)))
-zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
-#zdec_map = (zdec_map.mean()-zdec_map)/(1.+zdec_map)*2.7255
-zdec_map = (z_ls-zdec_map)/(1.+zdec_map)*2.7255
+#a, b = hp.pix2ang(32,np.arange(hp.nside2npix(32)))
+#zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
+##zdec_map = (zdec_map.mean()-zdec_map)/(1.+zdec_map)*2.7255
+#zdec_map = (z_ls-zdec_map)/(1.+zdec_map)*2.7255
+#pixel centres and the spline a chunk of pixels at a time
+zdec_map = temperature_map(32,sp_z_dec.ev,T0=2.7255,z_mean=z_ls)
 proj_map = hp.mollview(zdec_map,coord='G')
 hp.mollview(map = zdec_map, title = "Simulated dipole" ,
 remove_mono=True,format='%.4e',coord='G')
@@ -1,7 +1,11 @@
 from __future__ import division
 import numpy as np
 from LTB_Sclass_v2 import LTB_ScaleFactor, sample_radial_coord
+from LTB_exact import LTB_EllipticScaleFactor, t_elliptic
 from LTB_MyWay import LTB_geodesics
+from LTB_interp import LTB_Background
+from LTB_cache import BackgroundCache
+from CMB_maps import galactic_pixel_centres, axial_alm, rotated_alm
 from LTB_housekeeping import *
 
 from scipy.interpolate import UnivariateSpline as spline_1d
@@ -90,7 +94,9 @@ LTB_t.set_options(epsabs=1.49e-16,epsrel=1.49e-12)
 LTB_t.set_limits(0.,1.)
 @Findroot
 def LTB_2E_Eq(twoE_over_r3,twoM_over_r3,Lambda_over3):
-	return model_age - LTB_t.integral(twoE_over_r3,twoM_over_r3,Lambda_over3) #*1.e-3
+	#return model_age - LTB_t.integral(twoE_over_r3,twoM_over_r3,Lambda_over3) #*1.e-3
+	#closed form of the same integral
+	return model_age - t_elliptic(1.,twoE_over_r3/2.,twoM_over_r3/2.,3.*Lambda_over3)
 
  
 
@@ -110,8 +116,16 @@ def E_loop(r,Lambda_over3):
 
 num_cores = mp.cpu_count()-1
 
-E_vec = Parallel(n_jobs=num_cores,verbose=0)(delayed(E_loop)(r,Lambda/3.) for r in r_vector)
-E_vec = np.asarray(E_vec)/2.
+#E_vec = Parallel(n_jobs=num_cores,verbose=0)(delayed(E_loop)(r,Lambda/3.) for r in r_vector)
+#E_vec = np.asarray(E_vec)/2.
+#E(r) and R(t,r) are loaded from disk when the model was solved before
+cache = BackgroundCache()
+#all radii at once
+E_vec, E_converged = get_2E_over_r3(2.*LTBw_M(r_vector)/r_vector**3,Lambda/3.,model_age,
+                                    a=0.,b=1e-6,cache=cache)
+E_vec = E_vec/2.
+if not E_converged.all():
+	print "E(r) did not converge for r = ", r_vector[~E_converged]
 
 i = 0
 for r in r_vector:
@@ -139,8 +153,11 @@ def dLTBw_E_dr(r):
 
 
 
-model =  LTB_ScaleFactor(Lambda=Lambda,LTB_E=LTBw_E, LTB_Edash=dLTBw_E_dr,\
-                              LTB_M=LTBw_M, LTB_Mdash=dLTBw_M_dr)
+#model =  LTB_ScaleFactor(Lambda=Lambda,LTB_E=LTBw_E, LTB_Edash=dLTBw_E_dr,\
+#                              LTB_M=LTBw_M, LTB_Mdash=dLTBw_M_dr)
+#R(t,r) in closed form instead of odeint
+model =  LTB_EllipticScaleFactor(Lambda=Lambda,LTB_E=LTBw_E, LTB_Edash=dLTBw_E_dr,\
+                              LTB_M=LTBw_M, LTB_Mdash=dLTBw_M_dr,cache=cache)
 
 num_pt = 1000 #6000
 r_vec, t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec, = \
@@ -153,21 +170,25 @@ r_vec, t_vec, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec, = \
 #	Rdashdot_vec[i,:] = LTB_model0(r_loc=r_loc,num_pt=num_pt)
 #	r_vec[i,:] = r_vec[i,:] + r_loc
 
-def r_loop(r_loc):
-	return model(r_loc=r_loc,t_max=model_age,num_pt=num_pt)
-
-
-num_cores = mp.cpu_count()-1	
-r = Parallel(n_jobs=num_cores,verbose=0)(delayed(r_loop)(r_loc) for r_loc in r_vector)
-#r = Parallel(n_jobs=num_cores,verbose=0)(delayed(LTB_model0)(r_loc=r_loc,num_pt=num_pt) for r_loc in r_vector)
-
-i = 0
-for tup in r:
-	t_vec[i,:], R_vec[i,:], Rdot_vec[i,:], Rdash_vec[i,:], Rdotdot_vec[i,:], \
-	Rdashdot_vec[i,:] = tup
-	i = i + 1
+#parallel, one task per shell
+#def r_loop(r_loc):
+#	return model(r_loc=r_loc,t_max=model_age,num_pt=num_pt)
+#
+#
+#num_cores = mp.cpu_count()-1	
+#r = Parallel(n_jobs=num_cores,verbose=0)(delayed(r_loop)(r_loc) for r_loc in r_vector)
+#
+#i = 0
+#for tup in r:
+#	t_vec[i,:], R_vec[i,:], Rdot_vec[i,:], Rdash_vec[i,:], Rdotdot_vec[i,:], \
+#	Rdashdot_vec[i,:] = tup
+#	i = i + 1
+#
+#t_vector = t_vec[0,:]
 
-t_vector = t_vec[0,:]
+#all shells in one go
+t_vector, R_vec, Rdot_vec, Rdash_vec, Rdotdot_vec, Rdashdot_vec = \
+              model.evolve_shells(r_vector,t_max=model_age,num_pt=num_pt)
 sp = spline_2d(r_vector,t_vector,R_vec,s=0)
 spdr = spline_2d(r_vector,t_vector,Rdash_vec,s=0)
 spR = spline_2d(r_vector,t_vector,R_vec,s=0)
@@ -183,8 +204,12 @@ for r_val in r_vector:
 
 ###############################################################################
 #******************************************************************************
+#one knot lookup per (r,t) for all of E, R and derivatives in the geodesic rhs
+background = LTB_Background(r_vector,t_vector,R_vec,Rdot_vec,Rdash_vec,Rdashdot_vec,
+                            LTBw_E(r_vector),dLTBw_E_dr(r_vector))
 model_geodesics = LTB_geodesics(E=LTBw_E, E_r=dLTBw_E_dr, R=spR,R_r=spRdash,
-                                R_rt=spRdashdot,R_t=spRdot,num_pt=1700)
+                                R_rt=spRdashdot,R_t=spRdot,num_pt=1700,
+                                background=background)
 
 #num_angles = 100 #20. #200 #200
 #angles = np.linspace(0.,0.995*np.pi,num=num_angles,endpoint=True)
@@ -266,39 +291,74 @@ def geo_loop(angle):
 	       [model_age,loc, np.pi/2.+0.*(90.+29.3)*np.pi/180.,276.4*np.pi/180.],
            angle)
 
-num_cores=7
-geos = Parallel(n_jobs=num_cores,verbose=5)(
-delayed(geo_loop)(angle=angle) for angle in angles)
-print "type and shape", type(geos)
-print "as tuple", np.shape(geos)
-geos = np.asarray(geos)
-print "asarray", np.shape(geos)
-geo_t, geo_r, geo_theta, geo_phi, geo_drds, geo_dthetads, geo_dphids, geo_DA = \
-[geos[:,i,:] for i in np.arange(8)]
-
-z_dec, t_z1100, DA_dec = [np.empty(num_angles) for i in np.arange(3)]
-for i in np.arange(num_angles):
-	sp_z = spline_1d(-geo_t[i,:],geo_z_vec,s=0)
-	z_dec[i] = sp_z(-sp_center_t(1100.))
-	print "z_dec[i] ", z_dec[i]
-	sp_t = spline_1d(geo_z_vec,geo_t[i,:],s=0)
-	t_z1100[i] = sp_t(1100.)
-	print "t_z1100[i] ", t_z1100[i]
-	sp_DA = spline_1d(geo_z_vec,geo_DA[i,:],s=0)
-	DA_dec[i] = sp_DA(z_dec[i])
-	print "DA_dec[i]", DA_dec[i]
-
-sp_z_dec = spline_2d(theta,phi,np.reshape(z_dec,(theta.size,phi.size)),s=0)
-print "max min z_dec", z_dec.max(), z_dec.min()
-print "reshaped z_dec", np.reshape(z_dec,(theta.size,phi.size))
-#plt.figure()
-#hp.mollview(np.array(
-#                     [sp_z_dec(a,b) for a,b in \
-#                     hp.pix2ang(np.arange(z_dec.size))]
-#                     ))
-#plt.figure()
-a, b = hp.pix2ang(32,np.arange(hp.nside2npix(32)))
-zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
+#num_cores=7
+#geos = Parallel(n_jobs=num_cores,verbose=5)(
+#delayed(geo_loop)(angle=angle) for angle in angles)
+#print "type and shape", type(geos)
+#print "as tuple", np.shape(geos)
+#geos = np.asarray(geos)
+#print "asarray", np.shape(geos)
+##all directions integrated together
+#geos, geo_status = model_geodesics.bundle(
+#       [model_age,loc, np.pi/2.+0.*(90.+29.3)*np.pi/180.,276.4*np.pi/180.],
+#       np.asarray(angles))
+#print "bundle shape", np.shape(geos), "failed rays ", np.sum(geo_status != 0)
+#geo_t, geo_r, geo_theta, geo_phi, geo_drds, geo_dthetads, geo_dphids, geo_DA = \
+#[geos[:,i,:] for i in np.arange(8)]
+
+#z_dec, t_z1100, DA_dec = [np.empty(num_angles) for i in np.arange(3)]
+#for i in np.arange(num_angles):
+#	sp_z = spline_1d(-geo_t[i,:],geo_z_vec,s=0)
+#	z_dec[i] = sp_z(-sp_center_t(1100.))
+#	print "z_dec[i] ", z_dec[i]
+#	sp_t = spline_1d(geo_z_vec,geo_t[i,:],s=0)
+#	t_z1100[i] = sp_t(1100.)
+#	print "t_z1100[i] ", t_z1100[i]
+#	sp_DA = spline_1d(geo_z_vec,geo_DA[i,:],s=0)
+#	DA_dec[i] = sp_DA(z_dec[i])
+#	print "DA_dec[i]", DA_dec[i]
+
+#sp_z_dec = spline_2d(theta,phi,np.reshape(z_dec,(theta.size,phi.size)),s=0)
+#print "max min z_dec", z_dec.max(), z_dec.min()
+#print "reshaped z_dec", np.reshape(z_dec,(theta.size,phi.size))
+##plt.figure()
+##hp.mollview(np.array(
+##                     [sp_z_dec(a,b) for a,b in \
+##                     hp.pix2ang(np.arange(z_dec.size))]
+##                     ))
+##plt.figure()
+#a, b = hp.pix2ang(32,np.arange(hp.nside2npix(32)))
+#zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
+#the observer is off centre in an LTB model so z_dec only depends on the angle
+#gamma to the centre, trace rays in one plane and project onto the sky
+P_obs = [model_age,loc, np.pi/2.+0.*(90.+29.3)*np.pi/180.,276.4*np.pi/180.]
+#def z_dec_observable(geos):
+#	return np.array([spline_1d(-geo_t,geo_z_vec,s=0)(-sp_center_t(1100.)) 
+#	                 for geo_t in geos[:,0,:]])
+#z_dec_sky = model_geodesics.meridian(P_obs,z_dec_observable,atol=1e-6,rtol=1e-7)
+#the rays stop at the time of decoupling, the redshift there is z_dec
+z_dec_sky = model_geodesics.meridian(P_obs,lambda z_dec, y_dec: z_dec,
+                                     atol=1e-6,rtol=1e-7,t_stop=sp_center_t(1100.))
+print "rays traced along the meridian ", z_dec_sky.gamma.size
+print "max min z_dec", z_dec_sky.values.max(), z_dec_sky.values.min()
+#the CMB dipole against the observer offset, the background above is built
+#once and shared by all the observers
+sweep_offsets = False
+if sweep_offsets:
+	from observer_sweep import ObserverSweep, observers_around
+	offsets = np.linspace(5.,50.,50)/H_out
+	sky_dirs = np.column_stack(hp.pix2ang(4,np.arange(hp.nside2npix(4))))
+	with ObserverSweep(model_geodesics,share=True) as sweep:
+		geos, status, z_dec, y_dec = sweep(model_age,
+		                             observers_around(offsets,P_obs[2],P_obs[3]),
+		                             sky_dirs,atol=1e-10,rtol=1e-8,
+		                             t_stop=sp_center_t(1100.),
+		                             z_out=model_geodesics.z_vec[[0,-1]])
+	for offset, z in zip(offsets,z_dec):
+		mono, dipole = hp.fit_dipole((z.mean()-z)/(1.+z)*2.7255)
+		print "offset ", offset, "dipole ", np.sqrt(np.sum(dipole**2))
+#the ray through the centre leaves the observer at (pi/2, phi_obs + pi)
+zdec_map = z_dec_sky.healpix_map(32,np.pi/2.,P_obs[3]+np.pi)
 zdec_map = (zdec_map.mean()-zdec_map)/(1.+zdec_map)*2.7255
 proj_map = hp.mollview(zdec_map,coord='G')
 hp.mollview(map = zdec_map, title = "Simulated dipole" ,
@@ -344,7 +404,8 @@ sp_t_dec = spline_2d(angles,geo_z_vec,geo_t_vec,s=0)
 sp_DA_dec = spline_2d(angles,geo_z_vec,geo_r_vec,s=0)
 
 
-ras, dec = np.loadtxt("pixel_center_galactic_coord_12288.dat",unpack=True)
+#ras, dec = np.loadtxt("pixel_center_galactic_coord_12288.dat",unpack=True)
+ras, dec = galactic_pixel_centres(32)
 #Rascension, declination, gammas = get_angles(ras, dec)
 from GP_profiles import get_GP_angles
 ## NOTE: 
@@ -398,30 +459,32 @@ def Delta_T(xi):
 	"""
 	return 2.7255*(z_mean - z_of_angles_sp(xi))/(1.+z_of_angles_sp(xi))
 
-from scipy.special import legendre as legendre
-
-@Integrate
-def al0(xi,ell):
-	"""
-	For m=0
-	Ylm = 1/2 sqrt((2l+1)/pi) LegendreP(l,x)
-	xi: angle in radians
-	Note: The integral over the other angle gives a factor of 2pi
-	While healpix does the spherical harmonic decomposition w.r.t spherical 
-	polar coordinates (theta,phi), this manual decomposition is w.r.t the 
-	angle (xi,phi) and xi is not theta.
-	"""
-	LegPol = legendre(ell)
-	return 2.*np.pi*Delta_T(xi)*np.sqrt((2.*ell+1.)/(4.*np.pi))*LegPol(np.cos(xi))*np.sin(xi)
-
-al0.set_options(epsabs=1.49e-14,epsrel=1.49e-12)
-al0.set_limits(0.,np.pi)
+#from scipy.special import legendre as legendre
+#
+#@Integrate
+#def al0(xi,ell):
+#	"""
+#	For m=0
+#	Ylm = 1/2 sqrt((2l+1)/pi) LegendreP(l,x)
+#	xi: angle in radians
+#	Note: The integral over the other angle gives a factor of 2pi
+#	While healpix does the spherical harmonic decomposition w.r.t spherical 
+#	polar coordinates (theta,phi), this manual decomposition is w.r.t the 
+#	angle (xi,phi) and xi is not theta.
+#	"""
+#	LegPol = legendre(ell)
+#	return 2.*np.pi*Delta_T(xi)*np.sqrt((2.*ell+1.)/(4.*np.pi))*LegPol(np.cos(xi))*np.sin(xi)
+#
+#al0.set_options(epsabs=1.49e-14,epsrel=1.49e-12)
+#al0.set_limits(0.,np.pi)
+#all a_l0 at once from Delta_T on Gauss-Legendre nodes in cos(xi)
+a_l0 = axial_alm(Delta_T,10)
 print "\n One has to be careful as to how the spherical harmonics are normalized"
 print "There are atleast three different ways adopted in literature"
 print " now manually calculating alms , divided 4pi/(2l+1)"
-print "alm , l=0, m=0", al0.integral(0), al0.integral(0)/ np.sqrt(4*np.pi/1) 
-print "alm , l=1, m=0", al0.integral(1), al0.integral(1)/ np.sqrt(4*np.pi/3)
-print "alm , l=2, m=0", al0.integral(2), al0.integral(2)/ np.sqrt(4*np.pi/5)
+print "alm , l=0, m=0", a_l0[0], a_l0[0]/ np.sqrt(4*np.pi/1) 
+print "alm , l=1, m=0", a_l0[1], a_l0[1]/ np.sqrt(4*np.pi/3)
+print "alm , l=2, m=0", a_l0[2], a_l0[2]/ np.sqrt(4*np.pi/5)
 
 flip = 'geo' #'astro' # 'geo'
 hp.mollview(map = my_map, title = "temp_map" ,
@@ -445,6 +508,9 @@ print 'cls ', cls
 print "using map2alm"
 alm = hp.sphtfunc.map2alm(my_map,lmax=10,mmax=0,pol=False,use_weights=True)
 print alm
+print "all m, from a_l0 turned to the direction of the centre"
+print rotated_alm(a_l0,(90.-29.3)*np.pi/180.,276.4*np.pi/180.)
+print hp.sphtfunc.map2alm(my_map,lmax=10,pol=False,use_weights=True)
 import sys
 sys.exit()
 
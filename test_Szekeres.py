@@ -4,6 +4,7 @@ from LTB_Sclass_v2 import LTB_ScaleFactor, sample_radial_coord
 #from LTB_MyWay import LTB_geodesics
 from Szekeres import Szekeres_geodesics
 from LTB_housekeeping import *
+from LTB_interp import GridBicubic, RadialProfile
 
 from scipy.interpolate import UnivariateSpline as spline_1d
 from scipy.interpolate import RectBivariateSpline as spline_2d
@@ -13,7 +14,10 @@ from mpl_toolkits.mplot3d import Axes3D
 from joblib import Parallel, delayed
 from joblib.pool import has_shareable_memory
 import multiprocessing as mp
+from shared_grids import SharedPool
+from bundle_store import BundleStore, trace_to_store
 import healpy as hp
+from CMB_maps import temperature_map
 
 c = 299792458. #ms^-1
 Mpc = 1.
@@ -261,11 +265,28 @@ def ddP_drr(r):
 #******************************************************************************
 #	def __init__(self, R,R_r,R_rr,R_rt,R_t,E, E_r 
 #	             P,P_r,P_rr,Q,Q_r,Q_rr,S,S_r,S_rr,num_pt=1600, *args, **kwargs)
-model_geodesics = Szekeres_geodesics(spR,spRdash,spRdashdash,spRdashdot,spRdot,
+#model_geodesics = Szekeres_geodesics(spR,spRdash,spRdashdash,spRdashdot,spRdot,
+#                                     LTBw_E, dLTBw_E_dr,
+#                                     P,dP_dr,ddP_drr,
+#                                     Q,dQ_dr,ddQ_drr,
+#                                     S,dS_dr,ddS_drr,num_pt=4000)#1600)
+#same interpolants stored per grid cell, cheaper .ev in the geodesic rhs
+gbR, gbRdash, gbRdashdash, gbRdashdot, gbRdot = \
+      [GridBicubic(r_vector,t_vector,spl) for spl in 
+       (spR,spRdash,spRdashdash,spRdashdot,spRdot)]
+#model_geodesics = Szekeres_geodesics(gbR,gbRdash,gbRdashdash,gbRdashdot,gbRdot,
+#                                     LTBw_E, dLTBw_E_dr,
+#                                     P,dP_dr,ddP_drr,
+#                                     Q,dQ_dr,ddQ_drr,
+#                                     S,dS_dr,ddS_drr,num_pt=4000)#1600)
+#P, Q and S with their derivatives from one spline lookup
+radial_profile = RadialProfile(rw,P=P,Q=Q,S=S)
+model_geodesics = Szekeres_geodesics(gbR,gbRdash,gbRdashdash,gbRdashdot,gbRdot,
                                      LTBw_E, dLTBw_E_dr,
-                                     P,dP_dr,ddP_drr,
-                                     Q,dQ_dr,ddQ_drr,
-                                     S,dS_dr,ddS_drr,num_pt=4000)#1600)
+                                     None,None,None,
+                                     None,None,None,
+                                     None,None,None,num_pt=4000,
+                                     profile=radial_profile)
 
 #num_angles = 100 #20. #200 #200
 #angles = np.linspace(0.,0.995*np.pi,num=num_angles,endpoint=True)
@@ -356,20 +377,39 @@ print "ang dist ", ans_central[7][:]
 #	geo_theta_vec[i,:] = LTB_geodesics_model0(rp=loc,tp=model_age,alpha=angle)
 
 #parallel version 2
-def geo_loop(angle):
-	return model_geodesics(
-	       [model_age,r_vector[0]*0.+loc, (90.+29.3)*np.pi/180.,276.4*np.pi/180.],
-           angle)
-
-num_cores=7
-geos = Parallel(n_jobs=num_cores,verbose=5)(
-delayed(geo_loop)(angle=angle) for angle in angles)
-print "type and shape", type(geos)
-print "as tuple", np.shape(geos)
-geos = np.asarray(geos)
-print "asarray", np.shape(geos)
+#def geo_loop(angle):
+#	return model_geodesics(
+#	       [model_age,r_vector[0]*0.+loc, (90.+29.3)*np.pi/180.,276.4*np.pi/180.],
+#           angle)
+#
+#num_cores=7
+#geos = Parallel(n_jobs=num_cores,verbose=5)(
+#delayed(geo_loop)(angle=angle) for angle in angles)
+#the background arrays go to shared memory once, a task is just the angle
+#num_cores=7
+#with SharedPool(model_geodesics,processes=num_cores,
+#                head=([model_age,r_vector[0]*0.+loc,
+#                      (90.+29.3)*np.pi/180.,276.4*np.pi/180.],)) as pool:
+#	#geos = pool.map(angles)
+#	#the rays go to memory mapped files on disk as they come in
+#	store = BundleStore.create("Szekeres_bundle",geo_z_vec,angles,
+#	        P_obs=[model_age,r_vector[0]*0.+loc,(90.+29.3)*np.pi/180.,276.4*np.pi/180.])
+#	for i, geo in enumerate(pool.imap(angles)):
+#		store.write(i,geo)
+#	store.flush()
+#all the rays together with the bundle, a block at a time straight into the
+#store, each one stopped at the time of last scattering of the central observer
+P_obs = [model_age,r_vector[0]*0.+loc,(90.+29.3)*np.pi/180.,276.4*np.pi/180.]
+store = BundleStore.create("Szekeres_bundle",geo_z_vec,angles,P_obs=P_obs)
+trace_to_store(model_geodesics,P_obs,store,t_stop=sp_center_t(z_ls))
+#print "type and shape", type(geos)
+#print "as tuple", np.shape(geos)
+#geos = np.asarray(geos)
+#print "asarray", np.shape(geos)
+#geo_t, geo_r, geo_theta, geo_phi, geo_drds, geo_dthetads, geo_dphids, geo_DA = \
+#[geos[:,i,:] for i in np.arange(8)]
 geo_t, geo_r, geo_theta, geo_phi, geo_drds, geo_dthetads, geo_dphids, geo_DA = \
-[geos[:,i,:] for i in np.arange(8)]
+[store[i] for i in range(8)]
 
 print "geo_t ", np.shape(geo_t)
 print geo_t
@@ -386,19 +426,24 @@ print "type angles", type(angles), np.shape(angles)
 for angle in angles:
 	print angle
 print "num_angles ",num_angles, type(num_angles)
-for i in np.arange(num_angles):
-	#sp_z = spline_1d(-geo_t[i,:],geo_z_vec,s=0)
-	#z_dec[i] = sp_z(-sp_center_t(1100.))
-	sp_z = spline_1d(geo_t[i,::-1],geo_z_vec[::-1],s=0)
-	z_dec[i] = sp_z(sp_center_t(z_ls))
-	print type(i)
-	print "z_dec[i] ", z_dec[i], angles[i], i 
-	sp_t = spline_1d(geo_z_vec,geo_t[i,:],s=0)
-	t_z1100[i] = sp_t(z_ls)
-	print "t_z1100[i] ", t_z1100[i]
-	sp_DA = spline_1d(geo_z_vec,geo_DA[i,:],s=0)
-	DA_dec[i] = sp_DA(z_dec[i])
-	print "DA_dec[i]", DA_dec[i]
+#for i in np.arange(num_angles):
+#	#sp_z = spline_1d(-geo_t[i,:],geo_z_vec,s=0)
+#	#z_dec[i] = sp_z(-sp_center_t(1100.))
+#	sp_z = spline_1d(geo_t[i,::-1],geo_z_vec[::-1],s=0)
+#	z_dec[i] = sp_z(sp_center_t(z_ls))
+#	print type(i)
+#	print "z_dec[i] ", z_dec[i], angles[i], i 
+#	sp_t = spline_1d(geo_z_vec,geo_t[i,:],s=0)
+#	t_z1100[i] = sp_t(z_ls)
+#	print "t_z1100[i] ", t_z1100[i]
+#	sp_DA = spline_1d(geo_z_vec,geo_DA[i,:],s=0)
+#	DA_dec[i] = sp_DA(z_dec[i])
+#	print "DA_dec[i]", DA_dec[i]
+#read from the store a block of rays at a time, z_dec is where the rays
+#were stopped
+z_dec = store.z_where('t',sp_center_t(z_ls))
+t_z1100 = store.at_z('t',z_ls)
+DA_dec = store.at_z('DA',z_dec)
 
 sp_z_dec = spline_2d(theta,phi,np.reshape(z_dec,(theta.size,phi.size)),s=0)
 print "max min z_dec", z_dec.max(), z_dec.min()
@@ -409,9 +454,11 @@ print "reshaped z_dec", np.reshape(z_dec,(theta.size,phi.size))
 #                     hp.pix2ang(np.arange(z_dec.size))]
 #                     ))
 #plt.figure()
-a, b = hp.pix2ang(32,np.arange(hp.nside2npix(32)))
-zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
-zdec_map = (zdec_map.mean()-zdec_map)/(1.+zdec_map)*2.7255
+#a, b = hp.pix2ang(32,np.arange(hp.nside2npix(32)))
+#zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
+#zdec_map = (zdec_map.mean()-zdec_map)/(1.+zdec_map)*2.7255
+#pixel centres and the spline a chunk of pixels at a time
+zdec_map = temperature_map(32,sp_z_dec.ev,T0=2.7255)
 proj_map = hp.mollview(zdec_map,coord='G')
 hp.mollview(map = zdec_map, title = "Simulated dipole" ,
 remove_mono=True,format='%.4e',coord='G')
@@ -4,6 +4,7 @@ from LTB_Sclass_v2 import LTB_ScaleFactor, sample_radial_coord
 #from LTB_MyWay import LTB_geodesics
 from Szekeres_sph import Szekeres_geodesics
 from LTB_housekeeping import *
+from LTB_interp import GridBicubic, RadialProfile
 
 from scipy.interpolate import UnivariateSpline as spline_1d
 from scipy.interpolate import RectBivariateSpline as spline_2d
@@ -13,7 +14,9 @@ from mpl_toolkits.mplot3d import Axes3D
 from joblib import Parallel, delayed
 from joblib.pool import has_shareable_memory
 import multiprocessing as mp
+from shared_grids import SharedPool
 import healpy as hp
+from CMB_maps import temperature_map
 
 c = 299792458. #ms^-1
 Mpc = 1.
@@ -238,11 +241,28 @@ def ddP_drr(r):
 #******************************************************************************
 #	def __init__(self, R,R_r,R_rr,R_rt,R_t,E, E_r 
 #	             P,P_r,P_rr,Q,Q_r,Q_rr,S,S_r,S_rr,num_pt=1600, *args, **kwargs)
-model_geodesics = Szekeres_geodesics(spR,spRdash,spRdashdash,spRdashdot,spRdot,
+#model_geodesics = Szekeres_geodesics(spR,spRdash,spRdashdash,spRdashdot,spRdot,
+#                                     LTBw_E, dLTBw_E_dr,
+#                                     P,dP_dr,ddP_drr,
+#                                     Q,dQ_dr,ddQ_drr,
+#                                     S,dS_dr,ddS_drr,num_pt=3200)#1700
+#same interpolants stored per grid cell, cheaper .ev in the geodesic rhs
+gbR, gbRdash, gbRdashdash, gbRdashdot, gbRdot = \
+      [GridBicubic(r_vector,t_vector,spl) for spl in 
+       (spR,spRdash,spRdashdash,spRdashdot,spRdot)]
+#model_geodesics = Szekeres_geodesics(gbR,gbRdash,gbRdashdash,gbRdashdot,gbRdot,
+#                                     LTBw_E, dLTBw_E_dr,
+#                                     P,dP_dr,ddP_drr,
+#                                     Q,dQ_dr,ddQ_drr,
+#                                     S,dS_dr,ddS_drr,num_pt=3200)#1700
+#P, Q and S with their derivatives from one spline lookup
+radial_profile = RadialProfile(rw,P=P,Q=Q,S=S)
+model_geodesics = Szekeres_geodesics(gbR,gbRdash,gbRdashdash,gbRdashdot,gbRdot,
                                      LTBw_E, dLTBw_E_dr,
-                                     P,dP_dr,ddP_drr,
-                                     Q,dQ_dr,ddQ_drr,
-                                     S,dS_dr,ddS_drr,num_pt=3200)#1700
+                                     None,None,None,
+                                     None,None,None,
+                                     None,None,None,num_pt=3200,
+                                     profile=radial_profile)
 
 #num_angles = 100 #20. #200 #200
 #angles = np.linspace(0.,0.995*np.pi,num=num_angles,endpoint=True)
@@ -335,14 +355,20 @@ print "ang dist ", ans_central[7][:]
 #	geo_theta_vec[i,:] = LTB_geodesics_model0(rp=loc,tp=model_age,alpha=angle)
 
 #parallel version 2
-def geo_loop(angle):
-	return model_geodesics(
-	       [model_age,r_vector[0]+loc, (90.+29.3)*np.pi/180.,276.4*np.pi/180.],
-           angle)
-
+#def geo_loop(angle):
+#	return model_geodesics(
+#	       [model_age,r_vector[0]+loc, (90.+29.3)*np.pi/180.,276.4*np.pi/180.],
+#           angle)
+#
+#num_cores=7
+#geos = Parallel(n_jobs=num_cores,verbose=5)(
+#delayed(geo_loop)(angle=angle) for angle in angles)
+#the background arrays go to shared memory once, a task is just the angle
 num_cores=7
-geos = Parallel(n_jobs=num_cores,verbose=5)(
-delayed(geo_loop)(angle=angle) for angle in angles)
+with SharedPool(model_geodesics,processes=num_cores,
+                head=([model_age,r_vector[0]+loc,
+                      (90.+29.3)*np.pi/180.,276.4*np.pi/180.],)) as pool:
+	geos = pool.map(angles)
 print "type and shape", type(geos)
 print "as tuple", np.shape(geos)
 geos = np.asarray(geos)
@@ -404,9 +430,11 @@ print "reshaped z_dec", np.reshape(z_dec,(theta.size,phi.size))
 #                     hp.pix2ang(np.arange(z_dec.size))]
 #                     ))
 #plt.figure()
-a, b = hp.pix2ang(64,np.arange(hp.nside2npix(64)))
-zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
-zdec_map = (zdec_map.mean()-zdec_map)/(1.+zdec_map)*2.7255
+#a, b = hp.pix2ang(64,np.arange(hp.nside2npix(64)))
+#zdec_map = np.array([sp_z_dec.ev(i,j) for i,j in zip(a,b)])
+#zdec_map = (zdec_map.mean()-zdec_map)/(1.+zdec_map)*2.7255
+#pixel centres and the spline a chunk of pixels at a time
+zdec_map = temperature_map(64,sp_z_dec.ev,T0=2.7255)
 proj_map = hp.mollview(zdec_map,coord='G')
 hp.mollview(map = zdec_map, title = "Simulated dipole" ,
 remove_mono=True,format='%.4e',coord='G')
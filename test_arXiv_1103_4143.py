@@ -37,6 +37,7 @@
 
 from __future__ import division
 import numpy as np
+from CMB_maps import axial_alm
 from LTB_Sclass_v2 import LTB_ScaleFactor
 from LTB_Sclass_v2 import LTB_geodesics, sample_radial_coord
 from LTB_housekeeping import c, Mpc, Gpc, ageMpc
@@ -300,30 +301,32 @@ def Delta_T(xi):
 	"""
 	return 2.7255*(z_mean - z_of_angles_sp(xi))/(1.+z_of_angles_sp(xi))
 
-from scipy.special import legendre as legendre
-
-@Integrate
-def al0(xi,ell):
-	"""
-	For m=0
-	Ylm = 1/2 sqrt((2l+1)/pi) LegendreP(l,x)
-	xi: angle in radians
-	Note: The integral over the other angle gives a factor of 2pi.
-	While healpix does the spherical harmonic decomposition w.r.t spherical 
-	polar coordinates (theta,phi), this manual decomposition is w.r.t the 
-	angle (xi,phi) and xi is not theta.
-	"""
-	LegPol = legendre(ell)
-	return 2.*np.pi*Delta_T(xi)*np.sqrt((2.*ell+1.)/(4.*np.pi))*LegPol(np.cos(xi))*np.sin(xi)
-
-al0.set_options(epsabs=1.49e-10,epsrel=1.49e-8)
-al0.set_limits(0.,np.pi)
+#from scipy.special import legendre as legendre
+#
+#@Integrate
+#def al0(xi,ell):
+#	"""
+#	For m=0
+#	Ylm = 1/2 sqrt((2l+1)/pi) LegendreP(l,x)
+#	xi: angle in radians
+#	Note: The integral over the other angle gives a factor of 2pi.
+#	While healpix does the spherical harmonic decomposition w.r.t spherical 
+#	polar coordinates (theta,phi), this manual decomposition is w.r.t the 
+#	angle (xi,phi) and xi is not theta.
+#	"""
+#	LegPol = legendre(ell)
+#	return 2.*np.pi*Delta_T(xi)*np.sqrt((2.*ell+1.)/(4.*np.pi))*LegPol(np.cos(xi))*np.sin(xi)
+#
+#al0.set_options(epsabs=1.49e-10,epsrel=1.49e-8)
+#al0.set_limits(0.,np.pi)
+#all a_l0 at once from Delta_T on Gauss-Legendre nodes in cos(xi)
+a_l0 = axial_alm(Delta_T,10)
 print "\n One has to be careful as to how the spherical harmonics are normalized"
 print "There are atleast three different ways adopted in literature"
 print " now manually calculating alms , divide by 2.7255 to get dimensionless"
-print "alm , l=0, m=0", al0.integral(0), al0.integral(0)/2.7255
-print "alm , l=1, m=0", al0.integral(1), al0.integral(1)/2.7255
-print "alm , l=2, m=0", al0.integral(2), al0.integral(2)/2.7255
+print "alm , l=0, m=0", a_l0[0], a_l0[0]/2.7255
+print "alm , l=1, m=0", a_l0[1], a_l0[1]/2.7255
+print "alm , l=2, m=0", a_l0[2], a_l0[2]/2.7255
 
 flip = 'astro' # 'geo'
 hp.mollview(map = my_map, title = "temp_map" ,